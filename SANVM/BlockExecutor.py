@@ -0,0 +1,372 @@
+import copy
+
+from SANVM.Storage import Storage
+from SANVM.ContractManager import ContractManager
+from SANVM.OverlayStorage import OverlayStorage
+from SANVM.Gas import transaction_gas_limit
+from SANVM.CompileCache import default_compile_cache
+from utils.ProcessPool import ProcessPool
+
+
+def run_contract_code(manager, contract_code, gas_limit, compile_cache=default_compile_cache):
+    """
+    Runs one contract transaction on a ContractManager.
+    contract_code = {"command": deploy, contract_id, bytecode or pena_code, optimize (optional, for pena_code)}
+    contract_code = {"command": run, contract_id, function_name, params: []}
+    """
+    command = contract_code["command"]
+
+    if command == "deploy":
+        if "pena_code" in contract_code:
+            bytecode = compile_cache.compile(contract_code["pena_code"], bool(contract_code.get("optimize")))
+        else:
+            bytecode = contract_code["bytecode"]
+        manager.deploy_contract(contract_code["contract_id"], bytecode, gas_limit)
+
+    elif command == "run":
+        manager.call_contract_function(
+            contract_code["contract_id"],
+            contract_code["function_name"],
+            contract_code.get("params", []),
+            gas_limit
+        )
+
+
+def call_effect(manager, contract_code):
+    """
+    What a call that just succeeded on manager changed:
+    ("deploy", contract_info), ("run", updated keys, deleted keys) or None.
+    """
+    command = contract_code["command"]
+    if command == "deploy":
+        # Copied, later calls keep changing the manager's contract
+        return "deploy", copy.deepcopy(manager.contracts[contract_code["contract_id"]])
+    if command != "run":
+        return None  # Unknown commands do nothing
+
+    changes = manager.last_changes
+    updated = {key: value for key, value in changes.items() if value is not OverlayStorage.DELETED}
+    deleted = [key for key, value in changes.items() if value is OverlayStorage.DELETED]
+    return "run", updated, deleted
+
+
+class _NotShipped(Exception):
+    """
+    A worker read a storage key the parent did not send, the group is run again in the parent.
+    """
+
+
+class _ShippedStorage(dict):
+    """
+    The part of a contract's storage sent to a worker: the keys its calls are expected to read,
+    plus keys known to be absent. Reading any other key raises _NotShipped.
+    """
+
+    def __init__(self, values, absent):
+        super().__init__(values)
+        self.absent = set(absent)
+
+    def _check(self, key):
+        if not dict.__contains__(self, key) and key not in self.absent:
+            raise _NotShipped(key)
+
+    def __contains__(self, key):
+        self._check(key)
+        return dict.__contains__(self, key)
+
+    def __getitem__(self, key):
+        self._check(key)
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        self._check(key)
+        return dict.get(self, key, default)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.absent.add(key)
+
+
+class _ReadTracking(dict):
+    """
+    Copy of a contract's storage that records every key looked up, for the parent's own runs.
+    """
+
+    def __init__(self, values):
+        super().__init__(values)
+        self.read = set()
+
+    def __contains__(self, key):
+        self.read.add(key)
+        return dict.__contains__(self, key)
+
+    def __getitem__(self, key):
+        self.read.add(key)
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        self.read.add(key)
+        return dict.get(self, key, default)
+
+
+def _execute_groups(groups, compiled, gas_schedule, tx_gas_limit, block_gas_limit, profile=False):
+    """
+    Worker entry point. groups is a list of (contract_id, contract_info or None, [contract_code, ...]).
+
+    Each group runs in block order on its own copy of the contract and stops at its first failing call,
+    the block is rejected there anyway. Per call it returns (error or None, gas used, call_effect(), Profile or None).
+    A group that read a key missing from its _ShippedStorage returns None instead of its results.
+    """
+    results = []
+
+    for contract_id, contract_info, calls in groups:
+        manager = ContractManager(Storage(), compiled=compiled, gas_schedule=gas_schedule, profile=profile)
+        if contract_info is not None:
+            manager.contracts[contract_id] = contract_info
+
+        group_results = []
+        for contract_code in calls:
+            manager.last_gas_used = 0
+            manager.last_changes = {}
+            manager.last_profile = None
+            try:
+                # Limit without the block's running total, that part is applied when results are merged
+                gas_limit = transaction_gas_limit(contract_code.get("gas_limit"), 0, tx_gas_limit, block_gas_limit)
+                run_contract_code(manager, contract_code, gas_limit)
+            except _NotShipped:
+                group_results = None
+                break
+            except Exception as e:
+                group_results.append((f"{e}", manager.last_gas_used, None, manager.last_profile))
+                break
+
+            group_results.append((None, manager.last_gas_used, call_effect(manager, contract_code),
+                                  manager.last_profile))
+
+        results.append(group_results)
+
+    return results
+
+
+class BlockExecutor:
+    """
+    Executes the contract transactions of a block.
+
+    A contract call only reads and writes its own contract's storage, so calls are grouped by
+    contract_id: calls inside a group run in block order, different groups run on a process pool.
+    Results are merged back in block order, so state, recorded gas and the first error are the
+    same as running every call one after another on the node's ContractManager.
+
+    Gas: each call runs with min(requested, tx_gas_limit, block_gas_limit). At merge, the block's
+    running total is applied. A call that failed or used more than what was left of the block, while its
+    serial limit was lower than the worker's, is run again here with the serial limit, so its gas and
+    error are exactly the serial ones.
+
+    Workers only get the storage keys a contract's calls read in earlier blocks (read_hints). A group
+    that reads any other key is run again here, on the full storage, and its keys are learned.
+
+    Small blocks (or hosts without a working process pool) run serially.
+
+    With the ContractManager's profile flag on, last_profiles holds [(tx hash, contract_id, Profile), ...]
+    of the last block's calls, failing call included (see Profiler.block_report).
+
+    PENA sources of deploy calls go through compile_cache. Before a parallel run they are compiled
+    here, so workers get the bytecode and the node's cache sees every deploy.
+    """
+
+    PARALLEL_THRESHOLD = 16  # Calls per block below which pool overhead costs more than it saves
+    CHUNKS_PER_WORKER = 2
+    MAX_HINT_KEYS = 10_000  # Past this, a contract's hints start over
+
+    def __init__(self, contract_manager, tx_gas_limit, block_gas_limit, max_workers=None,
+                 parallel_threshold=PARALLEL_THRESHOLD, compile_cache=None):
+        self.contract_manager = contract_manager
+        self.compile_cache = compile_cache or default_compile_cache
+        self.last_profiles = []
+        self.tx_gas_limit = tx_gas_limit
+        self.block_gas_limit = block_gas_limit
+        self.pool = ProcessPool(max_workers, parallel_threshold, "executing contracts")
+        self.read_hints = {}  # contract_id -> storage keys its calls read
+
+    @staticmethod
+    def _group_calls(calls):
+        groups = {}  # contract_id -> [call position, ...], in block order
+        for position, (_, contract_code) in enumerate(calls):
+            groups.setdefault(contract_code.get("contract_id"), []).append(position)
+        return groups
+
+    def execute(self, calls, gas_used, contracts=None):
+        """
+        calls: [(transaction hash, contract_code), ...] in block order.
+        Records the gas of every call that ran into gas_used, and raises on the first failing call.
+        Returns [(contract_id, call_effect()), ...] in block order, the block's contract state changes.
+        With contracts (a PendingContracts), the calls run against it instead of the manager's contracts.
+        """
+        self.last_profiles = []  # Not left over from the last block if this one fails before its calls run
+        manager = self.contract_manager if contracts is None else self.contract_manager.bound_to(contracts)
+
+        groups = self._group_calls(calls)
+        if len(groups) < 2:
+            return self.execute_serial(calls, gas_used, manager)
+
+        return self.pool.run(len(calls),
+                             lambda executor: self._merge(manager, calls,
+                                                          self._execute_parallel(executor, manager, calls, groups),
+                                                          gas_used),
+                             lambda: self.execute_serial(calls, gas_used, manager))
+
+    def execute_serial(self, calls, gas_used, manager=None):
+        manager = manager or self.contract_manager
+        block_gas = 0
+        effects = []
+        self.last_profiles = []
+
+        for tx_hash, contract_code in calls:
+            gas_limit = transaction_gas_limit(contract_code.get("gas_limit"), block_gas,
+                                              self.tx_gas_limit, self.block_gas_limit)
+
+            # Failed runs (out of gas included) still used their gas
+            manager.last_gas_used = 0
+            manager.last_profile = None
+            try:
+                run_contract_code(manager, contract_code, gas_limit, self.compile_cache)
+            except Exception as e:
+                raise Exception(f"{e}")
+            finally:
+                gas_used[tx_hash] = manager.last_gas_used
+                block_gas += manager.last_gas_used
+                if manager.last_profile is not None:
+                    self.last_profiles.append((tx_hash, contract_code.get("contract_id"), manager.last_profile))
+
+            effect = call_effect(manager, contract_code)
+            if effect is not None:
+                effects.append((contract_code["contract_id"], effect))
+
+        return effects
+
+    def _precompiled(self, contract_code):
+        if contract_code.get("command") != "deploy" or "pena_code" not in contract_code:
+            return contract_code
+        try:
+            bytecode = self.compile_cache.compile(contract_code["pena_code"], bool(contract_code.get("optimize")))
+        except Exception:
+            return contract_code  # The worker parses it again and fails at the same call
+
+        contract_code = dict(contract_code)
+        del contract_code["pena_code"]
+        contract_code["bytecode"] = bytecode
+        return contract_code
+
+    def _shipped(self, contract_id, contract_info):
+        # contract_info with only the hinted part of its storage
+        if contract_info is None:
+            return None
+        storage = contract_info["storage"]
+        hints = self.read_hints.get(contract_id, ())
+        values = {key: storage[key] for key in hints if key in storage}
+        absent = [key for key in hints if key not in storage]
+        return dict(contract_info, storage=_ShippedStorage(values, absent))
+
+    def _execute_locally(self, contract_id, contract_info, calls):
+        # Runs one group here on a copy of the full storage, and learns the keys it read
+        if contract_info is not None:
+            storage = _ReadTracking(contract_info["storage"])
+            contract_info = dict(contract_info, storage=storage)
+
+        results = _execute_groups([(contract_id, contract_info, calls)], self.contract_manager.compiled,
+                                  self.contract_manager.gas_schedule, self.tx_gas_limit, self.block_gas_limit,
+                                  self.contract_manager.profile)[0]
+
+        if contract_info is not None:
+            hints = self.read_hints.setdefault(contract_id, set())
+            if len(hints) + len(storage.read) > self.MAX_HINT_KEYS:
+                hints.clear()
+            hints.update(storage.read)
+        return results
+
+    def _execute_parallel(self, executor, manager, calls, groups):
+        contracts = manager.contracts
+        work = [(contract_id, contracts.get(contract_id), [self._precompiled(calls[position][1]) for position in positions])
+                for contract_id, positions in groups.items()]
+        shipped = [(contract_id, self._shipped(contract_id, contract_info), group_calls)
+                   for contract_id, contract_info, group_calls in work]
+
+        chunk_count = self.pool.max_workers * self.CHUNKS_PER_WORKER
+        chunk_size = max(1, -(-len(work) // chunk_count))
+        futures = [
+            executor.submit(_execute_groups, shipped[i:i + chunk_size], self.contract_manager.compiled,
+                             self.contract_manager.gas_schedule, self.tx_gas_limit, self.block_gas_limit,
+                             self.contract_manager.profile)
+            for i in range(0, len(work), chunk_size)
+        ]
+
+        # Result of every call that ran, by its position in the block
+        results = {}
+        group_work = iter(zip(groups.values(), work))
+        for future in futures:
+            for group_results in future.result():
+                positions, (contract_id, contract_info, group_calls) = next(group_work)
+                if group_results is None:
+                    group_results = self._execute_locally(contract_id, contract_info, group_calls)
+                for position, result in zip(positions, group_results):
+                    results[position] = result
+        return results
+
+    def _merge(self, manager, calls, results, gas_used):
+        contracts = manager.contracts
+        block_gas = 0
+        effects = []
+        self.last_profiles = []
+
+        for position, (tx_hash, contract_code) in enumerate(calls):
+            gas_limit = transaction_gas_limit(contract_code.get("gas_limit"), block_gas,
+                                              self.tx_gas_limit, self.block_gas_limit)
+            worker_limit = transaction_gas_limit(contract_code.get("gas_limit"), 0,
+                                                 self.tx_gas_limit, self.block_gas_limit)
+
+            # Every call up to the first failing one has a result, and merging stops at that one
+            error, gas, effect, profile = results[position]
+            applied = False
+            if gas_limit < worker_limit and (error is not None or gas > gas_limit):
+                # The worker ran with more gas than this call had serially, run it again with the serial limit
+                error, gas, effect, profile = self._run_here(manager, contract_code, gas_limit)
+                applied = True
+
+            gas_used[tx_hash] = gas
+            block_gas += gas
+            if profile is not None:
+                self.last_profiles.append((tx_hash, contract_code.get("contract_id"), profile))
+
+            if error is not None:
+                raise Exception(error)
+
+            if effect is None:
+                continue
+            effects.append((contract_code["contract_id"], effect))
+
+            if applied:
+                continue
+            if effect[0] == "deploy":
+                contracts[contract_code["contract_id"]] = copy.deepcopy(effect[1])
+            else:
+                _, updated, deleted = effect
+                storage = contracts[contract_code["contract_id"]]["storage"]
+                storage.update(updated)
+                for key in deleted:
+                    del storage[key]
+
+        return effects
+
+    def _run_here(self, manager, contract_code, gas_limit):
+        # One call on the block's ContractManager, at its place in the block
+        manager.last_gas_used = 0
+        manager.last_changes = {}
+        manager.last_profile = None
+        try:
+            run_contract_code(manager, contract_code, gas_limit, self.compile_cache)
+        except Exception as e:
+            return f"{e}", manager.last_gas_used, None, manager.last_profile
+        return None, manager.last_gas_used, call_effect(manager, contract_code), manager.last_profile
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,53 @@
+from SANVM.OpCode import OpCode
+
+# Opcodes followed by an inline operand slot
+OPERAND_OPCODES = {OpCode.PUSH.value, OpCode.JMP.value, OpCode.IF.value}
+
+# Opcodes SANVirtualMachine has a handler for, DROP has none and raises like any unknown value
+VALID_OPCODES = {op.value for op in OpCode} - {OpCode.DROP.value}
+
+
+def iter_instructions(bytecode):
+    """
+    Walks bytecode instruction by instruction.
+    Yields (pc, opcode, operand), operand is None for opcodes without one.
+    """
+    pc = 0
+    length = len(bytecode)
+    while pc < length:
+        opcode = bytecode[pc]
+        if is_opcode(opcode, OPERAND_OPCODES) and pc + 1 < length:
+            yield pc, opcode, bytecode[pc + 1]
+            pc += 2
+        else:
+            yield pc, opcode, None
+            pc += 1
+
+
+def is_opcode(value, opcodes):
+    try:
+        return value in opcodes
+    except TypeError:  # Unhashable operand (list/dict)
+        return False
+
+
+def function_table(bytecode):
+    """
+    Finds the functions a program defines, the way PenaParser emits them:
+        PUSH <name>, PUSH <param_count>, DEF_FUNC, <body> ..., RET
+
+    Returns {name: {"pc": body entry, "param_count": n}}, the same shape DEF_FUNC
+    writes into storage.functions at runtime.
+    """
+    functions = {}
+    instructions = list(iter_instructions(bytecode))
+
+    for i, (pc, opcode, _) in enumerate(instructions):
+        if opcode != OpCode.DEF_FUNC.value or i < 2:
+            continue
+
+        (_, name_op, name), (_, count_op, param_count) = instructions[i - 2], instructions[i - 1]
+        if name_op == OpCode.PUSH.value and count_op == OpCode.PUSH.value:
+            functions[name] = {"pc": pc + 1, "param_count": param_count}
+
+    return functions
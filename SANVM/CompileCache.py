@@ -0,0 +1,121 @@
+import os
+import hashlib
+from collections import OrderedDict
+
+from SANVM import pena_parser, Linker, Optimizer, OpCode, Bytecode
+from SANVM.PackedBytecode import PackedBytecode
+
+
+def compiler_version():
+    """
+    Hash of the modules that turn PENA source into bytecode. Any change to the parser, the linker,
+    the optimizer, the opcode numbering or the packed format gives a new version, so old cache
+    entries are not used.
+    """
+    version = hashlib.sha256(f"packed-{PackedBytecode.VERSION}".encode("ascii"))
+    for module in (pena_parser, Linker, Optimizer, OpCode, Bytecode):
+        with open(module.__file__, "rb") as f:
+            version.update(f.read().replace(b"\r\n", b"\n"))
+    return version.hexdigest()[:16]
+
+
+class CompileCache:
+    """
+    PENA source -> PackedBytecode, keyed by sha256(compiler version + optimize flag + source).
+
+    Recently used programs are kept in an in-memory LRU. With a directory, every compiled program is
+    also written there as <key>.sanp (PackedBytecode.to_bytes), so a restarted node and a replay
+    during sync do not parse known templates again. An unreadable file is ignored and compiled again.
+    Sources that fail to parse are not cached, the error is raised every time.
+    """
+
+    DEFAULT_SIZE = 256
+    SUFFIX = ".sanp"
+
+    def __init__(self, size=DEFAULT_SIZE, directory=None, version=None):
+        self.size = size
+        self.directory = directory
+        self.version = version or compiler_version()
+        self.entries = OrderedDict()  # key -> PackedBytecode
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, source, optimize=False):
+        return hashlib.sha256(f"{self.version}\n{int(optimize)}\n{source}".encode("utf-8")).hexdigest()
+
+    def compile(self, source, optimize=False) -> PackedBytecode:
+        key = self.key(source, optimize)
+
+        packed = self.entries.get(key)
+        if packed is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return packed
+
+        packed = self._load(key)
+        if packed is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            packed = PackedBytecode.pack(pena_parser.PenaParser(optimize).parse(source))
+            self._store(key, packed)
+
+        self.entries[key] = packed
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return packed
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return PackedBytecode.from_bytes(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Compile cache entry {key} unreadable, compiling again: {e}")
+            return None
+
+    def _store(self, key, packed):
+        if self.directory is None:
+            return
+        # Written to a temporary file first, a crash never leaves a half written entry under the key
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(packed.to_bytes())
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"[WARNING] Compile cache entry {key} not written: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "version": self.version,
+            "entries": len(self.entries),
+            "size": self.size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "directory": self.directory,
+        }
+
+    def clear(self):
+        self.entries.clear()
+
+
+default_compile_cache = CompileCache()
@@ -0,0 +1,355 @@
+import copy
+import hashlib
+from collections import OrderedDict
+
+from SANVM.OpCode import OpCode
+from SANVM.Gas import OutOfGasError
+from SANVM.PackedBytecode import PackedBytecode
+
+
+# Binary stack ops: pop b, pop a, push result. Same semantics as the SANVirtualMachine handlers.
+BINARY_EXPRESSIONS = {
+    OpCode.ADD.value: "{a} + {b}",
+    OpCode.SUB.value: "{a} - {b}",
+    OpCode.MUL.value: "{a} * {b}",
+    OpCode.DIV.value: "{a} // {b}",
+    OpCode.MOD.value: "{a} % {b}",
+    OpCode.AND.value: "1 if ({a} != 0 and {b} != 0) else 0",
+    OpCode.OR.value: "1 if ({a} != 0 or {b} != 0) else 0",
+    OpCode.XOR.value: "1 if (bool({a}) != bool({b})) else 0",
+    OpCode.EQ.value: "1 if {a} == {b} else 0",
+    OpCode.NEQ.value: "1 if {a} != {b} else 0",
+    OpCode.LT.value: "1 if {a} < {b} else 0",
+    OpCode.LTE.value: "1 if {a} <= {b} else 0",
+    OpCode.GT.value: "1 if {a} > {b} else 0",
+    OpCode.GTE.value: "1 if {a} >= {b} else 0",
+}
+ZERO_CHECKED = {OpCode.DIV.value, OpCode.MOD.value}
+
+# Ops that only touch the stack and storage, these are fused into one generated function per block
+STRAIGHT_LINE = set(BINARY_EXPRESSIONS) | {OpCode.PUSH.value, OpCode.POP.value, OpCode.GET.value,
+                                           OpCode.SET.value, OpCode.NOP.value}
+
+
+class CompiledProgram:
+    """
+    Compiled form of a bytecode list.
+
+    ops[pc] is a function op(vm) -> next pc. It runs the basic block that starts at pc:
+    the straight-line ops up to the next control op, generated as a single Python function
+    with operands bound as locals, plus the control op itself if it is JMP, IF or HALT.
+    Ops that manage vm.pc themselves (functions, loops, CALL/RET ...) go through the VM's own handler.
+
+    Blocks are generated the first time their start pc is reached. A jump may land anywhere,
+    even on an operand slot, so any position can start a block. A negative target indexes from
+    the end in the interpreter, SANVirtualMachine.run_compiled hands such runs over to it.
+
+    With a gas schedule, each block adds the cost of all its ops to vm.gas_used once, on entry,
+    and raises OutOfGasError if that goes over vm.gas_limit. A run that completes uses exactly
+    the gas the metered interpreter would. A run that fails may have charged ops past the failing
+    one, ContractManager runs contracts that fail this way again interpreted to charge exact gas.
+    """
+
+    MAX_BLOCK_OPS = 64
+
+    __slots__ = ("bytecode", "ops", "length", "schedule")
+
+    def __init__(self, bytecode, schedule=None):
+        self.bytecode = bytecode
+        self.length = len(bytecode)
+        self.schedule = schedule
+        self.ops = [self._stub(pc) for pc in range(self.length)]
+
+    def _stub(self, pc):
+        def op(vm):
+            block = self._compile_block(pc)
+            self.ops[pc] = block
+            return block(vm)
+        return op
+
+    def _compile_block(self, start):
+        bytecode = self.bytecode
+        opcode = bytecode[start]
+
+        if not _is_straight_line(bytecode, start) and not _is_inline_control(bytecode, start):
+            if self.schedule is not None:
+                return _generic_metered(opcode, start + 1, self.schedule.cost(opcode))
+            return _generic(opcode, start + 1)
+
+        return _BlockBuilder(bytecode, start, self.MAX_BLOCK_OPS, self.schedule).build()
+
+
+def _opcode_in(value, opcodes):
+    try:
+        return value in opcodes
+    except TypeError:  # Unhashable operand (list/dict) sitting at this position
+        return False
+
+
+def _is_straight_line(bytecode, pc):
+    opcode = bytecode[pc]
+    if not _opcode_in(opcode, STRAIGHT_LINE):
+        return False
+    # PUSH without an operand is left to the VM, which raises the same IndexError it always did
+    return opcode != OpCode.PUSH.value or pc + 1 < len(bytecode)
+
+
+def _is_inline_control(bytecode, pc):
+    opcode = bytecode[pc]
+    if opcode == OpCode.IF.value:
+        return pc + 1 < len(bytecode)
+    return _opcode_in(opcode, {OpCode.JMP.value, OpCode.HALT.value})
+
+
+class _BlockBuilder:
+    """
+    Generates the source of one block.
+
+    Values pushed inside the block are kept in locals (a symbolic stack) and only written to
+    vm.stack when the block ends. When an op needs more values than the block pushed, the
+    symbolic stack is flushed and the op falls back to the same length-checked form the
+    interpreter uses, so stack underflow behaves exactly as before.
+    """
+
+    def __init__(self, bytecode, start, max_ops, schedule=None):
+        self.bytecode = bytecode
+        self.start = start
+        self.max_ops = max_ops
+        self.schedule = schedule
+        self.gas = 0  # Total cost of the ops in this block
+
+        self.lines = []
+        self.constants = {}  # local name -> operand value
+        self.symbolic = []  # names of values pushed in this block, not yet in vm.stack
+        self.temp_count = 0
+
+    def build(self):
+        bytecode = self.bytecode
+        pc = self.start
+        ops = 0
+
+        while pc < len(bytecode) and ops < self.max_ops and _is_straight_line(bytecode, pc):
+            self._charge(bytecode[pc])
+            pc = self._emit(bytecode[pc], pc)
+            ops += 1
+
+        if pc < len(bytecode) and ops < self.max_ops and _is_inline_control(bytecode, pc):
+            self._charge(bytecode[pc])
+            self._emit_control(bytecode[pc], pc)
+        else:
+            self._flush()
+            self.lines.append(f"return {pc}")
+
+        return self._finish()
+
+    def _charge(self, opcode):
+        if self.schedule is not None:
+            self.gas += self.schedule.cost(opcode)
+
+    def _temp(self):
+        name = f"t{self.temp_count}"
+        self.temp_count += 1
+        return name
+
+    def _constant(self, value):
+        name = f"k{len(self.constants)}"
+        self.constants[name] = value
+        return name
+
+    def _flush(self):
+        if len(self.symbolic) == 1:
+            self.lines.append(f"stack.append({self.symbolic[0]})")
+        elif self.symbolic:
+            self.lines.append(f"stack.extend(({', '.join(self.symbolic)},))")
+        self.symbolic = []
+
+    def _emit(self, opcode, pc):
+        lines = self.lines
+        symbolic = self.symbolic
+
+        if opcode == OpCode.PUSH.value:
+            value = self.bytecode[pc + 1]
+            if type(value) is list or type(value) is dict:
+                # Bound once per program, every push gets its own copy like in the interpreter
+                result = self._temp()
+                self.lines.append(f"{result} = deepcopy({self._constant(value)})")
+                symbolic.append(result)
+            else:
+                symbolic.append(self._constant(value))
+            return pc + 2
+
+        if opcode == OpCode.NOP.value:
+            return pc + 1
+
+        if opcode == OpCode.POP.value:
+            if symbolic:
+                symbolic.pop()  # Constants and temps have no side effects left to run
+            else:
+                lines.append("if stack:")
+                lines.append("    stack.pop()")
+            return pc + 1
+
+        if opcode == OpCode.GET.value:
+            if symbolic:
+                result = self._temp()
+                lines.append(f"{result} = storage.get_var({symbolic.pop()})")
+                symbolic.append(result)
+            else:
+                lines.append("if stack:")
+                lines.append("    stack.append(storage.get_var(stack.pop()))")
+            return pc + 1
+
+        if opcode == OpCode.SET.value:
+            if len(symbolic) >= 2:
+                value = symbolic.pop()
+                key = symbolic.pop()
+                lines.append(f"storage.set_var({key}, {value})")
+            else:
+                self._flush()
+                lines.append("if len(stack) >= 2:")
+                lines.append("    value = stack.pop()")
+                lines.append("    storage.set_var(stack.pop(), value)")
+            return pc + 1
+
+        # Binary op
+        expression = BINARY_EXPRESSIONS[opcode]
+        if len(symbolic) >= 2:
+            b = symbolic.pop()
+            a = symbolic.pop()
+            if opcode in ZERO_CHECKED:
+                lines.append(f"if {b} == 0:")
+                lines.append("    raise ZeroDivisionError(\"Zero division error\")")
+            result = self._temp()
+            lines.append(f"{result} = {expression.format(a=a, b=b)}")
+            symbolic.append(result)
+        else:
+            self._flush()
+            lines.append("if len(stack) >= 2:")
+            lines.append("    b = stack.pop()")
+            lines.append("    a = stack.pop()")
+            if opcode in ZERO_CHECKED:
+                lines.append("    if b == 0:")
+                lines.append("        raise ZeroDivisionError(\"Zero division error\")")
+            lines.append(f"    stack.append({expression.format(a='a', b='b')})")
+        return pc + 1
+
+    def _emit_control(self, opcode, pc):
+        lines = self.lines
+        length = len(self.bytecode)
+
+        if opcode == OpCode.JMP.value:
+            self._flush()
+            if pc + 1 < length:
+                lines.append(f"return {self._constant(self.bytecode[pc + 1])}")
+            else:
+                lines.append(f"return {pc + 1}")
+
+        elif opcode == OpCode.IF.value:
+            expected = self._constant(self.bytecode[pc + 1])
+            if self.symbolic:
+                condition = self.symbolic.pop()
+                self._flush()
+                lines.append(f"return {pc + 3} if {condition} != {expected} else {pc + 2}")
+            else:
+                self._flush()
+                lines.append("if stack:")
+                lines.append(f"    return {pc + 3} if stack.pop() != {expected} else {pc + 2}")
+                lines.append(f"return {pc + 1}")  # Empty stack: the interpreter does not consume the operand
+
+        else:  # HALT
+            self._flush()
+            lines.append("vm.running = False")
+            lines.append(f"vm.pc = {pc + 1}")
+            lines.append(f"return {length}")
+
+    def _finish(self):
+        # Operands are bound as default arguments, so they are fast locals inside the block
+        parameters = "".join(f", {name}={name}" for name in self.constants)
+        source = [f"def block(vm{parameters}):",
+                  "    stack = vm.stack",
+                  "    storage = vm.storage"]
+        if self.schedule is not None:
+            source.extend([f"    vm.gas_used += {self.gas}",
+                           "    if vm.gas_used > vm.gas_limit:",
+                           f"        raise OutOfGasError(f\"Out of gas in block at pc {self.start}: \"",
+                           "                            f\"used {vm.gas_used}, limit {vm.gas_limit}\")"])
+        source.extend("    " + line for line in self.lines)
+
+        namespace = dict(self.constants)
+        namespace["OutOfGasError"] = OutOfGasError
+        namespace["deepcopy"] = copy.deepcopy
+        exec("\n".join(source), namespace)
+        return namespace["block"]
+
+
+def _generic(opcode, next_pc):
+    """
+    Ops that read or move vm.pc themselves run through the VM's own handler,
+    with vm.pc synced before and read back after.
+    """
+    def op(vm):
+        if opcode not in vm.instructions:
+            raise ValueError(f"Unknown opcode: {opcode}")
+        vm.pc = next_pc
+        vm.instructions[opcode]()
+        return vm.pc
+    return op
+
+
+def _generic_metered(opcode, next_pc, cost):
+    def op(vm):
+        vm.gas_used += cost
+        if vm.gas_used > vm.gas_limit:
+            raise OutOfGasError(f"Out of gas at pc {next_pc - 1}: used {vm.gas_used}, limit {vm.gas_limit}")
+        if opcode not in vm.instructions:
+            raise ValueError(f"Unknown opcode: {opcode}")
+        vm.pc = next_pc
+        vm.instructions[opcode]()
+        return vm.pc
+    return op
+
+
+def bytecode_hash(bytecode) -> str:
+    # Operands are ints, strings, lists and dicts, their repr is stable
+    return hashlib.sha256(repr(bytecode).encode("utf-8")).hexdigest()
+
+
+class Compiler:
+    """
+    Keeps CompiledPrograms cached by bytecode hash (and gas schedule for metered programs),
+    so a contract is compiled once per node.
+    """
+
+    DEFAULT_CACHE_SIZE = 256
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # (bytecode hash, schedule key or None) -> CompiledProgram
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, bytecode, schedule=None) -> CompiledProgram:
+        # Packed programs already carry a digest, lists are hashed
+        digest = bytecode.digest if isinstance(bytecode, PackedBytecode) else bytecode_hash(bytecode)
+        key = (digest, schedule.key if schedule is not None else None)
+
+        program = self.cache.get(key)
+        if program is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return program
+
+        self.misses += 1
+        if isinstance(bytecode, PackedBytecode):
+            bytecode = bytecode.unpack()
+        program = CompiledProgram(list(bytecode), schedule)
+
+        self.cache[key] = program
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return program
+
+
+# Shared by every VM in the process
+default_compiler = Compiler()
@@ -1,10 +1,23 @@
-from VM import SANVirtualMachine
-from Storage import Storage
-from OpCode import OpCode
+from SANVM.Storage import Storage
+from SANVM.OverlayStorage import OverlayStorage
+from SANVM.OpCode import OpCode
+from SANVM.Bytecode import function_table
+from SANVM.PackedBytecode import PackedBytecode
+from SANVM.Profiler import Profile
 
 class ContractManager:
-    def __init__(self, storage=None):
+    def __init__(self, storage=None, compiled=False, gas_schedule=None, profile=False):
         self.storage = storage if storage else Storage()
+        self.compiled = compiled
+        self.gas_schedule = gas_schedule
+
+        # With profile on, every deploy and call records a Profile, kept in last_profile
+        self.profile = profile
+        self.last_profile = None
+
+        # Gas used by the last deploy or call (metered runs only), and the storage keys it changed
+        self.last_gas_used = 0
+        self.last_changes = {}
 
         if not hasattr(self.storage, "contracts"):
             if "contracts" not in self.storage.data:
@@ -13,6 +26,15 @@ class ContractManager:
         else:
             self.contracts = self.storage.contracts
 
+    def bound_to(self, contracts):
+        """
+        Manager with the same settings that runs against another contracts mapping,
+        such as the PendingContracts of a block that is being executed.
+        """
+        manager = ContractManager(self.storage, self.compiled, self.gas_schedule, self.profile)
+        manager.contracts = contracts
+        return manager
+
     @staticmethod
     def is_256bit_or_smaller_str(value: str) -> bool:
         # 2^256 = 115792089237316195423570985008687907853269984665640564039457584007913129639936
@@ -30,56 +52,94 @@ class ContractManager:
         else:
             return trimmed_value < max_256_str
 
-    def deploy_contract(self, contract_id, bytecode):
+    def deploy_contract(self, contract_id, bytecode, gas_limit=None):
         is_valid = self.is_256bit_or_smaller_str(contract_id)
 
         if (contract_id in self.contracts) and is_valid:
             raise ValueError("This contract id already exists")
 
-        self.contracts[contract_id] = {
+        # Function entries are found once here, calls jump straight to them
+        if isinstance(bytecode, PackedBytecode):
+            functions = function_table(bytecode.instructions())
+        else:
+            functions = function_table(bytecode)
+
+        # Stored packed: opcode bytes plus a constant pool, far smaller than the list
+        bytecode = PackedBytecode.pack(bytecode)
+
+        contract_info = {
             "bytecode": bytecode,
+            "functions": functions,
             "storage": {}
         }
 
-    def call_contract_function(self, contract_id, function_name, args):
+        # Top level code runs once, at deploy, like a constructor.
+        # The contract is only registered if it finishes (within gas_limit if one is given).
+        _, storage = self._run(contract_info["storage"], functions, bytecode, gas_limit)
+
+        self.last_changes = storage.commit()
+        self.contracts[contract_id] = contract_info
+
+    def call_contract_function(self, contract_id, function_name, args, gas_limit=None):
         if contract_id not in self.contracts:
             raise ValueError(f"{contract_id} is not a valid contract")
 
         contract_info = self.contracts[contract_id]
-        vm = SANVirtualMachine(storage=self._dict_to_storage(contract_info["storage"]))
-
-        temporary_bytecode = list(contract_info["bytecode"])
-
-        temporary_bytecode.append(OpCode.PUSH.value)
-        temporary_bytecode.append(function_name)
 
-        param_count = len(args)
-        temporary_bytecode.append(OpCode.PUSH.value)
-        temporary_bytecode.append(param_count)
+        func_info = contract_info["functions"].get(function_name)
+        if func_info is None:
+            raise KeyError(f"Unkown function: {function_name}")
+        if func_info["param_count"] != len(args):
+            raise ValueError(f"{function_name} need {func_info['param_count']} param")
 
-        for arg in reversed(args):
-            temporary_bytecode.append(OpCode.PUSH.value)
-            temporary_bytecode.append(arg)
+        bytecode = contract_info["bytecode"]
 
-        temporary_bytecode.append(OpCode.CALL_FUNC.value)
-
-        vm.run(temporary_bytecode)
+        # Reads fall through to the contract's own state, only changed keys are written back.
+        # If the call raises, nothing is committed.
+        vm, storage = self._run(contract_info["storage"], contract_info["functions"], bytecode, gas_limit,
+                                start_pc=func_info["pc"], args=args)
 
         return_value = None
         if vm.stack:
             return_value = vm.stack[-1]
 
-        updated_storage = self._storage_to_dict(vm.storage)
-        self.contracts[contract_id]["storage"] = updated_storage
+        self.last_changes = storage.commit()
 
         return return_value
 
-    def _dict_to_storage(self, data_dict):
-        storage = self.storage
-        for key, val in data_dict.items():
-            storage.set_var(key, val)
-        return storage
-
-    @staticmethod
-    def _storage_to_dict(storage_obj):
-        return dict(storage_obj.data)
+    def _run(self, base, functions, bytecode, gas_limit, start_pc=0, args=None):
+        """
+        Runs bytecode on an OverlayStorage over `base`, returns (vm, overlay) if it finishes.
+        With args, the run is a call: it starts at start_pc and returns past the end of the program.
+
+        Compiled metered blocks charge all their ops on entry, so a compiled run that fails has
+        charged ops that never ran. Such a run is done again interpreted, on a fresh overlay,
+        and the interpreter's gas and error are the ones that count.
+        """
+        try:
+            return self._run_once(base, functions, bytecode, gas_limit, start_pc, args, self.compiled)
+        except Exception:
+            if not self.compiled or gas_limit is None:
+                raise
+        return self._run_once(base, functions, bytecode, gas_limit, start_pc, args, False)
+
+    def _run_once(self, base, functions, bytecode, gas_limit, start_pc, args, compiled):
+        from SANVM.VM import SANVirtualMachine  # VM imports this module, so import it here
+
+        storage = OverlayStorage(base, functions)
+        vm = SANVirtualMachine(storage=storage, compiled=compiled, gas_limit=gas_limit,
+                               gas_schedule=self.gas_schedule, profile=Profile() if self.profile else None)
+
+        if args is not None:
+            # Same frame CALL_FUNC pushes, returning past the end of the program ends the run
+            vm.call_stack.append({
+                "pc": len(bytecode),
+                "params": list(args)
+            })
+        try:
+            vm.run(bytecode, start_pc=start_pc)
+        finally:
+            self.last_gas_used = vm.gas_used
+            self.last_profile = vm.profile
+
+        return vm, storage
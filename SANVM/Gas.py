@@ -0,0 +1,71 @@
+import hashlib
+
+from SANVM.OpCode import OpCode
+
+
+class OutOfGasError(Exception):
+    pass
+
+
+class GasSchedule:
+    """
+    Per-opcode gas costs. Opcodes missing from the table cost default_cost.
+    Storage and container ops cost more than pure stack ops, they touch state.
+    """
+
+    DEFAULT_COSTS = {
+        OpCode.SET.value: 20,
+        OpCode.GET.value: 5,
+        OpCode.DELETE.value: 5,
+        OpCode.HAS.value: 5,
+        OpCode.LIST_APPEND.value: 10,
+        OpCode.LIST_REMOVE.value: 10,
+        OpCode.LIST_LEN.value: 5,
+        OpCode.LIST_GET.value: 5,
+        OpCode.DICT_SET.value: 10,
+        OpCode.DICT_GET.value: 5,
+        OpCode.DICT_KEYS.value: 10,
+        OpCode.DEF_FUNC.value: 5,
+        OpCode.CALL_FUNC.value: 10,
+        OpCode.CALL.value: 5,
+        OpCode.FOR_LOOP.value: 5,
+        OpCode.PRINT.value: 5,
+        OpCode.DIV.value: 3,
+        OpCode.MOD.value: 3,
+        OpCode.MUL.value: 2,
+    }
+    DEFAULT_COST = 1
+
+    def __init__(self, costs=None, default_cost=DEFAULT_COST):
+        self.costs = dict(self.DEFAULT_COSTS)
+        if costs:
+            self.costs.update(costs)
+        self.default_cost = default_cost
+
+        # Identifies the table, compiled programs are cached per schedule
+        table = repr((sorted(self.costs.items()), default_cost))
+        self.key = hashlib.sha256(table.encode("utf-8")).hexdigest()
+
+    def cost(self, opcode):
+        # Raises TypeError for unhashable values, same as the VM's opcode lookup
+        return self.costs.get(opcode, self.default_cost)
+
+
+default_schedule = GasSchedule()
+
+
+def transaction_gas_limit(requested, block_gas, tx_gas_limit, block_gas_limit):
+    """
+    Gas a transaction may use: what it asked for, capped by tx_gas_limit and by
+    what is left of block_gas_limit after block_gas was spent by earlier transactions.
+    """
+    remaining = block_gas_limit - block_gas
+    if remaining <= 0:
+        raise Exception(f"Block gas limit reached: {block_gas} of {block_gas_limit}")
+
+    limit = min(tx_gas_limit, remaining)
+    if requested is not None:
+        if not isinstance(requested, int) or requested <= 0:
+            raise Exception(f"Invalid gas limit: {requested}")
+        limit = min(limit, requested)
+    return limit
@@ -0,0 +1,86 @@
+import re
+
+from SANVM.OpCode import OpCode
+from SANVM.Bytecode import OPERAND_OPCODES, VALID_OPCODES, is_opcode, iter_instructions, function_table
+
+
+class Linker:
+    """
+    Link stage for PenaParser output.
+
+    The parser marks jump targets with label pseudo-instructions ("LABEL_3" sitting where an opcode
+    would be) and uses the same names as JMP operands. link() drops the label slots, records the pc
+    each label ends up at, and patches every JMP operand to that integer pc, so a jump is a single
+    pc assignment in the VM and in compiled mode.
+
+    The parser emits IF 1, JMP <label>. An IF whose condition does not match skips one slot, so
+    the VM lands on the JMP's operand and runs it as an opcode. A label name there raised "Unknown
+    opcode", a linked pc like 35 would run LIST_LEN and carry on. Labels such a JMP targets are
+    padded with NOPs up to a pc the VM has no handler for, so that path still raises.
+    """
+
+    LABEL = re.compile(r"LABEL_\d+\Z")
+
+    @classmethod
+    def is_label(cls, value):
+        return isinstance(value, str) and cls.LABEL.match(value) is not None
+
+    def link(self, bytecode):
+        """
+        Returns (linked bytecode, symbol table). The symbol table is for debugging:
+            {"labels": {label: pc}, "functions": {name: body entry pc}}
+        Raises ValueError for a jump to a label that is never defined.
+        """
+        linked = []
+        labels = {}
+        fixups = []  # (operand position in linked, label)
+        guarded = self._skipped_jump_labels(bytecode)
+
+        pc = 0
+        while pc < len(bytecode):
+            opcode = bytecode[pc]
+            pc += 1
+
+            if self.is_label(opcode):
+                if opcode in labels:
+                    raise ValueError(f"Label defined twice: {opcode}")
+                if opcode in guarded:
+                    while is_opcode(len(linked), VALID_OPCODES):
+                        linked.append(OpCode.NOP.value)
+                labels[opcode] = len(linked)
+                continue
+
+            linked.append(opcode)
+
+            # Operand slots are copied as they are, a PUSH of the string "LABEL_1" stays a string
+            if is_opcode(opcode, OPERAND_OPCODES) and pc < len(bytecode):
+                operand = bytecode[pc]
+                pc += 1
+                if opcode == OpCode.JMP.value and self.is_label(operand):
+                    fixups.append((len(linked), operand))
+                linked.append(operand)
+
+        for position, label in fixups:
+            if label not in labels:
+                raise ValueError(f"Undefined label: {label}")
+            linked[position] = labels[label]
+
+        symbols = {
+            "labels": labels,
+            "functions": {name: info["pc"] for name, info in function_table(linked).items()}
+        }
+        return linked, symbols
+
+    def _skipped_jump_labels(self, bytecode):
+        """
+        Labels of JMPs that come right after an IF, the operands an IF that does not match runs as opcodes.
+        """
+        labels = set()
+        previous = None
+        for _, opcode, operand in iter_instructions(bytecode):
+            if self.is_label(opcode):
+                continue  # Dropped by link(), the instructions around it end up next to each other
+            if previous == OpCode.IF.value and opcode == OpCode.JMP.value and self.is_label(operand):
+                labels.add(operand)
+            previous = opcode
+        return labels
@@ -0,0 +1,401 @@
+import copy
+
+from SANVM.OpCode import OpCode
+from SANVM.Bytecode import OPERAND_OPCODES, VALID_OPCODES, is_opcode, iter_instructions, function_table
+from SANVM.Gas import OutOfGasError
+
+
+PUSH, POP, JMP, IF, NOP, HALT, DUP = (OpCode.PUSH.value, OpCode.POP.value, OpCode.JMP.value, OpCode.IF.value,
+                                      OpCode.NOP.value, OpCode.HALT.value, OpCode.DUP.value)
+RET, DEF_FUNC, CALL_FUNC, FOR_LOOP = (OpCode.RET.value, OpCode.DEF_FUNC.value, OpCode.CALL_FUNC.value,
+                                      OpCode.FOR_LOOP.value)
+LOOP_JUMPS = {OpCode.CONTINUE_LOOP.value, OpCode.BREAK_LOOP.value}
+
+# Constant folding, same results as the VM handlers. DIV and MOD by zero are left to raise at runtime.
+FOLDABLE = {
+    OpCode.ADD.value: lambda a, b: a + b,
+    OpCode.SUB.value: lambda a, b: a - b,
+    OpCode.MUL.value: lambda a, b: a * b,
+    OpCode.DIV.value: lambda a, b: a // b if b != 0 else None,
+    OpCode.MOD.value: lambda a, b: a % b if b != 0 else None,
+    OpCode.AND.value: lambda a, b: 1 if (a != 0 and b != 0) else 0,
+    OpCode.OR.value: lambda a, b: 1 if (a != 0 or b != 0) else 0,
+    OpCode.XOR.value: lambda a, b: 1 if (bool(a) != bool(b)) else 0,
+    OpCode.EQ.value: lambda a, b: 1 if a == b else 0,
+    OpCode.NEQ.value: lambda a, b: 1 if a != b else 0,
+    OpCode.LT.value: lambda a, b: 1 if a < b else 0,
+    OpCode.LTE.value: lambda a, b: 1 if a <= b else 0,
+    OpCode.GT.value: lambda a, b: 1 if a > b else 0,
+    OpCode.GTE.value: lambda a, b: 1 if a >= b else 0,
+}
+
+# Stack effect of each op as (items it needs, net change). The VM skips an op that finds too few items.
+STACK_EFFECTS = {
+    PUSH: (0, 1), POP: (1, -1), DUP: (1, 1), IF: (1, -1),
+    OpCode.SWAP.value: (2, 0), OpCode.OVER.value: (2, 1), OpCode.ROT.value: (3, 0),
+    OpCode.SET.value: (2, -2), OpCode.GET.value: (1, 0), OpCode.DELETE.value: (1, -1), OpCode.HAS.value: (1, 0),
+    OpCode.LIST_APPEND.value: (2, -2), OpCode.LIST_REMOVE.value: (2, -2), OpCode.LIST_LEN.value: (1, 0),
+    OpCode.LIST_GET.value: (2, -1), OpCode.DICT_SET.value: (3, -3), OpCode.DICT_GET.value: (2, -1),
+    OpCode.DICT_KEYS.value: (1, 0), FOR_LOOP: (2, -2), DEF_FUNC: (2, -2),
+}
+STACK_EFFECTS.update({opcode: (2, -1) for opcode in FOLDABLE})
+
+MAX_FOLDED_BITS = 256
+
+
+class UnsafeProgram(Exception):
+    """
+    The program relies on something the optimizer can not follow, it is left as it is.
+    """
+
+
+class _Analysis:
+    """
+    Control flow facts of one bytecode list.
+
+    instructions  pc -> (opcode, operand, size), decoded from pc 0 the way iter_instructions does
+    reachable     instruction pcs some entry can get to, with the least stack depth they can see
+    leaders       pcs that are entered by anything other than falling through
+    frozen        instructions whose exact slots matter (the one an IF skips, ones a jump lands inside)
+    landed        instructions a jump or an IF lands inside of, their operand runs as an opcode
+    landings      DEF_FUNC pc -> slot its RET scan stops at
+    """
+
+    def __init__(self, bytecode):
+        self.bytecode = bytecode
+        self.length = len(bytecode)
+        self.instructions = {}  # pc -> (opcode, operand, size)
+        for pc, opcode, operand in iter_instructions(bytecode):
+            size = 2 if is_opcode(opcode, OPERAND_OPCODES) else 1
+            if pc + size > self.length:
+                raise UnsafeProgram(f"Truncated instruction at pc {pc}")
+            if opcode == OpCode.CALL.value:
+                raise UnsafeProgram("CALL jumps to an address taken from the stack")
+            if opcode == JMP and (type(operand) is not int or operand < 0):
+                raise UnsafeProgram(f"JMP to a non address at pc {pc}: {operand!r}")
+            self.instructions[pc] = (opcode, operand, size)
+
+        self.slot_owner = {}  # operand slot -> pc of its instruction
+        for pc, (_, _, size) in self.instructions.items():
+            if size == 2:
+                self.slot_owner[pc + 1] = pc
+
+        self.loop_starts = [pc + 1 for pc, (opcode, _, _) in self.instructions.items() if opcode == FOR_LOOP]
+        self.leaders = set(self.loop_starts)
+        self.frozen = set()
+        self.landed = set()
+        self.landings = {}
+        self.reachable = {}
+        self._walk()
+
+    def _entries(self):
+        # Top level code, function bodies (DEF_FUNC records the pc after it) and CALL_FUNC return sites
+        entries = [0]
+        for pc, (opcode, _, _) in self.instructions.items():
+            if opcode in (DEF_FUNC, CALL_FUNC):
+                entries.append(pc + 1)
+        return entries
+
+    def _ret_scan(self, pc):
+        # DEF_FUNC skips its body by scanning slots, operands included, for the first RET value
+        position = pc + 1
+        while position < self.length and self.bytecode[position] != RET:
+            position += 1
+        return position
+
+    def _successors(self, pc, opcode, operand, size, depth):
+        following = pc + size
+        if opcode == JMP:
+            return [operand]
+        if opcode == HALT or not is_opcode(opcode, VALID_OPCODES):
+            return []  # Stops, or raises "Unknown opcode"
+        if opcode == IF:
+            # Pops the condition and skips one slot if it does not match. On an empty stack it does
+            # nothing and the expected value slot runs as an opcode.
+            self.frozen.update(target for target in (pc + 2,) if target in self.instructions)
+            targets = [pc + 2, pc + 3]
+            return targets if depth >= 1 else [pc + 1] + targets
+        if opcode == DEF_FUNC:
+            self.landings[pc] = self._ret_scan(pc)
+            return [self.landings[pc]]
+        if opcode in LOOP_JUMPS:
+            return [following] + self.loop_starts
+        return [following]
+
+    def _depth_after(self, opcode, depth):
+        if not is_opcode(opcode, STACK_EFFECTS):
+            return depth
+        needs, change = STACK_EFFECTS[opcode]
+        if depth >= needs:
+            return depth + change
+        return max(0, min(depth, needs + change))
+
+    def _walk(self):
+        work = []
+        for entry in self._entries():
+            self.leaders.add(entry)
+            work.append((entry, 0))
+
+        while work:
+            pc, depth = work.pop()
+            if pc >= self.length:
+                continue
+            if pc not in self.instructions:
+                self._land_inside(pc)
+                continue
+            if pc in self.reachable and self.reachable[pc] <= depth:
+                continue
+            self.reachable[pc] = depth
+
+            opcode, operand, size = self.instructions[pc]
+            after = 0 if opcode == CALL_FUNC else self._depth_after(opcode, depth)
+            for target in self._successors(pc, opcode, operand, size, depth):
+                if target != pc + size:
+                    self.leaders.add(target)
+                work.append((target, after))
+
+    def _land_inside(self, slot):
+        # A jump into the middle of an instruction runs its operand as an opcode. Only followed when
+        # that value is not an opcode, the VM raises there and nothing runs after it.
+        value = self.bytecode[slot]
+        if is_opcode(value, VALID_OPCODES):
+            raise UnsafeProgram(f"Jump into pc {slot - 1} runs operand {value!r} as an opcode")
+        self.frozen.add(self.slot_owner[slot])
+        self.landed.add(self.slot_owner[slot])
+
+
+class PeepholeOptimizer:
+    """
+    Optional pass over linked PenaParser output, run before deploy:
+        - constant folding: PUSH a, PUSH b, <binary op> -> PUSH result, for int operands
+        - dead code: instructions no entry point reaches, NOPs, JMPs to the next instruction
+        - jump threading: a JMP to a JMP goes straight to the final target, a JMP to HALT becomes HALT
+        - PUSH x, POP and DUP, POP pairs are dropped
+
+    Behaviour depends on exact slot positions in this VM: IF skips one slot, DEF_FUNC scans for the
+    first RET value, RET without a frame falls through. So rewrites never cross a jump target, the
+    instruction an IF skips and instructions a jump lands inside are kept as they are, and every round
+    is checked against these facts. A program the checks can not follow is returned unchanged.
+
+    With differential=True every optimized program is also run next to the original on
+    SANVirtualMachine (deploy and each function), and ValueError is raised if the results differ.
+    """
+
+    MAX_ROUNDS = 8
+
+    def __init__(self, differential=False):
+        self.differential = differential
+        self.pc_map = {}  # original pc -> optimized pc, for the last optimize() call
+        self.skipped = None  # Why the last optimize() stopped before a fixed point, if it did
+
+    def optimize(self, bytecode):
+        bytecode = list(bytecode)
+        self.pc_map = {pc: pc for pc, _, _ in iter_instructions(bytecode)}
+        self.pc_map[len(bytecode)] = len(bytecode)
+        self.skipped = None
+
+        optimized = bytecode
+        for _ in range(self.MAX_ROUNDS):
+            try:
+                result, mapping = self._round(optimized)
+            except UnsafeProgram as e:
+                self.skipped = f"{e}"
+                break
+            if result == optimized:
+                break
+            optimized = result
+            self.pc_map = {pc: mapping[new] for pc, new in self.pc_map.items()}
+
+        if self.differential and optimized != bytecode:
+            mismatches = differential_check(bytecode, optimized)
+            if mismatches:
+                raise ValueError(f"Optimized bytecode differs from the original: {mismatches}")
+
+        return optimized
+
+    def _round(self, bytecode):
+        analysis = _Analysis(bytecode)
+        out = []  # [opcode, operand, original pc, entered from elsewhere, frozen] of kept instructions
+        entered = False  # A dropped instruction was a jump target, the next one kept takes its place
+
+        for pc in sorted(analysis.instructions):
+            opcode, operand, _ = analysis.instructions[pc]
+            if pc not in analysis.reachable:
+                continue
+            frozen = pc in analysis.frozen
+            entered = entered or pc in analysis.leaders
+
+            if not frozen and opcode == NOP:
+                continue
+            if opcode == JMP:
+                operand = self._thread(analysis, operand)
+                if not frozen and operand == pc + 2:
+                    continue
+                if not frozen and analysis.instructions.get(operand, (None,))[0] == HALT:
+                    opcode, operand = HALT, None
+
+            out.append([opcode, operand, pc, entered, frozen])
+            entered = self._reduce(out)
+
+        optimized, mapping = self._emit(out, analysis)
+        self._check(analysis, optimized, mapping)
+        return optimized, mapping
+
+    @staticmethod
+    def _thread(analysis, target):
+        seen = set()
+        while target not in seen and target in analysis.instructions:
+            opcode, operand, _ = analysis.instructions[target]
+            if opcode != JMP:
+                break
+            seen.add(target)
+            target = operand
+        return target
+
+    @staticmethod
+    def _reduce(out):
+        """
+        Rewrites the tail of out. Only the first instruction of a rewritten run may be a jump target.
+        Returns True when a dropped jump target leaves the next instruction to be entered instead.
+        """
+        def free(items):
+            return not any(item[4] for item in items) and not any(item[3] for item in items[1:])
+
+        while True:
+            if len(out) >= 2 and out[-1][0] == POP and out[-2][0] in (PUSH, DUP) and free(out[-2:]):
+                entered = out[-2][3]
+                del out[-2:]
+                if entered:
+                    return True
+                continue
+
+            if len(out) >= 3 and is_opcode(out[-1][0], FOLDABLE) and out[-2][0] == PUSH and out[-3][0] == PUSH \
+                    and free(out[-3:]):
+                a, b = out[-3][1], out[-2][1]
+                if type(a) is int and type(b) is int:
+                    value = FOLDABLE[out[-1][0]](a, b)
+                    # A new RET value inside a function body would end DEF_FUNC's scan early
+                    if value is not None and value != RET and value.bit_length() <= MAX_FOLDED_BITS:
+                        out[-3:] = [[PUSH, value, out[-3][2], out[-3][3], False]]
+                        continue
+            return False
+
+    @classmethod
+    def _emit(cls, out, analysis):
+        """
+        Lays out the kept instructions. A landed JMP's operand runs as an opcode (Linker output puts
+        IF 1, JMP <pc> there), so its new target pc must stay a value the VM has no handler for.
+        NOPs go in front of a target until it is one, the way Linker pads labels.
+        """
+        padding = {}  # index in out -> NOPs in front of that instruction (len(out): the end)
+        while True:
+            mapping, position = cls._layout(out, analysis, padding)
+            starts = {mapping[item[2]]: index for index, item in enumerate(out)}
+            starts.setdefault(position, len(out))
+
+            short = [starts[cls._target(item[1], mapping, analysis, position)] for item in out
+                     if item[0] == JMP and item[2] in analysis.landed
+                     and is_opcode(cls._target(item[1], mapping, analysis, position), VALID_OPCODES)]
+            if not short:
+                break
+            index = short[0]
+            if 0 < index < len(out) and out[index - 1][0] in (IF, DEF_FUNC):
+                raise UnsafeProgram(f"No room for padding in front of pc {out[index][2]}")
+            padding[index] = padding.get(index, 0) + 1
+
+        optimized = []
+        for index, (opcode, operand, *_) in enumerate(out):
+            optimized.extend([NOP] * padding.get(index, 0))
+            optimized.append(opcode)
+            if opcode == JMP:
+                optimized.append(cls._target(operand, mapping, analysis, position))
+            elif is_opcode(opcode, OPERAND_OPCODES):
+                optimized.append(operand)
+        optimized.extend([NOP] * padding.get(len(out), 0))
+        return optimized, mapping
+
+    @staticmethod
+    def _layout(out, analysis, padding):
+        mapping = {}
+        position = 0
+        for index, item in enumerate(out):
+            position += padding.get(index, 0)
+            mapping[item[2]] = position
+            position += 2 if is_opcode(item[0], OPERAND_OPCODES) else 1
+        position += padding.get(len(out), 0)
+
+        # Dropped instructions (and the end of the program) map to the next instruction kept
+        following = position
+        for pc in range(analysis.length, -1, -1):
+            if pc in mapping:
+                following = mapping[pc]
+            elif pc in analysis.instructions or pc == analysis.length:
+                mapping[pc] = following
+        for slot, owner in analysis.slot_owner.items():
+            if owner in mapping and slot not in mapping:
+                mapping[slot] = mapping[owner] + 1
+        return mapping, position
+
+    @staticmethod
+    def _target(operand, mapping, analysis, position):
+        return mapping.get(operand, position) if operand <= analysis.length else position
+
+    @staticmethod
+    def _check(analysis, optimized, mapping):
+        after = _Analysis(optimized)
+
+        for pc, landing in analysis.landings.items():
+            if after.landings.get(mapping[pc]) != mapping.get(landing, len(optimized)):
+                raise UnsafeProgram(f"DEF_FUNC at pc {pc} would skip to a different slot")
+
+        before_functions = function_table(analysis.bytecode)
+        after_functions = function_table(optimized)
+        if list(after_functions) != list(before_functions) or any(
+                after_functions[name] != {"pc": mapping[info["pc"]], "param_count": info["param_count"]}
+                for name, info in before_functions.items()):
+            raise UnsafeProgram("Function table would change")
+
+
+DIFFERENTIAL_GAS_LIMIT = 1_000_000
+
+
+def _observe(bytecode, gas_limit):
+    """
+    Deploy run and a call of every function on the state it left, like ContractManager does.
+    Each run gives (error type, stack, storage, functions), or None if it ran out of gas.
+    """
+    from SANVM.VM import SANVirtualMachine  # VM is not needed unless a differential run is asked for
+
+    def outcome(vm, start_pc=0):
+        try:
+            # A copy each run, list and dict operands end up in storage and are changed in place there
+            vm.run(copy.deepcopy(bytecode), start_pc=start_pc)
+            error = None
+        except OutOfGasError:
+            return None
+        except Exception as e:
+            error = type(e).__name__
+        functions = [(name, info["param_count"]) for name, info in vm.storage.functions.items()]
+        return error, vm.stack, vm.storage.data, functions
+
+    deploy = SANVirtualMachine(gas_limit=gas_limit)
+    results = [("deploy", outcome(deploy))]
+
+    for name, info in function_table(bytecode).items():
+        vm = SANVirtualMachine(storage=copy.deepcopy(deploy.storage), gas_limit=gas_limit)
+        vm.call_stack.append({"pc": len(bytecode), "params": [0] * info["param_count"]})
+        results.append((name, outcome(vm, info["pc"])))
+
+    return results
+
+
+def differential_check(original, optimized, gas_limit=DIFFERENTIAL_GAS_LIMIT):
+    """
+    Runs both programs and returns [(run, original result, optimized result), ...] for every run that
+    differs. Runs where either side goes over gas_limit are not compared (optimized code uses less gas).
+    """
+    mismatches = []
+    for (run, before), (_, after) in zip(_observe(original, gas_limit), _observe(optimized, gas_limit)):
+        if before is not None and after is not None and before != after:
+            mismatches.append((run, before, after))
+    return mismatches
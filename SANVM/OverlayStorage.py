@@ -0,0 +1,90 @@
+import copy
+
+from SANVM.Storage import Storage
+
+
+class OverlayStorage(Storage):
+    """
+    Copy-on-write view over a contract's committed storage dict.
+
+    Reads fall through to the committed state, writes and deletes only go to the overlay.
+    Lists and dicts are copied into the overlay the first time they are read, because the VM
+    mutates them in place (LIST_APPEND, DICT_SET ...).
+    commit() writes back only the keys that actually changed. Dropping the overlay discards the call.
+    """
+
+    DELETED = object()  # Marks a key deleted in the overlay
+
+    def __init__(self, base, functions=None):
+        super().__init__()
+        self.base = base
+        self.dirty = {}  # key -> new value or DELETED
+        self.functions = dict(functions) if functions else {}
+
+    def set_var(self, key, value):
+        self.dirty[key] = value
+
+    def get_var(self, key):
+        if key in self.dirty:
+            value = self.dirty[key]
+            return 0 if value is self.DELETED else value
+
+        value = self.base.get(key, 0)
+        if isinstance(value, (list, dict)):
+            value = copy.deepcopy(value)
+            self.dirty[key] = value
+        return value
+
+    def delete_var(self, key):
+        if self.has_var(key):
+            self.dirty[key] = self.DELETED
+
+    def has_var(self, key):
+        if key in self.dirty:
+            return self.dirty[key] is not self.DELETED
+        return key in self.base
+
+    @property
+    def data(self):
+        """
+        Merged view, O(state). Only for inspection, the VM never needs it.
+        """
+        merged = dict(self.base)
+        for key, value in self.dirty.items():
+            if value is self.DELETED:
+                merged.pop(key, None)
+            else:
+                merged[key] = value
+        return merged
+
+    @data.setter
+    def data(self, value):
+        # Storage.__init__ assigns data, the overlay keeps its state in base and dirty instead
+        pass
+
+    def changes(self):
+        """
+        Keys whose value differs from the committed state: key -> new value or DELETED.
+        """
+        changed = {}
+        for key, value in self.dirty.items():
+            if value is self.DELETED:
+                if key in self.base:
+                    changed[key] = value
+            elif key not in self.base or self.base[key] != value:
+                changed[key] = value
+        return changed
+
+    def commit(self):
+        """
+        Writes the changed keys into the committed state and returns them.
+        """
+        changed = self.changes()
+        for key, value in changed.items():
+            if value is self.DELETED:
+                del self.base[key]
+            else:
+                self.base[key] = value
+
+        self.dirty = {}
+        return changed
@@ -0,0 +1,245 @@
+import ast
+import copy
+import json
+import struct
+import hashlib
+from collections import OrderedDict
+
+
+class PackedBytecode:
+    """
+    Compact, immutable container for a bytecode list.
+
+    Every slot of the list (opcode or operand) becomes one entry in `code`:
+        0x00-0xEF, 0xFF   the small int itself, in one byte (all opcodes, most counts and offsets)
+        0xF0 + varint i   constants[i], for everything else (strings, big or negative ints, lists, dicts)
+    Equal constants are stored once. Slots keep their positions, so pcs, jump targets and function
+    entries mean the same thing in both forms.
+
+    Serialized form (to_bytes), little endian:
+        4s magic b"SANP", u8 version, varint slot count, varint constant count,
+        constants: u8 tag (0 int, 1 str, 3 literal) + varint length + payload,
+        varint code length + code
+
+    Other constants are written as Python literals (repr, read back with ast.literal_eval), which keep
+    int dict keys, tuples, floats and key order as they were. Version 1 wrote them as JSON (tag 2),
+    which turned {1: 2} into {"1": 2}. Version 1 data is still read.
+    """
+
+    MAGIC = b"SANP"
+    VERSION = 2
+    READABLE_VERSIONS = (1, 2)
+    HEADER = struct.Struct("<4sB")
+
+    CONSTANT = 0xF0
+    TAG_INT, TAG_STR, TAG_JSON, TAG_LITERAL = 0, 1, 2, 3
+
+    __slots__ = ("code", "constants", "length", "digest")
+
+    def __init__(self, code, constants, length):
+        self.code = bytes(code)
+        self.constants = tuple(constants)
+        self.length = length  # slot count, len() of the unpacked list
+        self.digest = hashlib.sha256(self.to_bytes()).hexdigest()
+
+    def __len__(self):
+        return self.length
+
+    def __eq__(self, other):
+        return isinstance(other, PackedBytecode) and other.digest == self.digest
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __repr__(self):
+        return f"PackedBytecode({self.length} slots, {len(self.code)} code bytes, {len(self.constants)} constants)"
+
+    @staticmethod
+    def _inline(value):
+        return type(value) is int and (0 <= value < PackedBytecode.CONSTANT or value == 0xFF)
+
+    @classmethod
+    def pack(cls, bytecode):
+        if isinstance(bytecode, PackedBytecode):
+            return bytecode
+
+        code = bytearray()
+        constants = []
+        index = {}  # constant key -> position in constants
+
+        for value in bytecode:
+            if cls._inline(value):
+                code.append(value)
+                continue
+
+            key = cls._constant_key(value)
+            position = index.get(key)
+            if position is None:
+                position = len(constants)
+                index[key] = position
+                constants.append(value)
+
+            code.append(cls.CONSTANT)
+            _write_varint(code, position)
+
+        return cls(code, constants, len(bytecode))
+
+    @staticmethod
+    def _constant_key(value):
+        # 1, True and "1" are different constants, and so are {1: 2}, {"1": 2} and {True: 2}
+        if type(value) in (int, str):
+            return type(value).__name__, value
+        literal = repr(value)
+        try:
+            if ast.literal_eval(literal) != value:
+                raise ValueError(literal)
+        except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+            raise ValueError(f"Bytecode constant can not be packed: {value!r}")
+        return type(value).__name__, literal
+
+    def unpack(self):
+        """
+        The bytecode list, decoded from the code bytes. Container constants are copied, so the
+        caller can not change the packed program.
+        """
+        constants = self.constants
+        view = memoryview(self.code)
+        end = len(view)
+        out = []
+        append = out.append
+        offset = 0
+
+        while offset < end:
+            byte = view[offset]
+            offset += 1
+            if byte != self.CONSTANT:
+                append(byte)
+                continue
+
+            position, offset = _read_varint(view, offset)
+            value = constants[position]
+            if isinstance(value, (list, dict)):
+                value = copy.deepcopy(value)
+            append(value)
+
+        return out
+
+    def instructions(self):
+        """
+        Decoded list for execution, shared through a small LRU keyed by digest. Do not modify it,
+        the VM pushes list and dict constants as copies so runs can not change it either.
+        """
+        return default_cache.get(self)
+
+    # Serialization
+
+    def to_bytes(self) -> bytes:
+        out = bytearray(self.HEADER.pack(self.MAGIC, self.VERSION))
+        _write_varint(out, self.length)
+        _write_varint(out, len(self.constants))
+
+        for value in self.constants:
+            if type(value) is int:
+                tag, payload = self.TAG_INT, str(value).encode("ascii")
+            elif type(value) is str:
+                tag, payload = self.TAG_STR, value.encode("utf-8")
+            else:
+                tag, payload = self.TAG_LITERAL, repr(value).encode("utf-8")
+            out.append(tag)
+            _write_varint(out, len(payload))
+            out += payload
+
+        _write_varint(out, len(self.code))
+        out += self.code
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        view = memoryview(data)
+        try:
+            magic, version = cls.HEADER.unpack_from(view, 0)
+            if magic != cls.MAGIC:
+                raise ValueError("Not packed bytecode")
+            if version not in cls.READABLE_VERSIONS:
+                raise ValueError(f"Unsupported packed bytecode version: {version}")
+
+            offset = cls.HEADER.size
+            length, offset = _read_varint(view, offset)
+            count, offset = _read_varint(view, offset)
+
+            constants = []
+            for _ in range(count):
+                tag = view[offset]
+                size, offset = _read_varint(view, offset + 1)
+                payload = str(view[offset:offset + size], "utf-8")
+                offset += size
+                if tag == cls.TAG_INT:
+                    constants.append(int(payload))
+                elif tag == cls.TAG_STR:
+                    constants.append(payload)
+                elif tag == cls.TAG_JSON:
+                    constants.append(json.loads(payload))
+                elif tag == cls.TAG_LITERAL and version >= 2:
+                    constants.append(cls._literal(payload))
+                else:
+                    raise ValueError(f"Unknown constant tag: {tag}")
+
+            size, offset = _read_varint(view, offset)
+            if offset + size > len(view):
+                raise ValueError("Truncated packed bytecode")
+            return cls(view[offset:offset + size], constants, length)
+        except (struct.error, IndexError) as e:
+            raise ValueError(f"Truncated packed bytecode: {e}")
+
+    @staticmethod
+    def _literal(payload):
+        try:
+            return ast.literal_eval(payload)
+        except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+            raise ValueError(f"Bad constant in packed bytecode: {payload[:80]!r}")
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(view, offset):
+    result = 0
+    shift = 0
+    while True:
+        byte = view[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, offset
+        shift += 7
+
+
+class UnpackedCache:
+    """
+    Decoded lists of recently run packed programs, by digest.
+    """
+
+    DEFAULT_SIZE = 256
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, packed):
+        bytecode = self.entries.get(packed.digest)
+        if bytecode is not None:
+            self.entries.move_to_end(packed.digest)
+            return bytecode
+
+        bytecode = packed.unpack()
+        self.entries[packed.digest] = bytecode
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return bytecode
+
+
+default_cache = UnpackedCache()
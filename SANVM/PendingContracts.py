@@ -0,0 +1,98 @@
+from collections.abc import MutableMapping
+
+
+class PendingStorage(MutableMapping):
+    """
+    Copy-on-write layer over one contract's committed storage dict.
+    Reads fall through to the committed dict, writes and deletes stay in the layer.
+    """
+
+    DELETED = object()  # Marks a key deleted in the layer
+
+    def __init__(self, base):
+        self.base = base
+        self.dirty = {}  # key -> new value or DELETED
+
+    def __getitem__(self, key):
+        if key in self.dirty:
+            value = self.dirty[key]
+            if value is self.DELETED:
+                raise KeyError(key)
+            return value
+        return self.base[key]
+
+    def get(self, key, default=None):
+        if key in self.dirty:
+            value = self.dirty[key]
+            return default if value is self.DELETED else value
+        return self.base.get(key, default)
+
+    def __contains__(self, key):
+        if key in self.dirty:
+            return self.dirty[key] is not self.DELETED
+        return key in self.base
+
+    def __setitem__(self, key, value):
+        self.dirty[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.dirty[key] = self.DELETED
+
+    def __iter__(self):
+        for key in self.base:
+            if self.dirty.get(key) is not self.DELETED:
+                yield key
+        for key, value in self.dirty.items():
+            if value is not self.DELETED and key not in self.base:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class PendingContracts(MutableMapping):
+    """
+    The node's contracts (contract_id -> contract_info) as seen by a block that is being executed.
+
+    A contract is copied the first time the block touches it, with its storage behind a PendingStorage,
+    and contracts deployed by the block only live here. The committed contracts never change, so a
+    block that fails, or one that is not accepted, is dropped with nothing to undo. What the block
+    changed is collected into a StateDiff, and applying it commits the block.
+    """
+
+    def __init__(self, committed):
+        self.committed = committed
+        self.pending = {}  # contract_id -> contract_info touched or deployed by the block
+
+    def __getitem__(self, contract_id):
+        info = self.pending.get(contract_id)
+        if info is None:
+            committed = self.committed[contract_id]
+            info = dict(committed, storage=PendingStorage(committed["storage"]))
+            self.pending[contract_id] = info
+        return info
+
+    def get(self, contract_id, default=None):
+        if contract_id in self:
+            return self[contract_id]
+        return default
+
+    def __contains__(self, contract_id):
+        return contract_id in self.pending or contract_id in self.committed
+
+    def __setitem__(self, contract_id, info):
+        self.pending[contract_id] = info
+
+    def __delitem__(self, contract_id):
+        raise TypeError("Contracts are never removed")
+
+    def __iter__(self):
+        yield from self.committed
+        for contract_id in self.pending:
+            if contract_id not in self.committed:
+                yield contract_id
+
+    def __len__(self):
+        return len(self.committed) + sum(1 for contract_id in self.pending if contract_id not in self.committed)
@@ -0,0 +1,92 @@
+from SANVM.OpCode import OpCode
+
+
+def opcode_name(opcode):
+    try:
+        return OpCode(opcode).name
+    except (ValueError, TypeError):
+        return repr(opcode)
+
+
+class Profile:
+    """
+    What one or more VM runs executed, filled in by SANVirtualMachine.run_profiled:
+        counts  opcode -> executions
+        times   opcode -> nanoseconds spent in its handler
+        pcs     pc -> executions, the hot spots of the program
+        calls   function name -> calls (entries from storage.functions, and CALL_FUNC)
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.times = {}
+        self.pcs = {}
+        self.calls = {}
+        self.runs = 0
+
+    def enter(self, functions, start_pc):
+        # A run that starts at a function entry is a call of that function
+        self.runs += 1
+        if start_pc:
+            for name, info in functions.items():
+                if info["pc"] == start_pc:
+                    self.call(name)
+
+    def call(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def call_func(self, stack, functions):
+        # CALL_FUNC pops the param count, then the name
+        if len(stack) >= 2:
+            try:
+                if stack[-2] in functions:
+                    self.call(stack[-2])
+            except TypeError:  # Unhashable name, the VM raises on it
+                pass
+
+    def merge(self, other):
+        for mine, theirs in ((self.counts, other.counts), (self.times, other.times),
+                             (self.pcs, other.pcs), (self.calls, other.calls)):
+            for key, value in theirs.items():
+                mine[key] = mine.get(key, 0) + value
+        self.runs += other.runs
+        return self
+
+    def report(self, top=20):
+        """
+        Structured summary: opcodes by total time, the `top` hottest pcs and function calls.
+        """
+        opcodes = [{"opcode": opcode_name(opcode), "count": count, "time_ns": self.times.get(opcode, 0),
+                    "avg_ns": self.times.get(opcode, 0) / count}
+                   for opcode, count in self.counts.items()]
+        opcodes.sort(key=lambda entry: entry["time_ns"], reverse=True)
+
+        hot_pcs = sorted(self.pcs.items(), key=lambda item: item[1], reverse=True)[:top]
+
+        return {
+            "runs": self.runs,
+            "instructions": sum(self.counts.values()),
+            "time_ns": sum(self.times.values()),
+            "opcodes": opcodes,
+            "hot_pcs": [{"pc": pc, "count": count} for pc, count in hot_pcs],
+            "functions": dict(self.calls),
+        }
+
+
+def block_report(call_profiles, top=20):
+    """
+    Aggregate of a block's contract calls, from [(tx hash, contract_id, Profile), ...].
+    pcs only mean something inside one program, so hot pcs are reported per contract.
+    """
+    total = Profile()
+    contracts = {}
+    for _, contract_id, profile in call_profiles:
+        total.merge(profile)
+        contracts.setdefault(contract_id, Profile()).merge(profile)
+
+    report = total.report(top)
+    del report["hot_pcs"]
+    report["calls"] = len(call_profiles)
+    report["mode"] = "interpreted"  # Profiled runs always interpret, even on a node running compiled
+    report["contracts"] = {contract_id: profile.report(top) for contract_id, profile in contracts.items()}
+    return report
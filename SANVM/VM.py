@@ -1,9 +1,15 @@
-from OpCode import OpCode
-from Storage import Storage
+import copy
+import time
+
+from SANVM.OpCode import OpCode
+from SANVM.Storage import Storage
 from SANVM.ContractManager import ContractManager
+from SANVM.Compiler import default_compiler
+from SANVM.Gas import OutOfGasError, default_schedule
+from SANVM.PackedBytecode import PackedBytecode
 
 class SANVirtualMachine:
-    def __init__(self, storage=None):
+    def __init__(self, storage=None, compiled=False, gas_limit=None, gas_schedule=None, profile=None):
         self.stack = []
         self.call_stack = []
         self.loop_stack = []
@@ -11,9 +17,21 @@ class SANVirtualMachine:
         self.pc = 0 # Bytecode queue
         self.bytecode = []
 
+        # Compiled mode runs pre-bound closures instead of dispatching through self.instructions
+        self.compiled = compiled
+
+        # Gas metering is on when gas_limit is set. Every op is charged before it runs,
+        # and OutOfGasError is raised once gas_used goes over the limit.
+        self.gas_limit = gas_limit
+        self.gas_schedule = gas_schedule if gas_schedule else default_schedule
+        self.gas_used = 0
+
+        # Profiling is on when a Profiler.Profile is given, runs then record every op into it
+        self.profile = profile
+
         self.storage = storage if storage else Storage()
 
-        self.contract_manager = ContractManager(self.storage)
+        self.contract_manager = ContractManager(self.storage, compiled=compiled, gas_schedule=gas_schedule)
 
         self.instructions = {
             OpCode.PUSH.value: self.push,
@@ -47,23 +65,39 @@ class SANVirtualMachine:
             OpCode.GET.value: self.get_var,
             OpCode.DELETE.value: self.delete_var,
             OpCode.HAS.value: self.has_var,
-            OpCode.LIST_APPEND: self.list_append,
-            OpCode.LIST_REMOVE: self.list_remove,
-            OpCode.LIST_LEN: self.list_len,
-            OpCode.LIST_GET: self.list_get,
-            OpCode.DICT_SET: self.dict_set,
-            OpCode.DICT_GET: self.dict_get,
-            OpCode.DICT_KEYS: self.dict_keys,
-            OpCode.FOR_LOOP: self.for_loop,
-            OpCode.BREAK_LOOP: self.break_loop,
-            OpCode.CONTINUE_LOOP: self.continue_loop,
-            OpCode.DEF_FUNC: self.define_function,
-            OpCode.CALL_FUNC: self.call_function
+            OpCode.LIST_APPEND.value: self.list_append,
+            OpCode.LIST_REMOVE.value: self.list_remove,
+            OpCode.LIST_LEN.value: self.list_len,
+            OpCode.LIST_GET.value: self.list_get,
+            OpCode.DICT_SET.value: self.dict_set,
+            OpCode.DICT_GET.value: self.dict_get,
+            OpCode.DICT_KEYS.value: self.dict_keys,
+            OpCode.FOR_LOOP.value: self.for_loop,
+            OpCode.BREAK_LOOP.value: self.break_loop,
+            OpCode.CONTINUE_LOOP.value: self.continue_loop,
+            OpCode.DEF_FUNC.value: self.define_function,
+            OpCode.CALL_FUNC.value: self.call_function
         }
 
-    def run(self, bytecode):
+    def run(self, bytecode, start_pc=0):
+        if self.profile is not None:
+            return self.run_profiled(bytecode, start_pc)
+
+        if self.compiled:
+            return self.run_compiled(bytecode, start_pc)
+
+        # Packed programs are decoded once and shared by every VM that runs them
+        if isinstance(bytecode, PackedBytecode):
+            bytecode = bytecode.instructions()
+
+        return self.run_interpreted(bytecode, start_pc)
+
+    def run_interpreted(self, bytecode, start_pc=0):
+        if self.gas_limit is not None:
+            return self.run_metered(bytecode, start_pc)
+
         self.bytecode = bytecode
-        self.pc = 0
+        self.pc = start_pc
 
         while self.running and self.pc < len(self.bytecode):
             opcode = self.bytecode[self.pc]
@@ -75,9 +109,122 @@ class SANVirtualMachine:
             else:
                 raise ValueError(f"Unknown opcode: {opcode}")
 
+    def run_metered(self, bytecode, start_pc=0):
+        """
+        Interpreter loop with gas accounting. Kept apart from run() so unmetered runs pay nothing.
+        """
+        self.bytecode = bytecode
+        self.pc = start_pc
+
+        # Hot loop: one lookup gives an opcode's cost and handler, the counter is a local and
+        # gas_used is written back on exit
+        costs = self.gas_schedule.costs
+        default_cost = self.gas_schedule.default_cost
+        steps = {opcode: (costs.get(opcode, default_cost), handler) for opcode, handler in self.instructions.items()}
+        limit = self.gas_limit
+        used = self.gas_used
+
+        try:
+            while self.running and self.pc < len(self.bytecode):
+                opcode = self.bytecode[self.pc]
+                step = steps.get(opcode)
+
+                used += step[0] if step is not None else default_cost
+                if used > limit:
+                    raise OutOfGasError(f"Out of gas at pc {self.pc}: used {used}, limit {limit}")
+
+                self.pc += 1
+
+                if step is None:
+                    raise ValueError(f"Unknown opcode: {opcode}")
+                step[1]()
+        finally:
+            self.gas_used = used
+
+    def run_profiled(self, bytecode, start_pc=0):
+        """
+        Interpreter loop that records counts, handler time and pcs into self.profile. Compiled blocks
+        fuse ops together, so profiled runs always interpret. Gas is charged like run_metered.
+        """
+        if isinstance(bytecode, PackedBytecode):
+            bytecode = bytecode.instructions()
+
+        self.bytecode = bytecode
+        self.pc = start_pc
+
+        profile = self.profile
+        profile.enter(self.storage.functions, start_pc)
+        counts, times, pcs = profile.counts, profile.times, profile.pcs
+        clock = time.perf_counter_ns
+
+        costs = self.gas_schedule.costs
+        default_cost = self.gas_schedule.default_cost
+        limit = self.gas_limit
+        instructions = self.instructions
+        used = self.gas_used
+
+        try:
+            while self.running and self.pc < len(self.bytecode):
+                pc = self.pc
+                opcode = self.bytecode[pc]
+
+                if limit is not None:
+                    used += costs.get(opcode, default_cost)
+                    if used > limit:
+                        raise OutOfGasError(f"Out of gas at pc {pc}: used {used}, limit {limit}")
+
+                self.pc += 1
+
+                if opcode not in instructions:
+                    raise ValueError(f"Unknown opcode: {opcode}")
+
+                if opcode == OpCode.CALL_FUNC.value:
+                    profile.call_func(self.stack, self.storage.functions)
+
+                counts[opcode] = counts.get(opcode, 0) + 1
+                pcs[pc] = pcs.get(pc, 0) + 1
+                start = clock()
+                instructions[opcode]()
+                times[opcode] = times.get(opcode, 0) + clock() - start
+        finally:
+            if limit is not None:
+                self.gas_used = used
+
+    def run_compiled(self, bytecode, start_pc=0):
+        """
+        Same results as run(), but the bytecode is translated once (cached by hash) into
+        closures with their operands already resolved, so the loop is a single call per op.
+        """
+        # Metered programs charge each block up front, they are cached apart from unmetered ones
+        schedule = self.gas_schedule if self.gas_limit is not None else None
+        program = default_compiler.compile(bytecode, schedule)
+
+        self.bytecode = program.bytecode
+        self.pc = start_pc
+
+        if not self.running:
+            return
+
+        ops = program.ops
+        end = len(ops)
+        pc = start_pc
+
+        while 0 <= pc < end:
+            pc = ops[pc](self)
+
+        if pc < 0 and self.running:
+            # bytecode[-1] is the last slot for the interpreter, it runs the rest from there
+            return self.run_interpreted(program.bytecode, pc)
+
+        if self.running:
+            self.pc = pc
+
     def push(self):
         value = self.bytecode[self.pc]
         self.pc += 1
+        # The program is shared by every run of a contract, list and dict constants are pushed as copies
+        if type(value) is list or type(value) is dict:
+            value = copy.deepcopy(value)
         self.stack.append(value)
 
     def pop(self):
@@ -173,7 +320,7 @@ class SANVirtualMachine:
     def delete_var(self):
         if self.stack:
             key = self.stack.pop()
-            self.storage.delete(key)
+            self.storage.delete_var(key)
 
     def has_var(self):
         if self.stack:
@@ -421,8 +568,8 @@ class SANVirtualMachine:
     def halt(self):
         self.running = False
 
-    def deploy_contract(self, contract_id, bytecode):
-        return self.contract_manager.deploy_contract(contract_id, bytecode)
+    def deploy_contract(self, contract_id, bytecode, gas_limit=None):
+        return self.contract_manager.deploy_contract(contract_id, bytecode, gas_limit)
 
-    def call_contract_function(self, contract_id, function_name, params):
-        return self.contract_manager.call_contract_function(contract_id, function_name, params)
\ No newline at end of file
+    def call_contract_function(self, contract_id, function_name, params, gas_limit=None):
+        return self.contract_manager.call_contract_function(contract_id, function_name, params, gas_limit)
\ No newline at end of file
@@ -1,11 +1,15 @@
 import re
 from typing import List, Union
-from OpCode import OpCode
+from SANVM.OpCode import OpCode
+from SANVM.Linker import Linker
+from SANVM.Optimizer import PeepholeOptimizer
 
 class PenaParser:
-    def __init__(self):
+    def __init__(self, optimize=False):
         self.bytecode: List[Union[int, str]] = []
         self.label_counter = 0
+        self.symbols = {}  # Labels and function entries of the last parse, for debugging
+        self.optimize = optimize  # Run PeepholeOptimizer over the linked bytecode
 
     def parse(self, source: str) -> List[Union[int, str]]:
         self.bytecode = []
@@ -45,6 +49,15 @@ class PenaParser:
                 i += 1
             else:
                 i += 1
+
+        # Labels are resolved to integer offsets, jumps need no lookup at runtime
+        self.bytecode, self.symbols = Linker().link(self.bytecode)
+
+        if self.optimize:
+            optimizer = PeepholeOptimizer()
+            self.bytecode = optimizer.optimize(self.bytecode)
+            self.symbols["labels"] = {label: optimizer.pc_map[pc] for label, pc in self.symbols["labels"].items()}
+            self.symbols["functions"] = {name: optimizer.pc_map[pc] for name, pc in self.symbols["functions"].items()}
         return self.bytecode
 
     def _preprocess(self, source: str) -> List[str]:
@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from blockchain.Transaction import Transaction
 from network.Node import Node
 
@@ -7,17 +9,74 @@ router = APIRouter()
 node = Node()
 
 @router.get("/sync")
-def sync(last_seen_block_timestamp: float):
-    blockchain_data = node.ask_synchronize(last_seen_block_timestamp)
+def sync(height: int = None, block_hash: str = None, last_seen_block_timestamp: float = None):
+    if height is None and block_hash is None and last_seen_block_timestamp is None:
+        raise HTTPException(status_code=400, detail="One of height, block_hash or last_seen_block_timestamp is required")
+
+    try:
+        blockchain_data = node.ask_synchronize(last_seen_block_timestamp, height=height, block_hash=block_hash)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
     return {"blockchain": blockchain_data}
 
+@router.get("/sync/stream")
+def sync_stream(height: int, limit: int = None):
+    """
+    Streams blocks after `height` as NDJSON, one block per line, ending with an "end" line.
+    A client that loses the connection asks again with the last height it applied.
+    """
+    return StreamingResponse(node.stream_blocks(height, limit), media_type="application/x-ndjson")
+
 @router.post("/transaction")
-def send_transaction(data: bytes):
+async def send_transaction(data: bytes):
     tx = Transaction(node.transaction_pool, data)
-    node.send_transaction(tx)
+
+    try:
+        await run_in_threadpool(node.verify_transaction, tx)  # Signature checks stay off the event loop
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Transaction rejected: {e}")
+
+    try:
+        added = await node.send_transaction(tx)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Block not added: {e}")
+
+    if not added:
+        return {"status": "Transaction not added, duplicate or fee too low", "fee": tx.fee}
 
     return {"status": "Transaction added", "fee": tx.fee}
 
+@router.get("/transaction/{tx_hash}")
+def get_transaction(tx_hash: str, proof: bool = False):
+    """
+    Confirmation status of a transaction by its content hash. With proof=true, confirmed
+    transactions also carry a Merkle inclusion proof against the block's merkle_root.
+    """
+    result = node.find_transaction(tx_hash, with_proof=proof)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Unknown transaction: {tx_hash}")
+
+    return result
+
+@router.get("/compile_cache")
+def get_compile_cache_stats():
+    """
+    Hits, misses and size of the node's PENA compile cache.
+    """
+    return node.compile_cache.stats()
+
+@router.get("/profile")
+def get_block_profile():
+    """
+    Per-opcode profile of the contract calls of the last executed block, when the node runs with SAN_PROFILE=1.
+    Profiled calls are interpreted, "mode" says so: timings are not those of compiled runs.
+    """
+    if node.last_block_profile is None:
+        raise HTTPException(status_code=404, detail="No profile, start the node with SAN_PROFILE=1")
+
+    return node.last_block_profile
+
 @router.get("/bootstrap")
 def get_bootstrap_peers():
     return {"peers": node.PEERS}
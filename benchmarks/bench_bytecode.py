@@ -0,0 +1,53 @@
+"""
+Packed bytecode against the plain list: stored size and pack/unpack time for a parsed contract.
+
+    python -m benchmarks.bench_bytecode
+"""
+import json
+import pickle
+import sys
+
+from SANVM.PackedBytecode import PackedBytecode
+from SANVM.pena_parser import PenaParser
+
+from benchmarks.timing import best_time
+
+
+def make_contract(statements):
+    lines = []
+    for i in range(statements):
+        lines.append(f"v{i} = v{i} + {i} * 3")
+        lines.append(f"print(v{i})")
+    lines.append("mylist := [1, 2, 3]")
+    return PenaParser().parse("\n".join(lines))
+
+
+def _list_memory(bytecode):
+    # The list and the operand objects it holds, shared small ints are not counted
+    return sys.getsizeof(bytecode) + sum(sys.getsizeof(value) for value in bytecode if not isinstance(value, int))
+
+
+def run(statements=1000, repeat=20):
+    bytecode = make_contract(statements)
+    packed = PackedBytecode.pack(bytecode)
+    packed_bytes = packed.to_bytes()
+
+    return {
+        "slots": len(bytecode),
+        "list_memory": _list_memory(bytecode),
+        "packed_memory": sys.getsizeof(packed.code) + sum(sys.getsizeof(value) for value in packed.constants),
+        "json_size": len(json.dumps(bytecode)),
+        "pickle_size": len(pickle.dumps(bytecode)),
+        "packed_size": len(packed_bytes),
+        "pack_s": best_time(lambda: PackedBytecode.pack(bytecode), repeat),
+        "unpack_s": best_time(packed.unpack, repeat),
+        "from_bytes_s": best_time(lambda: PackedBytecode.from_bytes(packed_bytes), repeat),
+    }
+
+
+if __name__ == "__main__":
+    for statements in (10, 1000):
+        result = run(statements=statements)
+        print(f"{result['slots']:>6} slots | memory list {result['list_memory']:>8} B  packed {result['packed_memory']:>7} B | "
+              f"wire json {result['json_size']:>7} B  pickle {result['pickle_size']:>7} B  packed {result['packed_size']:>7} B | "
+              f"pack {result['pack_s'] * 1e3:7.3f} ms  unpack {result['unpack_s'] * 1e3:7.3f} ms")
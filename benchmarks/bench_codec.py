@@ -0,0 +1,55 @@
+"""
+Encode/decode benchmark: BlockCodec against pickle on synthetic blocks.
+
+    python -m benchmarks.bench_codec
+"""
+import json
+import pickle
+
+from blockchain.Block import Block
+from blockchain.BlockCodec import BlockCodec
+from blockchain.Transaction import Transaction
+
+from benchmarks.timing import best_time
+
+
+def make_block(tx_count, tx_size):
+    transactions = []
+    for i in range(tx_count):
+        payload = json.dumps({"sender": f"{i:064x}", "receiver": f"{i + 1:064x}", "value": i,
+                              "memo": "x" * max(0, tx_size - 200)}).encode("utf-8")
+        tx = Transaction.__new__(Transaction)
+        tx.timestamp = 1_700_000_000.0 + i
+        tx.data = payload
+        tx.fee = len(payload) * 0.01
+        transactions.append(tx)
+
+    return Block(1, "0" * 64, "VALIDATOR", "SIGNATURE", transactions)
+
+
+def run(tx_count=1000, tx_size=512, repeat=20):
+    block = make_block(tx_count, tx_size)
+
+    codec_bytes = BlockCodec.encode(block)
+    pickle_bytes = pickle.dumps(block)
+
+    return {
+        "tx_count": tx_count,
+        "tx_size": tx_size,
+        "codec_size": len(codec_bytes),
+        "pickle_size": len(pickle_bytes),
+        "codec_encode_s": best_time(lambda: BlockCodec.encode(block), repeat),
+        "pickle_encode_s": best_time(lambda: pickle.dumps(block), repeat),
+        "codec_decode_s": best_time(lambda: BlockCodec.decode(codec_bytes, verify=False), repeat),
+        "codec_verified_decode_s": best_time(lambda: BlockCodec.decode(codec_bytes), repeat),
+        "pickle_decode_s": best_time(lambda: pickle.loads(pickle_bytes), repeat),
+    }
+
+
+if __name__ == "__main__":
+    for tx_count in (10, 1000, 10000):
+        result = run(tx_count=tx_count)
+        print(f"{tx_count:>6} txs | size codec {result['codec_size']:>9} B  pickle {result['pickle_size']:>9} B | "
+              f"encode codec {result['codec_encode_s'] * 1e3:8.3f} ms  pickle {result['pickle_encode_s'] * 1e3:8.3f} ms | "
+              f"decode codec {result['codec_decode_s'] * 1e3:8.3f} ms  pickle {result['pickle_decode_s'] * 1e3:8.3f} ms  "
+              f"codec + hash check {result['codec_verified_decode_s'] * 1e3:8.3f} ms")
@@ -0,0 +1,71 @@
+"""
+Gas metering overhead: the same loop run unmetered and metered, interpreted and compiled.
+
+    python -m benchmarks.bench_gas
+"""
+from SANVM.OpCode import OpCode
+from SANVM.VM import SANVirtualMachine
+
+from benchmarks.timing import best_time
+
+
+def make_loop(iterations):
+    """
+    i = 0; acc = 0; while i < iterations: acc = acc + i * 2; i = i + 1
+    """
+    PUSH = OpCode.PUSH.value
+    start = 10
+    return [
+        PUSH, "i", PUSH, 0, OpCode.SET.value,
+        PUSH, "acc", PUSH, 0, OpCode.SET.value,
+        # start
+        PUSH, "i", OpCode.GET.value, PUSH, iterations, OpCode.LT.value,
+        OpCode.IF.value, 0, OpCode.HALT.value,  # IF skips the HALT while i < iterations
+        PUSH, "acc", PUSH, "acc", OpCode.GET.value, PUSH, "i", OpCode.GET.value,
+        PUSH, 2, OpCode.MUL.value, OpCode.ADD.value, OpCode.SET.value,
+        PUSH, "i", PUSH, "i", OpCode.GET.value, PUSH, 1, OpCode.ADD.value, OpCode.SET.value,
+        OpCode.JMP.value, start,
+    ]
+
+
+def _time(bytecode, repeat, **vm_args):
+    # Best time of a run on a fresh VM, and the gas the last one used
+    vms = []
+
+    def setup():
+        vms.append(SANVirtualMachine(**vm_args))
+        return vms[-1]
+
+    best = best_time(lambda vm: vm.run(bytecode), repeat, setup)
+    return best, vms[-1].gas_used
+
+
+def run(iterations=100_000, repeat=5):
+    bytecode = make_loop(iterations)
+    gas_limit = 10 ** 12
+
+    result = {"iterations": iterations}
+    for mode, compiled in (("interpreted", False), ("compiled", True)):
+        # Unmetered and metered runs take turns, so load on the machine hits both alike
+        unmetered = metered = float("inf")
+        for _ in range(repeat):
+            unmetered = min(unmetered, _time(bytecode, 1, compiled=compiled)[0])
+            elapsed, gas_used = _time(bytecode, 1, compiled=compiled, gas_limit=gas_limit)
+            metered = min(metered, elapsed)
+
+        result[f"{mode}_unmetered_s"] = unmetered
+        result[f"{mode}_metered_s"] = metered
+        result[f"{mode}_overhead"] = metered / unmetered - 1
+        result["gas_used"] = gas_used
+
+    return result
+
+
+if __name__ == "__main__":
+    for iterations in (1_000, 100_000):
+        result = run(iterations=iterations)
+        print(f"{iterations:>7} iterations | gas {result['gas_used']:>9} | "
+              f"interpreted {result['interpreted_unmetered_s'] * 1e3:8.2f} ms -> {result['interpreted_metered_s'] * 1e3:8.2f} ms "
+              f"({result['interpreted_overhead']:+.1%}) | "
+              f"compiled {result['compiled_unmetered_s'] * 1e3:8.2f} ms -> {result['compiled_metered_s'] * 1e3:8.2f} ms "
+              f"({result['compiled_overhead']:+.1%})")
@@ -0,0 +1,429 @@
+"""
+Benchmark suite: VM, PENA compiler, signatures, block pipeline and mempool on synthetic workloads.
+Everything is generated from a fixed seed and runs offline.
+
+    python -m benchmarks.run                                # print a table
+    python -m benchmarks.run --output results.json          # also save machine-readable results
+    python -m benchmarks.run --baseline results.json        # flag cases slower than a saved run
+    python -m benchmarks.run --quick --filter vm.           # smaller workloads, only matching cases
+
+A case whose dependencies are not installed is reported as skipped. The exit status is 1 when
+a case fails or a regression is flagged against the baseline.
+"""
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+SEED = 1234
+FORMAT_VERSION = 1
+
+CASES = []  # (name, factory), factory(quick) -> (setup, func, params), func(setup()) is timed
+
+
+def case(name):
+    def register(factory):
+        CASES.append((name, factory))
+        return factory
+    return register
+
+
+# Synthetic workloads
+
+def make_source(statements, rng):
+    """
+    PENA source with assignments, branches, loops and functions.
+    """
+    lines = []
+    for i in range(statements):
+        kind = rng.random()
+        if kind < 0.15:
+            lines += [f"if (v{i % 7} - {rng.randint(1, 9)}) {{", f"v{i % 7} = v{i % 7} * 2", "}"]
+        elif kind < 0.25:
+            lines += [f"while (v{i % 5}) {{", f"v{i % 5} = v{i % 5} - 1", "}"]
+        elif kind < 0.3:
+            lines += [f"function f{i}(a, b) {{", f"t{i} = a + b * {rng.randint(1, 9)}", f"return t{i}", "}"]
+        else:
+            lines.append(f"v{i % 7} = v{i % 5} + {rng.randint(0, 99)} * {rng.randint(0, 99)} - (3 + 4)")
+    return "\n".join(lines)
+
+
+def make_storage_contract(keys):
+    """
+    Bytecode of a contract whose top level writes `keys` entries and whose function "touch" reads
+    and rewrites all of them: storage[k] = storage[k] + 1.
+    """
+    from SANVM.OpCode import OpCode
+
+    PUSH, SET, GET, ADD = OpCode.PUSH.value, OpCode.SET.value, OpCode.GET.value, OpCode.ADD.value
+    bytecode = []
+    for k in range(keys):
+        bytecode += [PUSH, f"key{k}", PUSH, k, SET]
+
+    bytecode += [PUSH, "touch", PUSH, 0, OpCode.DEF_FUNC.value]
+    for k in range(keys):
+        bytecode += [PUSH, f"key{k}", PUSH, f"key{k}", GET, PUSH, 1, ADD, SET]
+    bytecode.append(OpCode.RET.value)
+    return bytecode
+
+
+def make_transactions(count, rng, senders=100, size=256):
+    """
+    Unsigned transfer transactions, spread over `senders` accounts.
+    """
+    from blockchain.Transaction import Transaction
+
+    transactions = []
+    for i in range(count):
+        payload = json.dumps({"sender": f"{rng.randrange(senders):064x}", "receiver": f"{rng.randrange(10 ** 6):064x}",
+                              "value": rng.randint(1, 100), "nonce": i,
+                              "memo": "x" * max(0, size - 220)}).encode("utf-8")
+        tx = Transaction.__new__(Transaction)
+        tx.timestamp = 1_700_000_000.0 + i
+        tx.data = payload
+        tx.fee = rng.randint(1, 10_000) / 100
+        transactions.append(tx)
+    return transactions
+
+
+def fresh(transactions):
+    # Copies without the cached fields and tx_hash, so decoding and hashing are measured again
+    from blockchain.Transaction import Transaction
+    return [Transaction.from_dict(tx.to_dict()) for tx in transactions]
+
+
+# Cases
+
+@case("vm.storage_contract.deploy")
+def storage_deploy(quick):
+    from SANVM.ContractManager import ContractManager
+    from SANVM.Storage import Storage
+
+    keys = 200 if quick else 2_000
+    bytecode = make_storage_contract(keys)
+
+    def run(manager):
+        manager.deploy_contract("bench", bytecode)
+
+    return lambda: ContractManager(Storage()), run, {"keys": keys}
+
+
+@case("vm.storage_contract.call")
+def storage_call(quick):
+    from SANVM.ContractManager import ContractManager
+    from SANVM.Storage import Storage
+
+    keys = 200 if quick else 2_000
+    manager = ContractManager(Storage())
+    manager.deploy_contract("bench", make_storage_contract(keys))
+
+    def run(_):
+        manager.call_contract_function("bench", "touch", [])
+
+    return lambda: None, run, {"keys": keys}
+
+
+@case("vm.storage_contract.call.compiled")
+def storage_call_compiled(quick):
+    from SANVM.ContractManager import ContractManager
+    from SANVM.Storage import Storage
+
+    keys = 200 if quick else 2_000
+    manager = ContractManager(Storage(), compiled=True)
+    manager.deploy_contract("bench", make_storage_contract(keys))
+
+    def run(_):
+        manager.call_contract_function("bench", "touch", [])
+
+    return lambda: None, run, {"keys": keys}
+
+
+@case("parser.parse")
+def parse(quick):
+    from SANVM.pena_parser import PenaParser
+
+    statements = 200 if quick else 2_000
+    source = make_source(statements, random.Random(SEED))
+    return lambda: None, lambda _: PenaParser().parse(source), {"statements": statements}
+
+
+@case("parser.parse.optimized")
+def parse_optimized(quick):
+    from SANVM.pena_parser import PenaParser
+
+    statements = 200 if quick else 2_000
+    source = make_source(statements, random.Random(SEED))
+    return lambda: None, lambda _: PenaParser(optimize=True).parse(source), {"statements": statements}
+
+
+@case("parser.compile_cache.hit")
+def compile_cache_hit(quick):
+    from SANVM.CompileCache import CompileCache
+
+    statements = 200 if quick else 2_000
+    source = make_source(statements, random.Random(SEED))
+    cache = CompileCache()
+    cache.compile(source)
+    return lambda: None, lambda _: cache.compile(source), {"statements": statements}
+
+
+@case("crypto.verify_transaction")
+def verify_transaction(quick):
+    import pqcrypto.sign.dilithium2 as dilithium2
+    from blockchain.Transaction import Transaction
+
+    count = 20 if quick else 200
+    public_key, secret_key = dilithium2.generate_keypair()
+    payloads = []
+    for i in range(count):
+        tx = {"sender": public_key.hex(), "receiver": f"{i:064x}", "value": i}
+        message = Transaction.serialize_message(tx, exclude_signature=False)
+        tx["signature"] = dilithium2.sign(message, secret_key).hex()
+        payloads.append(json.dumps(tx).encode("utf-8"))
+
+    def run(_):
+        for payload in payloads:
+            Transaction.verify_transaction(payload)
+
+    return lambda: None, run, {"transactions": count}
+
+
+@case("block.calculate_hash")
+def block_hash(quick):
+    from blockchain.Block import Block
+
+    count = 1_000 if quick else 10_000
+    transactions = make_transactions(count, random.Random(SEED))
+
+    # A new block hashes every transaction into the Merkle root, then the header
+    return lambda: fresh(transactions), lambda txs: Block(1, "ab" * 32, "VALIDATOR", "SIGNATURE", txs), \
+        {"transactions": count}
+
+
+@case("node.update_SAN_balance_for_block")
+def apply_balances(quick):
+    from blockchain.Block import Block
+    from blockchain.Blockchain import Blockchain
+    from network.Node import Node
+
+    count = 1_000 if quick else 10_000
+    transactions = make_transactions(count, random.Random(SEED))
+
+    def setup():
+        node = Node.__new__(Node)
+        node.blockchain = Blockchain()
+        for sender in range(100):
+            node.blockchain.SAN[f"{sender:064x}"] = 10 ** 9
+        return node, Block(1, "ab" * 32, "VALIDATOR", "SIGNATURE", fresh(transactions))
+
+    def run(state):
+        node, block = state
+        node.update_SAN_balance_for_block(block)
+
+    return setup, run, {"transactions": count}
+
+
+@case("ledger.apply_block")
+def ledger_apply(quick):
+    from blockchain.Ledger import Ledger
+
+    count = 1_000 if quick else 10_000
+    rng = random.Random(SEED)
+    transfers = [(f"{rng.randrange(100):064x}", f"{rng.randrange(10 ** 6):064x}", rng.randint(1, 100), 0.5)
+                 for _ in range(count)]
+
+    def setup():
+        ledger = Ledger()
+        for sender in range(100):
+            ledger[f"{sender:064x}"] = 10 ** 9
+        return ledger
+
+    return setup, lambda ledger: ledger.apply_block(transfers, "VALIDATOR"), {"transfers": count}
+
+
+@case("mempool.add")
+def mempool_add(quick):
+    from blockchain.Mempool import Mempool
+
+    count = 5_000 if quick else 50_000
+    transactions = make_transactions(count, random.Random(SEED))
+
+    def run(state):
+        pool, txs = state
+        for tx in txs:
+            pool.add(tx)
+
+    return lambda: (Mempool(), fresh(transactions)), run, {"transactions": count}
+
+
+@case("mempool.build_block")
+def mempool_build(quick):
+    from blockchain.Mempool import Mempool
+
+    count = 5_000 if quick else 50_000
+    transactions = make_transactions(count, random.Random(SEED))
+
+    def setup():
+        pool = Mempool()
+        for tx in transactions:
+            pool.add(tx)
+        return pool
+
+    # Highest paying transactions for a block, then removing them from the pool
+    def run(pool):
+        for tx in pool.by_priority(1_000):
+            pool.remove(tx.tx_hash)
+
+    return setup, run, {"transactions": count, "block": 1_000}
+
+
+# The single-purpose benchmarks: module, params(quick) -> keyword arguments of its run().
+# Their *_s figures are best-of times.
+SUITES = {
+    "gas": ("benchmarks.bench_gas", lambda quick: {"iterations": 10_000 if quick else 100_000, "repeat": 3}),
+    "codec": ("benchmarks.bench_codec", lambda quick: {"tx_count": 100 if quick else 1_000, "repeat": 5}),
+    "bytecode": ("benchmarks.bench_bytecode", lambda quick: {"statements": 100 if quick else 1_000, "repeat": 5}),
+}
+
+
+# Running
+
+def measure(factory, quick, repeat):
+    setup, func, params = factory(quick)
+
+    func(setup())  # Warm up: imports, caches, compiled blocks
+
+    times = []
+    for _ in range(repeat):
+        state = setup()
+        gc.collect()
+        start = time.perf_counter()
+        func(state)
+        times.append(time.perf_counter() - start)
+
+    return {"seconds": statistics.median(times), "best": min(times), "repeat": repeat, "params": params}
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    return {
+        "format": FORMAT_VERSION,
+        "created": time.time(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_all(quick=False, repeat=5, name_filter=None):
+    results = {"meta": environment(), "quick": quick, "results": {}, "skipped": {}, "errors": {}}
+
+    def selected(name):
+        return name_filter is None or name_filter in name
+
+    for name, factory in CASES:
+        if not selected(name):
+            continue
+        random.seed(SEED)
+        try:
+            results["results"][name] = measure(factory, quick, repeat)
+        except ImportError as e:
+            results["skipped"][name] = f"{e}"
+        except Exception as e:
+            results["errors"][name] = f"{type(e).__name__}: {e}"
+
+    for suite, (module, suite_params) in SUITES.items():
+        if not selected(f"{suite}."):
+            continue
+        params = suite_params(quick)
+        try:
+            figures = importlib.import_module(module).run(**params)
+        except ImportError as e:
+            results["skipped"][suite] = f"{e}"
+            continue
+        except Exception as e:
+            results["errors"][suite] = f"{type(e).__name__}: {e}"
+            continue
+        for key, value in figures.items():
+            if key.endswith("_s"):
+                results["results"][f"{suite}.{key[:-2]}"] = {"seconds": value, "best": value, "params": params}
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    [(case, baseline seconds, current seconds, ratio, regressed)] for cases present in both runs.
+    """
+    rows = []
+    for name, current in results["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None or before.get("params") != current.get("params") or not before["seconds"]:
+            continue  # New case, or a different workload size
+        ratio = current["seconds"] / before["seconds"]
+        rows.append((name, before["seconds"], current["seconds"], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def print_results(results, comparison=None):
+    by_case = {row[0]: row for row in comparison or []}
+    for name, result in results["results"].items():
+        line = f"{name:<42} {result['seconds'] * 1e3:12.3f} ms"
+        if name in by_case:
+            _, before, _, ratio, regressed = by_case[name]
+            line += f"   baseline {before * 1e3:12.3f} ms  {ratio - 1:+7.1%}{'  REGRESSION' if regressed else ''}"
+        print(line)
+    for name, reason in results["skipped"].items():
+        print(f"{name:<42} skipped: {reason}")
+    for name, error in results["errors"].items():
+        print(f"{name:<42} error: {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="smaller workloads")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case, the median is reported")
+    parser.add_argument("--filter", help="only cases whose name contains this")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown ratio flagged as a regression")
+    args = parser.parse_args(argv)
+
+    results = run_all(quick=args.quick, repeat=args.repeat, name_filter=args.filter)
+
+    comparison = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        comparison = compare(results, baseline, args.threshold)
+        results["baseline"] = {"file": args.baseline, "commit": baseline.get("meta", {}).get("commit"),
+                               "threshold": args.threshold,
+                               "regressions": [row[0] for row in comparison if row[4]]}
+
+    print_results(results, comparison)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if results["errors"]:
+        return 1
+    return 1 if comparison and any(row[4] for row in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+import time
+
+
+def best_time(func, repeat, setup=None):
+    """
+    Best of `repeat` timed runs of func(), or of func(setup()) with setup left out of the timing.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        if setup is None:
+            func()
+        else:
+            func(state)
+        best = min(best, time.perf_counter() - start)
+    return best
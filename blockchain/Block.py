@@ -1,16 +1,119 @@
 import time
+import struct
 import hashlib
+from functools import cached_property
+
+from blockchain.Transaction import Transaction
+from blockchain.Merkle import MerkleTree
 
 class Block:
+    """
+    The block hash covers a fixed-size header: index, timestamp, previous block hash and the
+    Merkle root of the transaction hashes. The root is computed once and cached, and any
+    transaction can be proven to be in the block with an O(log n) Merkle proof.
+    """
+
+    HEADER = struct.Struct("<Qd32s32s")  # index, timestamp, previous block hash, merkle root
+
     def __init__(self, index, previous_block_hash, validator, validator_signature, transactions):
         self.index = index # Block index
         self.previous_block_hash = previous_block_hash # Previous block hash
-        self.current_block_hash = self.calculate_hash() # Current block hash
         self.timestamp = time.time() # Now as epoch
         self.validator = validator # validator address
         self.validator_signature = validator_signature
         self.transactions = transactions # Transactions
+        self.current_block_hash = self.calculate_hash() # Current block hash, needs the fields above
 
     def calculate_hash(self):
-        block_data = f"{self.index}{self.previous_block_hash}{self.timestamp}{self.transactions}"
-        return hashlib.sha3_256(block_data.encode()).hexdigest()
\ No newline at end of file
+        header = self.HEADER.pack(self.index, self.timestamp, self._hash_bytes(self.previous_block_hash),
+                                  bytes.fromhex(self.merkle_root))
+        return hashlib.sha3_256(header).hexdigest()
+
+    def has_valid_hash(self) -> bool:
+        """
+        True if current_block_hash is the hash of this block's header, recomputed from its transactions.
+        """
+        try:
+            return self.current_block_hash == self.calculate_hash()
+        except struct.error:  # Header fields of the wrong type
+            return False
+
+    @staticmethod
+    def _hash_bytes(block_hash):
+        # Genesis points to "0" instead of a digest
+        try:
+            raw = bytes.fromhex(block_hash)
+        except ValueError:
+            raw = b""
+        if len(raw) != 32:
+            raw = hashlib.sha3_256(str(block_hash).encode("utf-8")).digest()
+        return raw
+
+    @staticmethod
+    def transaction_hash(tx) -> bytes:
+        """
+        Merkle leaf of a transaction: its content hash. Plain text entries (genesis) are hashed as UTF-8.
+        """
+        if isinstance(tx, Transaction):
+            return bytes.fromhex(tx.tx_hash)
+        raw = tx if isinstance(tx, bytes) else str(tx).encode("utf-8")
+        return hashlib.sha3_256(raw).digest()
+
+    @cached_property
+    def merkle_tree(self):
+        return MerkleTree([self.transaction_hash(tx) for tx in self.transactions])
+
+    @cached_property
+    def merkle_root(self) -> str:
+        return self.merkle_tree.root.hex()
+
+    def transaction_proof(self, position):
+        """
+        Merkle proof that the transaction at `position` is in this block, as hex for sending to peers.
+        """
+        return [[sibling.hex(), is_right] for sibling, is_right in self.merkle_tree.proof(position)]
+
+    @staticmethod
+    def verify_transaction_proof(tx_hash, proof, merkle_root) -> bool:
+        """
+        Checks a transaction_proof() against a block's merkle root. tx_hash is the transaction's content hash.
+        """
+        return MerkleTree.verify(bytes.fromhex(tx_hash),
+                                 [(bytes.fromhex(sibling), is_right) for sibling, is_right in proof],
+                                 bytes.fromhex(merkle_root))
+
+    def to_dict(self):
+        """
+        JSON friendly form, used by the streaming sync.
+        """
+        return {
+            "index": self.index,
+            "previous_block_hash": self.previous_block_hash,
+            "timestamp": self.timestamp,
+            "validator": self.validator,
+            "validator_signature": self.validator_signature,
+            "current_block_hash": self.current_block_hash,
+            "merkle_root": self.merkle_root,
+            "transactions": [tx.to_dict() if hasattr(tx, "to_dict") else tx for tx in self.transactions]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Rebuilds a received block as it was, hash and timestamp are not recalculated.
+        Raises ValueError if the peer's merkle root or block hash do not match the block.
+        """
+        block = cls.__new__(cls)
+        block.index = data["index"]
+        block.previous_block_hash = data["previous_block_hash"]
+        block.timestamp = data["timestamp"]
+        block.validator = data["validator"]
+        block.validator_signature = data["validator_signature"]
+        block.current_block_hash = data["current_block_hash"]
+        block.transactions = [Transaction.from_dict(tx) if isinstance(tx, dict) else tx for tx in data["transactions"]]
+
+        if "merkle_root" in data and data["merkle_root"] != block.merkle_root:
+            raise ValueError(f"Merkle root of block {block.index} does not match its transactions")
+        if not block.has_valid_hash():
+            raise ValueError(f"Hash of block {block.index} does not match its header")
+        return block
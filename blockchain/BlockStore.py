@@ -0,0 +1,239 @@
+import os
+import mmap
+import struct
+from collections import OrderedDict
+
+from blockchain.BlockCodec import BlockCodec
+
+
+class BlockStore:
+    """
+    Append-only on-disk block storage.
+
+    Blocks are written one after another into segment files (blocks_00000.dat, blocks_00001.dat ...),
+    each record is [u32 length][BlockCodec encoded block]. A new segment is started when the current one
+    reaches segment_size.
+
+    index.dat is memory-mapped and maps height -> (segment, length, offset, timestamp, hash), so any
+    block is read with one pread and nothing has to be loaded at startup. Timestamps and hashes in the
+    index let Blockchain build its lookup indexes without decoding blocks.
+    Recently used blocks are kept in a small LRU.
+
+    The object behaves like the old `chain` list: len(), indexing (negative too), slicing,
+    iteration, append() and extend().
+    """
+
+    INDEX_MAGIC = b"SANIDX03"
+    INDEX_HEADER = struct.Struct("<8sQ")  # magic, block count
+    INDEX_RECORD = struct.Struct("<IIQd32s")  # segment, length, offset, timestamp, block hash
+    RECORD_LENGTH = struct.Struct("<I")
+
+    INDEX_GROW_RECORDS = 4096
+    DEFAULT_SEGMENT_SIZE = 128 * 1024 * 1024  # 128 MB
+    DEFAULT_CACHE_SIZE = 256
+
+    def __init__(self, directory, segment_size=DEFAULT_SEGMENT_SIZE, cache_size=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # height -> Block
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._open_index()
+
+        self.read_fds = {}  # segment -> fd
+        self._open_tail_segment()
+
+    # Index
+
+    def _open_index(self):
+        path = os.path.join(self.directory, "index.dat")
+        is_new = not os.path.exists(path) or os.path.getsize(path) < self.INDEX_HEADER.size
+
+        self.index_file = open(path, "r+b" if not is_new else "w+b")
+        if is_new:
+            self.index_file.truncate(self.INDEX_HEADER.size + self.INDEX_GROW_RECORDS * self.INDEX_RECORD.size)
+
+        self.index_map = mmap.mmap(self.index_file.fileno(), 0)
+
+        if is_new:
+            self.INDEX_HEADER.pack_into(self.index_map, 0, self.INDEX_MAGIC, 0)
+
+        magic, self.count = self.INDEX_HEADER.unpack_from(self.index_map, 0)
+        if magic != self.INDEX_MAGIC:
+            self.index_map.close()
+            self.index_file.close()
+            if magic.startswith(self.INDEX_MAGIC[:6]):
+                # SANIDX01/02 stores hold pickled blocks, there is nothing safe to convert them from
+                raise ValueError(f"{path} is a {magic.decode('ascii', 'replace')} block index, this node reads "
+                                 f"{self.INDEX_MAGIC.decode('ascii')}. Remove {self.directory} and sync the chain again.")
+            raise ValueError(f"{path} is not a block index")
+
+    def _capacity(self):
+        return (len(self.index_map) - self.INDEX_HEADER.size) // self.INDEX_RECORD.size
+
+    def _grow_index(self):
+        new_size = len(self.index_map) + self.INDEX_GROW_RECORDS * self.INDEX_RECORD.size
+        self.index_map.flush()
+        self.index_map.close()
+        self.index_file.truncate(new_size)
+        self.index_map = mmap.mmap(self.index_file.fileno(), 0)
+
+    def _index_entry(self, height):
+        return self.INDEX_RECORD.unpack_from(self.index_map, self.INDEX_HEADER.size + height * self.INDEX_RECORD.size)
+
+    # Segments
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"blocks_{segment:05d}.dat")
+
+    def _open_tail_segment(self):
+        """
+        Opens the segment new blocks go to. Anything written after the last indexed
+        record (a crash between the segment write and the index update) is cut off,
+        later segments included.
+        """
+        if self.count:
+            segment, length, offset, _, _ = self._index_entry(self.count - 1)
+            end = offset + self.RECORD_LENGTH.size + length
+        else:
+            segment, end = 0, 0
+
+        for name in os.listdir(self.directory):
+            if name.startswith("blocks_") and name.endswith(".dat") and name[7:-4].isdigit():
+                if int(name[7:-4]) > segment:
+                    os.remove(os.path.join(self.directory, name))
+
+        self.write_segment = segment
+        self.write_file = open(self._segment_path(segment), "ab")
+        if self.write_file.tell() > end:
+            self.write_file.truncate(end)
+        self.write_offset = end
+
+    def _read_fd(self, segment):
+        fd = self.read_fds.get(segment)
+        if fd is None:
+            fd = os.open(self._segment_path(segment), os.O_RDONLY)
+            self.read_fds[segment] = fd
+        return fd
+
+    # Serialization
+
+    @staticmethod
+    def encode_block(block) -> bytes:
+        return BlockCodec.encode(block)
+
+    @staticmethod
+    def decode_block(data):
+        return BlockCodec.decode(data)
+
+    # Sequence API
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for height in range(self.count):
+            yield self.get(height)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self.get(height) for height in range(*item.indices(self.count))]
+        return self.get(item)
+
+    def get(self, height):
+        if height < 0:
+            height += self.count
+        if not 0 <= height < self.count:
+            raise IndexError(f"Block height out of range: {height}")
+
+        block = self.cache.get(height)
+        if block is not None:
+            self.cache.move_to_end(height)
+            return block
+
+        segment, length, offset, _, _ = self._index_entry(height)
+        if segment == self.write_segment:
+            self.write_file.flush()
+
+        data = os.pread(self._read_fd(segment), length, offset + self.RECORD_LENGTH.size)
+        block = self.decode_block(data)
+        self._remember(height, block)
+        return block
+
+    def append(self, block):
+        block_hash = self._hash_to_bytes(block.current_block_hash)  # Raises before anything is written
+        data = self.encode_block(block)
+
+        if self.write_offset and self.write_offset + self.RECORD_LENGTH.size + len(data) > self.segment_size:
+            self.write_file.close()
+            self.write_segment += 1
+            self.write_file = open(self._segment_path(self.write_segment), "ab")
+            self.write_offset = 0
+
+        # Segment first, index last. A crash in between leaves a tail that is cut on the next open.
+        offset = self.write_offset
+        self.write_file.write(self.RECORD_LENGTH.pack(len(data)))
+        self.write_file.write(data)
+        self.write_file.flush()
+        self.write_offset += self.RECORD_LENGTH.size + len(data)
+
+        if self.count >= self._capacity():
+            self._grow_index()
+
+        height = self.count
+        self.INDEX_RECORD.pack_into(self.index_map, self.INDEX_HEADER.size + height * self.INDEX_RECORD.size,
+                                    self.write_segment, len(data), offset,
+                                    block.timestamp, block_hash)
+        self.count += 1
+        self.INDEX_HEADER.pack_into(self.index_map, 0, self.INDEX_MAGIC, self.count)
+
+        self._remember(height, block)
+        return height
+
+    def index_entries(self):
+        """
+        Yields (timestamp, block hash) for every height, straight from the mapped index.
+        """
+        for height in range(self.count):
+            _, _, _, timestamp, block_hash = self._index_entry(height)
+            yield timestamp, block_hash.hex()
+
+    @staticmethod
+    def _hash_to_bytes(block_hash):
+        # Every block hash is a sha3-256 hex digest (genesis too), the index keeps its 32 raw bytes
+        try:
+            raw = bytes.fromhex(block_hash)
+        except (TypeError, ValueError):
+            raw = b""
+        if len(raw) != 32:
+            raise ValueError(f"Block hash is not a 32 byte hex digest: {block_hash!r}")
+        return raw
+
+    def extend(self, blocks):
+        for block in blocks:
+            self.append(block)
+
+    def _remember(self, height, block):
+        self.cache[height] = block
+        self.cache.move_to_end(height)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def sync(self):
+        """
+        Forces segments and index to disk. append() only flushes to the OS.
+        """
+        self.write_file.flush()
+        os.fsync(self.write_file.fileno())
+        self.index_map.flush()
+
+    def close(self):
+        self.sync()
+        self.write_file.close()
+        for fd in self.read_fds.values():
+            os.close(fd)
+        self.read_fds.clear()
+        self.index_map.close()
+        self.index_file.close()
@@ -1,10 +1,58 @@
+import bisect
+
 from blockchain.Block import Block
+from blockchain.BlockStore import BlockStore
+from blockchain.Ledger import Ledger
+from blockchain.StateDiff import StateDiff
+from blockchain.StateDiffLog import StateDiffLog
+from blockchain.TransactionIndex import TransactionIndex
+from blockchain.Transaction import Transaction
 
 class Blockchain:
-    def __init__(self):
-        self.chain = []
-        self.SAN = {}
-        self._create_genesis_block()
+    def __init__(self, data_dir=None):
+        # With a data_dir, blocks live in an on-disk BlockStore and survive restarts.
+        # Without one, the chain is a plain in-memory list.
+        self.chain = BlockStore(data_dir) if data_dir else []
+        self.SAN = Ledger()  # address -> balance, dict-like
+
+        # State changes of each block, chained into a digest peers can compare
+        self.state_diffs = StateDiffLog(data_dir)
+
+        # Lookup indexes, height is the position in self.chain
+        self.height_by_hash = {}
+        self.timestamps = []  # timestamp of each height, blocks are appended in time order
+        self.tx_index = TransactionIndex(data_dir)  # tx hash -> (height, position), persisted
+        self._build_indexes()
+
+        if len(self.chain) == 0:
+            self._create_genesis_block()
+
+    def __len__(self):
+        return len(self.chain)
+
+    def __getitem__(self, item):
+        return self.chain[item]
+
+    def __iter__(self):
+        return iter(self.chain)
+
+    def _build_indexes(self):
+        if isinstance(self.chain, BlockStore):
+            entries = self.chain.index_entries()  # No block decoding needed
+        else:
+            entries = ((block.timestamp, block.current_block_hash) for block in self.chain)
+
+        for height, (timestamp, block_hash) in enumerate(entries):
+            self.height_by_hash[block_hash] = height
+            self.timestamps.append(timestamp)
+
+        # The last indexed block may be partly written, it and any block after it are indexed again
+        for height in range(max(self.tx_index.last_height, 0), len(self.chain)):
+            self._index_transactions(height, self.chain[height])
+
+    def _index_transactions(self, height, block):
+        self.tx_index.add_block(height, [tx.tx_hash if isinstance(tx, Transaction) else None
+                                         for tx in block.transactions])
 
     def _create_genesis_block(self):
         genesis_block = Block(
@@ -15,7 +63,8 @@ class Blockchain:
             transactions = ["TEXT A MESSAGE TO THE HUMANITY"]
         )
 
-        self.chain.append(genesis_block)
+        height = self.append_block(genesis_block)
+        self.record_state_diff(height, StateDiff())
 
     def add_block(self, validator, validator_signature, transactions):
         last_block = self.chain[-1]
@@ -28,4 +77,106 @@ class Blockchain:
             transactions = transactions
         )
 
-        self.chain.append(new_block)
\ No newline at end of file
+        self.append_block(new_block)
+
+        return new_block
+
+    def append_block(self, block):
+        """
+        Appends an already built block (own or received) and indexes it.
+        """
+        height = len(self.chain)
+        self.chain.append(block)
+
+        self.height_by_hash[block.current_block_hash] = height
+        self.timestamps.append(block.timestamp)
+        self._index_transactions(height, block)
+
+        return height
+
+    def record_state_diff(self, height, diff, gas_used=None):
+        """
+        Seals the state diff of the block at `height` onto the current digest and stores it,
+        along with the gas its transactions used.
+        """
+        return self.state_diffs.append(height, diff, gas_used)
+
+    def gas_used_at(self, height):
+        return self.state_diffs.get_gas(height)
+
+    def state_digest(self):
+        return self.state_diffs.digest
+
+    def replay_state(self, contracts):
+        """
+        Rebuilds the ledger and the given contracts dict from the recorded state diffs after a restart,
+        checking that every diff is sealed onto the one before it.
+        Returns the first height without a diff: blocks from there on were appended right before a
+        crash, they still have to be executed and their diffs recorded.
+        """
+        digest = StateDiff.GENESIS_DIGEST
+        height = 0
+        while height < len(self.chain):
+            diff = self.state_diffs.get(height)
+            if diff is None:
+                break
+
+            recorded = diff.digest
+            if diff.seal(digest) != recorded:
+                raise ValueError(f"State diff at height {height} is not sealed onto the one before it")
+            diff.apply(self.SAN, contracts)
+            digest = recorded
+            height += 1
+
+        if len(self.state_diffs) > height:
+            raise ValueError(f"State diffs recorded past height {height}, which has none")
+
+        if height == 0 and len(self.chain):
+            self.record_state_diff(0, StateDiff())  # Genesis changes nothing
+            height = 1
+        return height
+
+    def height(self):
+        return len(self.chain) - 1
+
+    def height_of(self, block_hash):
+        return self.height_by_hash.get(block_hash)
+
+    def get_block_by_hash(self, block_hash):
+        height = self.height_by_hash.get(block_hash)
+        return None if height is None else self.chain[height]
+
+    def find_transaction(self, tx_hash):
+        """
+        (height, position) of a confirmed transaction, or None. O(1), no block is read.
+        """
+        return self.tx_index.get(tx_hash)
+
+    def first_height_after(self, timestamp):
+        """
+        First height whose block timestamp is greater than the given one, O(log n).
+        """
+        return bisect.bisect_right(self.timestamps, timestamp)
+
+    def blocks_after_height(self, height, limit=None):
+        """
+        Blocks above the given height, in chain order. O(k) for k returned blocks.
+        """
+        start = max(height + 1, 0)
+        end = len(self.chain) if limit is None else min(len(self.chain), start + limit)
+        return [self.chain[h] for h in range(start, end)]
+
+    def blocks_after_hash(self, block_hash, limit=None):
+        height = self.height_by_hash.get(block_hash)
+        if height is None:
+            raise KeyError(f"Unknown block hash: {block_hash}")
+        return self.blocks_after_height(height, limit)
+
+    def blocks_after_timestamp(self, timestamp, limit=None):
+        return self.blocks_after_height(self.first_height_after(timestamp) - 1, limit)
+
+    def close(self):
+        if isinstance(self.chain, BlockStore):
+            self.chain.close()
+        self.state_diffs.close()
+        self.tx_index.close()
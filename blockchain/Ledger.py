@@ -0,0 +1,244 @@
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the array module does the same job slower
+    np = None
+
+
+class Ledger:
+    """
+    SAN balances, a drop-in for the old address -> balance dict.
+
+    Every address gets a dense integer slot the first time it is seen, balances live in one
+    int64 column (a numpy array when numpy is installed, array("q") otherwise). Balances are kept
+    in base units (UNITS per SAN), so every path adds and subtracts exactly and nodes with and
+    without numpy always agree. The dict API speaks SAN, units()/set_units() the exact values.
+
+    apply_block() collects a block's debits and credits into per-slot delta vectors, checks every
+    sender for overdraft in one pass, and then applies all of them at once. If any check fails,
+    nothing is applied.
+    """
+
+    INITIAL_CAPACITY = 1024
+    UNITS = 100_000_000  # base units per SAN
+    MAX_UNITS = 2 ** 62  # bound for amounts and balances, sums of two stay inside int64
+
+    def __init__(self, balances=None):
+        self.slots = {}  # address -> slot
+        self.addresses = []  # slot -> address
+        self.size = 0
+        self.balances = self._zeros(self.INITIAL_CAPACITY)
+
+        for address, balance in (balances or {}).items():
+            self[address] = balance
+
+    @staticmethod
+    def is_amount(value) -> bool:
+        """
+        True for an int or float. bool is an int to Python but not an amount.
+        """
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    @classmethod
+    def to_units(cls, amount) -> int:
+        """
+        SAN amount (int or float, as found in transactions) -> base units, rounded to the nearest unit.
+        Anything else raises TypeError before it is multiplied: "5" * UNITS would build a 100 MB string.
+        """
+        if not cls.is_amount(amount):
+            raise TypeError(f"Amount must be a number, not {type(amount).__name__}")
+        units = round(amount * cls.UNITS)
+        if not -cls.MAX_UNITS < units < cls.MAX_UNITS:
+            raise ValueError(f"Amount out of range: {amount}")
+        return units
+
+    @classmethod
+    def to_san(cls, units) -> float:
+        return units / cls.UNITS
+
+    @staticmethod
+    def _zeros(count):
+        if np is not None:
+            return np.zeros(count, dtype=np.int64)
+        return array("q", bytes(8 * count))
+
+    def _grow(self, needed):
+        capacity = len(self.balances)
+        if needed <= capacity:
+            return
+
+        while capacity < needed:
+            capacity *= 2
+
+        if np is not None:
+            balances = self._zeros(capacity)
+            balances[:self.size] = self.balances[:self.size]
+            self.balances = balances
+        else:
+            self.balances.extend(self._zeros(capacity - len(self.balances)))
+
+    def slot(self, address):
+        """
+        Slot of an address, a new one (with balance 0) if the address was not seen before.
+        """
+        slot = self.slots.get(address)
+        if slot is None:
+            slot = self.size
+            self._grow(slot + 1)
+            self.slots[address] = slot
+            self.addresses.append(address)
+            self.size += 1
+        return slot
+
+    def units(self, address):
+        return int(self.balances[self.slots[address]])
+
+    def set_units(self, address, units):
+        if not -self.MAX_UNITS < units < self.MAX_UNITS:
+            raise ValueError(f"Balance out of range: {units}")
+        self.balances[self.slot(address)] = units
+
+    # Dict API
+
+    def __getitem__(self, address):
+        return self.to_san(int(self.balances[self.slots[address]]))
+
+    def __setitem__(self, address, balance):
+        self.set_units(address, self.to_units(balance))
+
+    def __contains__(self, address):
+        return address in self.slots
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return iter(list(self.addresses))
+
+    def get(self, address, default=None):
+        slot = self.slots.get(address)
+        return default if slot is None else self.to_san(int(self.balances[slot]))
+
+    def items(self):
+        return [(address, self.to_san(int(self.balances[slot]))) for slot, address in enumerate(self.addresses)]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    # Block processing
+
+    def apply_block(self, transfers, validator, commit=True):
+        """
+        Applies a block's balance changes atomically.
+
+        transfers: [(sender, receiver or None, value, fee), ...] in block order, amounts in SAN.
+        The sender pays value + fee, the receiver gets value, and the validator gets the fees at the end.
+        Raises Exception("Not enough SAN") and changes nothing if a sender cannot pay.
+        Returns {address: new balance in base units} for every address the block touched.
+        With commit=False nothing is written, the result is what the block would leave.
+        """
+        size = self.size
+        try:
+            # to_units rejects values and fees that are not numbers, before any arithmetic on them
+            amounts = [(self.to_units(value), self.to_units(fee)) for _, _, value, fee in transfers]
+            changes = self._transfer_changes(transfers, amounts)
+
+            validator_slot = self.slot(validator)
+            collected_fee = sum(fee for _, fee in amounts)
+            changes[validator_slot] = changes.get(validator_slot, int(self.balances[validator_slot])) + collected_fee
+
+            if any(abs(balance) >= self.MAX_UNITS for balance in changes.values()):
+                raise Exception("Balance out of range")
+        except Exception:
+            self._forget_after(size)  # Addresses first seen in a rejected block do not stay
+            raise
+
+        result = {self.addresses[slot]: balance for slot, balance in changes.items()}
+
+        if commit:
+            for slot, balance in changes.items():
+                self.balances[slot] = balance
+        else:
+            self._forget_after(size)
+        return result
+
+    def _forget_after(self, size):
+        for address in self.addresses[size:]:
+            del self.slots[address]
+        del self.addresses[size:]
+        self.size = size
+
+    def _transfer_changes(self, transfers, amounts):
+        # slot -> balance after the transfers, for every sender and receiver
+        if not transfers:
+            return {}
+
+        sender_slots = [self.slot(sender) for sender, _, _, _ in transfers]
+        receiver_slots = [self.slot(receiver) if receiver is not None else None for _, receiver, _, _ in transfers]
+
+        if all(value >= 0 and fee >= 0 for value, fee in amounts):
+            # Credits only add, so a sender that covers all its debits from its starting balance
+            # passes every check of the transaction-by-transaction order. Checked in one pass.
+            # Below MAX_UNITS in total, no per-slot sum can leave int64.
+            if np is not None and sum(value + fee for value, fee in amounts) < self.MAX_UNITS:
+                changes = self._vectorized_changes(amounts, sender_slots, receiver_slots)
+            else:
+                changes = self._batched_changes(amounts, sender_slots, receiver_slots)
+            if changes is not None:
+                return changes
+
+        # Spending what was received earlier in the same block (or negative amounts):
+        # replay in block order on a scratch copy of the touched balances
+        return self._in_order_changes(amounts, sender_slots, receiver_slots)
+
+    def _vectorized_changes(self, amounts, sender_slots, receiver_slots):
+        size = self.size
+        balances = self.balances[:size]
+
+        senders = np.array(sender_slots, dtype=np.intp)
+        debits = np.zeros(size, dtype=np.int64)
+        np.add.at(debits, senders, np.array([value + fee for value, fee in amounts], dtype=np.int64))
+        if np.any(balances < debits):
+            return None
+
+        credited = [(slot, value) for slot, (value, _) in zip(receiver_slots, amounts) if slot is not None]
+        receivers = np.array([slot for slot, _ in credited], dtype=np.intp)
+        credits = np.zeros(size, dtype=np.int64)
+        np.add.at(credits, receivers, np.array([value for _, value in credited], dtype=np.int64))
+
+        touched = np.unique(np.concatenate((senders, receivers)))
+        after = balances[touched] - debits[touched] + credits[touched]
+        return dict(zip(touched.tolist(), after.tolist()))
+
+    def _batched_changes(self, amounts, sender_slots, receiver_slots):
+        debits = {}
+        credits = {}
+        for sender_slot, receiver_slot, (value, fee) in zip(sender_slots, receiver_slots, amounts):
+            debits[sender_slot] = debits.get(sender_slot, 0) + value + fee
+            if receiver_slot is not None:
+                credits[receiver_slot] = credits.get(receiver_slot, 0) + value
+
+        balances = self.balances
+        if any(balances[slot] < debit for slot, debit in debits.items()):
+            return None
+
+        changes = {slot: int(balances[slot]) - debit for slot, debit in debits.items()}
+        for slot, credit in credits.items():
+            changes[slot] = changes.get(slot, int(balances[slot])) + credit
+        return changes
+
+    def _in_order_changes(self, amounts, sender_slots, receiver_slots):
+        balances = self.balances
+        scratch = {}  # slot -> balance after the transfers so far
+
+        for sender_slot, receiver_slot, (value, fee) in zip(sender_slots, receiver_slots, amounts):
+            balance = scratch.get(sender_slot, int(balances[sender_slot]))
+            if balance < value + fee:
+                raise Exception("Not enough SAN")
+            scratch[sender_slot] = balance - value - fee
+
+            if receiver_slot is not None:
+                scratch[receiver_slot] = scratch.get(receiver_slot, int(balances[receiver_slot])) + value
+
+        return scratch
@@ -0,0 +1,133 @@
+import heapq
+import itertools
+
+from blockchain.Transaction import Transaction
+from blockchain.Ledger import Ledger
+
+
+class Mempool:
+    """
+    Pending transactions waiting for a block.
+
+    - Transactions are keyed by content hash, duplicates are rejected in O(1).
+    - The fee total is kept up to date on every add/remove instead of being summed again,
+      in Ledger base units so it never drifts from the true sum.
+    - fee_heap is a min-heap by fee, its top is used for eviction. Removed transactions leave
+      their entry behind, it is dropped when it reaches the top or when the heap is rebuilt.
+    - When the count or byte cap is hit, the lowest fee transactions are evicted.
+    """
+
+    DEFAULT_MAX_COUNT = 50_000
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # 64 MB of raw transaction data
+
+    def __init__(self, max_count=DEFAULT_MAX_COUNT, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+
+        self.transactions = {}  # tx hash -> Transaction, in arrival order
+        self.index_keys = {}  # tx hash -> its key in fee_heap
+        self.fee_heap = []  # (fee units, -arrival, tx hash), stale entries included
+
+        self.total_fee_units = 0
+        self.total_bytes = 0
+        self.evicted_count = 0
+
+        self._arrival = itertools.count()
+
+    def __len__(self):
+        return len(self.transactions)
+
+    def __iter__(self):
+        return iter(list(self.transactions.values()))
+
+    def __contains__(self, tx_hash):
+        return tx_hash in self.transactions
+
+    @property
+    def total_fee(self):
+        return Ledger.to_san(self.total_fee_units)
+
+    def add(self, transaction: Transaction) -> bool:
+        """
+        Returns False if the transaction is a duplicate, its fee is not a number,
+        or the pool is full and its fee is too low.
+        """
+        tx_hash = transaction.tx_hash
+        if tx_hash in self.transactions:
+            return False
+
+        size = len(transaction.data)
+        if size > self.max_bytes or not Ledger.is_amount(transaction.fee):
+            return False
+
+        # Full pool, only a better paying transaction can get in
+        fee = Ledger.to_units(transaction.fee)
+        lowest = self._lowest()
+        if self._is_full(size) and lowest is not None and fee <= lowest[0]:
+            return False
+
+        # Ties on fee: older transactions sort higher, so they are built first and evicted last
+        key = (fee, -next(self._arrival), tx_hash)
+        heapq.heappush(self.fee_heap, key)
+        self.index_keys[tx_hash] = key
+        self.transactions[tx_hash] = transaction
+
+        self.total_fee_units += fee
+        self.total_bytes += size
+
+        while len(self.transactions) > self.max_count or self.total_bytes > self.max_bytes:
+            self.remove(self._lowest()[2])
+            self.evicted_count += 1
+
+        return tx_hash in self.transactions
+
+    def remove(self, tx_hash):
+        transaction = self.transactions.pop(tx_hash, None)
+        if transaction is None:
+            return None
+
+        fee, _, _ = self.index_keys.pop(tx_hash)
+        self.total_fee_units -= fee
+        self.total_bytes -= len(transaction.data)
+
+        # Stale entries are dropped lazily, the heap is rebuilt once they outnumber live ones
+        if len(self.fee_heap) > 2 * len(self.index_keys) + 64:
+            self.fee_heap = list(self.index_keys.values())
+            heapq.heapify(self.fee_heap)
+
+        return transaction
+
+    def _lowest(self):
+        heap = self.fee_heap
+        while heap and self.index_keys.get(heap[0][2]) != heap[0]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def by_priority(self, limit=None):
+        """
+        Transactions from highest to lowest fee.
+        """
+        if limit is None:
+            keys = sorted(self.index_keys.values(), reverse=True)
+        else:
+            keys = heapq.nlargest(limit, self.index_keys.values())
+        return [self.transactions[tx_hash] for _, _, tx_hash in keys]
+
+    def drain(self):
+        """
+        Empties the pool and returns its transactions in priority order.
+        """
+        transactions = self.by_priority()
+        self.clear()
+        return transactions
+
+    def clear(self):
+        self.transactions.clear()
+        self.index_keys.clear()
+        self.fee_heap.clear()
+        self.total_fee_units = 0
+        self.total_bytes = 0
+
+    def _is_full(self, incoming_size):
+        return (len(self.transactions) >= self.max_count or
+                self.total_bytes + incoming_size > self.max_bytes)
@@ -0,0 +1,57 @@
+import hashlib
+
+
+class MerkleTree:
+    """
+    Binary Merkle tree over 32-byte leaf hashes, with SHA3-256.
+
+    Leaves and inner nodes are hashed with different prefixes (0x00 / 0x01), so an inner node can never
+    pass for a leaf. A node without a sibling is carried up to the next level unchanged, instead of
+    being paired with itself, so two different leaf lists can not give the same root.
+    The root of an empty tree is sha3_256(b"").
+    """
+
+    LEAF_PREFIX = b"\x00"
+    NODE_PREFIX = b"\x01"
+
+    def __init__(self, leaves):
+        level = [hashlib.sha3_256(self.LEAF_PREFIX + leaf).digest() for leaf in leaves]
+        self.levels = [level]  # levels[0] are the hashed leaves, levels[-1] is [root]
+
+        while len(level) > 1:
+            level = [self._node(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+                     for i in range(0, len(level), 2)]
+            self.levels.append(level)
+
+    @classmethod
+    def _node(cls, left, right):
+        return hashlib.sha3_256(cls.NODE_PREFIX + left + right).digest()
+
+    @property
+    def root(self) -> bytes:
+        if not self.levels[0]:
+            return hashlib.sha3_256(b"").digest()
+        return self.levels[-1][0]
+
+    def proof(self, index):
+        """
+        Inclusion proof for the leaf at index: [(sibling hash, sibling is on the right), ...], leaf to root.
+        O(log n) entries.
+        """
+        if not 0 <= index < len(self.levels[0]):
+            raise IndexError(f"Leaf index out of range: {index}")
+
+        proof = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                proof.append((level[sibling], sibling > index))
+            index //= 2
+        return proof
+
+    @classmethod
+    def verify(cls, leaf, proof, root) -> bool:
+        node = hashlib.sha3_256(cls.LEAF_PREFIX + leaf).digest()
+        for sibling, sibling_is_right in proof:
+            node = cls._node(node, sibling) if sibling_is_right else cls._node(sibling, node)
+        return node == root
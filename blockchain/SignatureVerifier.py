@@ -0,0 +1,104 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from blockchain.Transaction import Transaction
+from utils.ProcessPool import ProcessPool
+
+
+def _verify_chunk(tx_chunk):
+    """
+    Worker entry point. Verifies a chunk of transactions serially and stops at the first bad one.
+    Items are raw transaction bytes, or Transaction objects whose decoded fields are reused.
+    verify_transaction raises on a bad signature, so that is turned into False here.
+    """
+    for tx in tx_chunk:
+        try:
+            if isinstance(tx, Transaction):
+                valid = tx.verify()
+            else:
+                valid = Transaction.verify_transaction(tx)
+            if not valid:
+                return False
+        except Exception:
+            return False
+    return True
+
+
+class SignatureVerifier:
+    """
+    Verifies the Dilithium2 signatures of a block's transactions.
+
+    Large batches are split into chunks and spread across a process pool.
+    As soon as one chunk fails, the remaining chunks are cancelled.
+    Small batches (or hosts without a working process pool) are verified serially.
+    """
+
+    PARALLEL_THRESHOLD = 32  # Below this, pool overhead costs more than it saves
+    CHUNKS_PER_WORKER = 4  # More chunks = earlier exit on failure, fewer = less IPC
+
+    def __init__(self, max_workers=None, parallel_threshold=PARALLEL_THRESHOLD):
+        self.pool = ProcessPool(max_workers, parallel_threshold, "verifying")
+
+        # Throughput counters
+        self.verified_count = 0
+        self.verify_seconds = 0.0
+
+    def verify_all(self, tx_bytes_list) -> bool:
+        """
+        Returns True only if every transaction signature is valid.
+        Takes raw bytes or Transaction objects. Only raw bytes cross to the worker processes.
+        """
+        tx_bytes_list = list(tx_bytes_list)
+        start = time.perf_counter()
+
+        try:
+            return self.pool.run(len(tx_bytes_list),
+                                 lambda executor: self._verify_parallel(executor, tx_bytes_list),
+                                 lambda: self.verify_serial(tx_bytes_list))
+        finally:
+            self.verified_count += len(tx_bytes_list)
+            self.verify_seconds += time.perf_counter() - start
+
+    @staticmethod
+    def verify_serial(tx_bytes_list) -> bool:
+        return _verify_chunk(tx_bytes_list)
+
+    def _verify_parallel(self, executor, tx_bytes_list) -> bool:
+        tx_bytes_list = [tx.data if isinstance(tx, Transaction) else tx for tx in tx_bytes_list]
+        chunk_count = self.pool.max_workers * self.CHUNKS_PER_WORKER
+        chunk_size = max(1, -(-len(tx_bytes_list) // chunk_count))
+
+        pending = {
+            executor.submit(_verify_chunk, tx_bytes_list[i:i + chunk_size])
+            for i in range(0, len(tx_bytes_list), chunk_size)
+        }
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if not future.result():
+                    # Early exit, chunks that did not start yet are dropped
+                    for other in pending:
+                        other.cancel()
+                    return False
+
+        return True
+
+    def throughput(self) -> float:
+        """
+        Verifications per second over the lifetime of this verifier.
+        """
+        if self.verify_seconds == 0:
+            return 0.0
+        return self.verified_count / self.verify_seconds
+
+    def stats(self):
+        return {
+            "verified": self.verified_count,
+            "seconds": self.verify_seconds,
+            "verifications_per_second": self.throughput(),
+            "workers": self.pool.max_workers
+        }
+
+    def close(self):
+        self.pool.close()
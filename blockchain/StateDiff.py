@@ -0,0 +1,123 @@
+import json
+import hashlib
+
+from SANVM.PackedBytecode import PackedBytecode
+
+
+class StateDiff:
+    """
+    What one block changed in the node state:
+        balances:  address -> balance after the block, in Ledger base units
+        contracts: contract_id -> {"deployed": {"bytecode" (packed, hex), "functions"} or None,
+                                   "set": {key: value after the block}, "deleted": {key, ...}}
+
+    Sealing a diff chains it to the previous one: digest = sha256(previous digest + canonical diff).
+    Two nodes with the same digest at a height went through the same state changes up to it.
+    """
+
+    GENESIS_DIGEST = "0" * 64
+
+    def __init__(self, balances=None, contracts=None, digest=None):
+        self.balances = dict(balances) if balances else {}
+        self.contracts = contracts if contracts else {}
+        self.digest = digest
+
+    def _contract(self, contract_id):
+        entry = self.contracts.get(contract_id)
+        if entry is None:
+            entry = {"deployed": None, "set": {}, "deleted": set()}
+            self.contracts[contract_id] = entry
+        return entry
+
+    def add_contract_effect(self, contract_id, effect):
+        """
+        Folds one call's effect (see BlockExecutor.call_effect) into the diff.
+        """
+        entry = self._contract(contract_id)
+
+        if effect[0] == "deploy":
+            info = effect[1]
+            entry["deployed"] = {"bytecode": PackedBytecode.pack(info["bytecode"]).to_bytes().hex(),
+                                 "functions": info["functions"]}
+            entry["set"] = dict(info["storage"])
+            entry["deleted"] = set()
+            return
+
+        _, updated, deleted = effect
+        for key, value in updated.items():
+            entry["set"][key] = value
+            entry["deleted"].discard(key)
+        for key in deleted:
+            entry["set"].pop(key, None)
+            if entry["deployed"] is None:
+                entry["deleted"].add(key)  # A contract deployed in this block starts from "set" alone
+
+    def apply(self, ledger, contracts):
+        """
+        Applies the diff to a ledger and a contracts dict, instead of executing the block.
+        """
+        for address, balance in self.balances.items():
+            ledger.set_units(address, balance)
+
+        for contract_id, entry in self.contracts.items():
+            if entry["deployed"] is not None:
+                contracts[contract_id] = {
+                    "bytecode": PackedBytecode.from_bytes(bytes.fromhex(entry["deployed"]["bytecode"])),
+                    "functions": entry["deployed"]["functions"],
+                    "storage": dict(entry["set"])
+                }
+                continue
+
+            storage = contracts[contract_id]["storage"]
+            storage.update(entry["set"])
+            for key in entry["deleted"]:
+                storage.pop(key, None)
+
+    # Serialization
+
+    def to_dict(self):
+        """
+        JSON-ready form. Storage keys can be ints or strings, so key/value maps are sent as sorted
+        [key, value] pairs, which also makes the form canonical.
+        """
+        return {
+            "balances": _pairs(self.balances),
+            "contracts": [
+                [contract_id, {
+                    "deployed": entry["deployed"],
+                    "set": _pairs(entry["set"]),
+                    "deleted": sorted(entry["deleted"], key=_sort_key)
+                }]
+                for contract_id, entry in sorted(self.contracts.items(), key=lambda item: _sort_key(item[0]))
+            ],
+            "digest": self.digest
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        contracts = {}
+        for contract_id, entry in data["contracts"]:
+            contracts[contract_id] = {
+                "deployed": entry["deployed"],
+                "set": {key: value for key, value in entry["set"]},
+                "deleted": set(entry["deleted"])
+            }
+        return cls({address: balance for address, balance in data["balances"]}, contracts, data.get("digest"))
+
+    def canonical(self) -> bytes:
+        data = self.to_dict()
+        del data["digest"]
+        return json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+    def seal(self, previous_digest) -> str:
+        self.digest = hashlib.sha256(previous_digest.encode("utf-8") + self.canonical()).hexdigest()
+        return self.digest
+
+
+def _sort_key(key):
+    # Keys of different types (1 and "1") must not be compared directly
+    return json.dumps(key, sort_keys=True)
+
+
+def _pairs(mapping):
+    return [[key, value] for key, value in sorted(mapping.items(), key=lambda item: _sort_key(item[0]))]
@@ -0,0 +1,121 @@
+import os
+import json
+
+from blockchain.StateDiff import StateDiff
+
+
+class StateDiffLog:
+    """
+    Sealed state diffs by block height, so peers can sync state changes instead of re-executing blocks.
+
+    With a directory, diffs are appended to state_diffs.ndjson, one JSON line per height, and
+    read back with pread. Only the (offset, length) of each line is kept in memory; it is
+    rebuilt on open, and a partly written last line is cut off.
+    Without a directory, the encoded lines are kept in memory.
+
+    Heights without a diff (blocks applied before diffs existed) are simply missing.
+
+    The gas each transaction of the block used is stored on the same line. It is not part of
+    the diff or its digest, peers are only sent the diff.
+    """
+
+    FILE_NAME = "state_diffs.ndjson"
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.positions = {}  # height -> (offset, length), or encoded line in memory mode
+        self.digest = StateDiff.GENESIS_DIGEST  # digest of the last appended diff
+
+        if directory is None:
+            self.file = None
+            return
+
+        os.makedirs(directory, exist_ok=True)
+        self.file = open(os.path.join(directory, self.FILE_NAME), "a+b")
+        self._load()
+
+    def _load(self):
+        self.file.seek(0)
+        offset = 0
+        last_line = None
+
+        for line in self.file:
+            if not line.endswith(b"\n"):
+                break  # Crash in the middle of a write
+            record = json.loads(line)
+            self.positions[record["height"]] = (offset, len(line))
+            offset += len(line)
+            last_line = record
+
+        self.file.truncate(offset)
+        self.file.seek(offset)
+        if last_line is not None:
+            self.digest = last_line["diff"]["digest"]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, height):
+        return height in self.positions
+
+    def append(self, height, diff, gas_used=None):
+        """
+        Seals the diff onto the last digest and stores it, with the {tx hash: gas used} of the block
+        if given. Returns the new digest.
+        """
+        diff.seal(self.digest)
+        record = {"height": height, "diff": diff.to_dict()}
+        if gas_used:
+            record["gas"] = gas_used
+        line = json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+
+        if self.file is None:
+            self.positions[height] = line
+        else:
+            offset = self.file.tell()
+            self.file.write(line)
+            self.file.flush()
+            self.positions[height] = (offset, len(line))
+
+        self.digest = diff.digest
+        return self.digest
+
+    def _record(self, height):
+        position = self.positions.get(height)
+        if position is None:
+            return None
+
+        if self.file is None:
+            line = position
+        else:
+            offset, length = position
+            line = os.pread(self.file.fileno(), length, offset)
+        return json.loads(line)
+
+    def get_dict(self, height):
+        """
+        The diff at a height in its JSON-ready form (what peers are sent), or None.
+        """
+        record = self._record(height)
+        return None if record is None else record["diff"]
+
+    def get_gas(self, height):
+        """
+        {tx hash: gas used} of the block at a height, empty if nothing was recorded.
+        """
+        record = self._record(height)
+        return {} if record is None else record.get("gas", {})
+
+    def get(self, height):
+        data = self.get_dict(height)
+        return None if data is None else StateDiff.from_dict(data)
+
+    def sync(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
@@ -1,7 +1,14 @@
-import time, json
+import time, json, hashlib
+from functools import cached_property
 import pqcrypto.sign.dilithium2 as dilithium2
 
 class Transaction:
+    """
+    A transaction is its raw bytes (data) plus the fee it was charged.
+    The decoded JSON (fields) and the content hash (tx_hash) are computed on first use and kept,
+    so every stage that handles the same object (mempool, verification, execution, balances) shares them.
+    """
+
     def __init__(self, transaction_pool, data):
         self.timestamp = time.time()
         self.data = data
@@ -29,7 +36,51 @@ class Transaction:
         dynamic_fee = min(dynamic_fee, max_fee_per_byte)
 
         # Return fee
-        return len(self.data.encode('utf-8')) * dynamic_fee
+        data = self.data if isinstance(self.data, bytes) else self.data.encode('utf-8')
+        return len(data) * dynamic_fee
+
+    @cached_property
+    def fields(self) -> dict:
+        """
+        The decoded transaction JSON. Decoded once, treat it as read-only.
+        """
+        try:
+            data = self.data if isinstance(self.data, bytes) else self.data.encode('utf-8')
+            return json.loads(data.decode('utf-8'))
+        except Exception as e:
+            raise Exception("Transaction decoding error:", e)
+
+    @cached_property
+    def tx_hash(self) -> str:
+        data = self.data if isinstance(self.data, bytes) else self.data.encode('utf-8')
+        return Transaction.content_hash(data)
+
+    def verify(self) -> bool:
+        """
+        verify_transaction on the already decoded fields.
+        """
+        return Transaction.verify_fields(self.fields)
+
+    def to_dict(self):
+        # Text data is sent as its UTF-8 bytes, from_dict always reads hex
+        data = self.data if isinstance(self.data, bytes) else self.data.encode('utf-8')
+        return {
+            "timestamp": self.timestamp,
+            "data": data.hex(),
+            "fee": self.fee
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Restores a transaction received from a peer. The fee is taken as it was charged,
+        it is not calculated again against this node's pool.
+        """
+        tx = cls.__new__(cls)
+        tx.timestamp = data["timestamp"]
+        tx.data = bytes.fromhex(data["data"])
+        tx.fee = data["fee"]
+        return tx
 
     @staticmethod
     def verify_transaction(tx_bytes) -> bool:
@@ -51,6 +102,14 @@ class Transaction:
         except Exception as e:
             raise Exception("Transaction decoding error:", e)
 
+        return Transaction.verify_fields(tx)
+
+    @staticmethod
+    def verify_fields(tx: dict) -> bool:
+        """
+        Same as verify_transaction, for a transaction that is already decoded.
+        """
+
         # Public key control end convert:
         if "sender" not in tx:
             raise Exception("Transaction does not have sender")
@@ -84,6 +143,13 @@ class Transaction:
         except Exception as e:
             raise Exception("Signature verify error:", e)
 
+    @staticmethod
+    def content_hash(tx_bytes) -> str:
+        """
+        SHA3-256 of the raw transaction bytes. Used as the transaction's identity on this node.
+        """
+        return hashlib.sha3_256(tx_bytes).hexdigest()
+
     @staticmethod
     def serialize_message(message: dict, exclude_signature: bool = True) -> bytes:
         """
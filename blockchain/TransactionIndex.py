@@ -0,0 +1,87 @@
+import os
+import struct
+
+
+class TransactionIndex:
+    """
+    Transaction hash -> (block height, position in the block).
+
+    With a directory, every entry is also appended to tx_index.dat as a fixed-size record, and the
+    file is loaded back into the dict on open. A partly written last record is cut off. The last
+    indexed block and any block after it (a crash between a block write and its index write) are
+    indexed again by Blockchain, entries already present are not written twice.
+    """
+
+    FILE_NAME = "tx_index.dat"
+    RECORD = struct.Struct("<32sQI")  # tx hash, height, position
+
+    def __init__(self, directory=None):
+        self.entries = {}  # tx hash bytes -> (height, position)
+        self.last_height = -1  # highest indexed block
+        self.file = None
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.file = open(os.path.join(directory, self.FILE_NAME), "a+b")
+            self._load()
+
+    def _load(self):
+        self.file.seek(0)
+        data = self.file.read()
+        usable = len(data) - len(data) % self.RECORD.size
+
+        for tx_hash, height, position in self.RECORD.iter_unpack(memoryview(data)[:usable]):
+            self.entries[tx_hash] = (height, position)
+            self.last_height = max(self.last_height, height)
+
+        self.file.truncate(usable)
+        self.file.seek(usable)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, tx_hash):
+        return self._key(tx_hash) in self.entries
+
+    @staticmethod
+    def _key(tx_hash):
+        return bytes.fromhex(tx_hash) if isinstance(tx_hash, str) else tx_hash
+
+    def add_block(self, height, tx_hashes):
+        """
+        Indexes a block's transaction hashes (hex, or None for entries that are not transactions).
+        """
+        records = []
+        for position, tx_hash in enumerate(tx_hashes):
+            if tx_hash is None:
+                continue
+            key = self._key(tx_hash)
+            if self.entries.get(key) == (height, position):
+                continue  # Already indexed, a block is indexed again after a crash
+            self.entries[key] = (height, position)
+            records.append(self.RECORD.pack(key, height, position))
+
+        if self.file is not None and records:
+            self.file.write(b"".join(records))
+            self.file.flush()
+
+        self.last_height = max(self.last_height, height)
+
+    def get(self, tx_hash):
+        """
+        (height, position) of a transaction, or None. O(1).
+        """
+        try:
+            return self.entries.get(self._key(tx_hash))
+        except ValueError:  # Not a hex hash
+            return None
+
+    def sync(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+
+
+class VerifiedTransactionCache:
+    """
+    Bounded LRU set of transaction hashes whose signatures already verified on this node.
+    Only successful verifications are recorded, a bad transaction is checked again every time.
+    Routes run in FastAPI's thread pool, every access goes through the lock.
+    """
+
+    DEFAULT_MAX_SIZE = 100_000
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def contains(self, tx_hash) -> bool:
+        with self.lock:
+            if tx_hash in self.entries:
+                self.entries.move_to_end(tx_hash)
+                self.hits += 1
+                return True
+
+            self.misses += 1
+            return False
+
+    def add(self, tx_hash):
+        with self.lock:
+            if tx_hash in self.entries:
+                self.entries.move_to_end(tx_hash)
+                return
+
+            self.entries[tx_hash] = True
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)  # Least recently used
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,221 @@
+import asyncio
+import itertools
+import random
+import struct
+
+import websockets
+
+
+class PeerConnection:
+    """
+    One long-lived WebSocket to a peer.
+
+    Outgoing messages go through a bounded queue and a single writer task.
+    Requests are pipelined: several can be in flight at once. Each request is framed with an id
+    (see frame/unframe) and the peer echoes it in its reply, so replies may come in any order
+    and a reply nobody waits for any more (or an unsolicited message) is dropped.
+
+    If the connection drops, in-flight requests fail with ConnectionError and the writer
+    reconnects with exponential backoff. Keepalive is the websockets ping/pong.
+    """
+
+    # Request frame: magic, payload kind, request id, then the payload
+    FRAME_HEADER = struct.Struct("<4sBQ")
+    FRAME_MAGIC = b"SREQ"
+    KIND_BYTES = 0
+    KIND_TEXT = 1
+
+    def __init__(self, url, max_queue, ping_interval, backoff_base, backoff_max):
+        self.url = url
+        self.ping_interval = ping_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.queue = asyncio.Queue(maxsize=max_queue)  # (message, future or None)
+        self.pending = {}  # request id -> future waiting for its reply
+        self.next_id = 0
+        self.websocket = None
+        self.failures = 0
+        self.closed = False
+
+        self.task = asyncio.create_task(self._run())
+
+    async def send(self, message, timeout):
+        """
+        Queues a fire-and-forget message. Waits up to `timeout` for room in the queue.
+        """
+        await self._enqueue(message, None, timeout)
+
+    async def request(self, message, timeout):
+        """
+        Sends a message and returns the peer's reply.
+        """
+        request_id = self.next_id
+        self.next_id += 1
+
+        future = asyncio.get_running_loop().create_future()
+        future.request_id = request_id
+        await self._enqueue(self.frame(request_id, message), future, timeout)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(request_id, None)
+
+    @classmethod
+    def frame(cls, request_id, message):
+        """
+        Wraps a request or a reply in a frame carrying its request id. Frames are always bytes.
+        """
+        if isinstance(message, str):
+            return cls.FRAME_HEADER.pack(cls.FRAME_MAGIC, cls.KIND_TEXT, request_id) + message.encode("utf-8")
+        return cls.FRAME_HEADER.pack(cls.FRAME_MAGIC, cls.KIND_BYTES, request_id) + bytes(message)
+
+    @classmethod
+    def unframe(cls, data):
+        """
+        (request id, message) of a frame, with the message back as str or bytes.
+        Raises ValueError for anything that is not a frame.
+        """
+        if not isinstance(data, (bytes, bytearray)) or len(data) < cls.FRAME_HEADER.size:
+            raise ValueError("Not a request frame")
+        magic, kind, request_id = cls.FRAME_HEADER.unpack_from(data)
+        if magic != cls.FRAME_MAGIC or kind not in (cls.KIND_BYTES, cls.KIND_TEXT):
+            raise ValueError("Not a request frame")
+
+        payload = bytes(data[cls.FRAME_HEADER.size:])
+        return request_id, payload.decode("utf-8") if kind == cls.KIND_TEXT else payload
+
+    async def _enqueue(self, message, future, timeout):
+        if self.closed:
+            raise ConnectionError(f"Connection to {self.url} is closed")
+        try:
+            await asyncio.wait_for(self.queue.put((message, future)), timeout)
+        except asyncio.TimeoutError:
+            raise ConnectionError(f"Send queue to {self.url} is full")
+
+    async def _run(self):
+        while not self.closed:
+            try:
+                async with websockets.connect(self.url, ping_interval=self.ping_interval,
+                                              ping_timeout=self.ping_interval) as websocket:
+                    self.websocket = websocket
+                    self.failures = 0
+
+                    reader = asyncio.create_task(self._read(websocket))
+                    writer = asyncio.create_task(self._write(websocket))
+                    try:
+                        done, _ = await asyncio.wait({reader, writer}, return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        reader.cancel()
+                        writer.cancel()
+                    for task in done:
+                        task.result()  # Raises what broke the connection
+
+                    raise ConnectionError("closed by peer")
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                print(f"[POOL] Connection to {self.url} lost: {e}")
+            finally:
+                self.websocket = None
+                self._fail_pending(ConnectionError(f"Connection to {self.url} lost"))
+
+            if not self.closed:
+                await asyncio.sleep(self._backoff())
+
+    async def _write(self, websocket):
+        while True:
+            message, future = await self.queue.get()
+            if future is not None and future.done():
+                continue  # Caller already gave up
+
+            if future is not None:
+                self.pending[future.request_id] = future  # Before sending, the reply may beat the send's return
+
+            try:
+                await websocket.send(message)
+            except Exception as e:
+                if future is not None and not future.done():
+                    future.set_exception(ConnectionError(f"Could not send to {self.url}: {e}"))
+                raise
+
+    async def _read(self, websocket):
+        async for data in websocket:
+            try:
+                request_id, message = self.unframe(data)
+            except ValueError:
+                continue  # Unsolicited message, nobody is waiting for it
+
+            future = self.pending.pop(request_id, None)
+            if future is not None and not future.done():
+                future.set_result(message)
+
+    def _fail_pending(self, error):
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def _backoff(self):
+        delay = min(self.backoff_base * (2 ** (self.failures - 1)), self.backoff_max)
+        return delay * random.uniform(0.5, 1.0)  # Jitter, so peers do not reconnect in lockstep
+
+    async def close(self):
+        self.closed = True
+        self.task.cancel()
+        try:
+            await self.task
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._fail_pending(ConnectionError(f"Connection to {self.url} is closed"))
+        while not self.queue.empty():
+            _, future = self.queue.get_nowait()
+            if future is not None and not future.done():
+                future.set_exception(ConnectionError(f"Connection to {self.url} is closed"))
+
+
+class ConnectionPool:
+    """
+    Keeps `connections_per_peer` long-lived connections per peer URL and spreads messages over them.
+    Connections belong to the event loop that opened them, so each loop gets its own set.
+    """
+
+    def __init__(self, connections_per_peer=1, max_queue=1000, send_timeout=5,
+                 ping_interval=20, backoff_base=0.5, backoff_max=30):
+        self.connections_per_peer = connections_per_peer
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.ping_interval = ping_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.peers = {}  # (event loop, url) -> cycle over its PeerConnections
+        self.connections = {}  # (event loop, url) -> list of PeerConnections
+
+    def _connection(self, url):
+        key = (asyncio.get_running_loop(), url)
+        if key not in self.peers:
+            connections = [PeerConnection(url, self.max_queue, self.ping_interval, self.backoff_base, self.backoff_max)
+                           for _ in range(self.connections_per_peer)]
+            self.connections[key] = connections
+            self.peers[key] = itertools.cycle(connections)
+        return next(self.peers[key])
+
+    async def send(self, url, message):
+        await self._connection(url).send(message, self.send_timeout)
+
+    async def request(self, url, message, timeout=None):
+        return await self._connection(url).request(message, timeout or self.send_timeout)
+
+    async def close_peer(self, url):
+        key = (asyncio.get_running_loop(), url)
+        self.peers.pop(key, None)
+        for connection in self.connections.pop(key, []):
+            await connection.close()
+
+    async def close_all(self):
+        loop = asyncio.get_running_loop()
+        for key in [key for key in self.connections if key[0] is loop]:
+            await self.close_peer(key[1])
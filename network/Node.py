@@ -1,45 +1,93 @@
 import requests
 import websockets
 import asyncio
-import pickle
 import json
 import random
 import socket
 import os
+import time
 import pqcrypto.sign.dilithium2 as dilithium2
 
 from blockchain.Blockchain import Blockchain
 from blockchain.Transaction import Transaction
 from blockchain.Block import Block
+from blockchain.BlockCodec import BlockCodec
+from blockchain.SignatureVerifier import SignatureVerifier
+from blockchain.VerifiedCache import VerifiedTransactionCache
+from blockchain.Mempool import Mempool
+from blockchain.StateDiff import StateDiff
+
+from network.ConnectionPool import ConnectionPool, PeerConnection
 
 from SANVM.VM import SANVirtualMachine
 from SANVM.Storage import Storage
-from SANVM.pena_parser import PenaParser
+from SANVM.BlockExecutor import BlockExecutor
+from SANVM.PendingContracts import PendingContracts
+from SANVM.CompileCache import CompileCache
+from SANVM.Gas import transaction_gas_limit
+from SANVM.Profiler import block_report
 
 from utils.parser import Parser
+from utils.LRUDict import LRUDict
 
 class Node:
     BLOCK_THRESHOLD_FEE = 500
 
+    APPROVAL_RATIO = 0.66
+    CONTROLLER_TIMEOUT = 5  # seconds per controller, connect + vote
+    VOTE_APPROVED = "APPROVED"
+    VOTE_REJECTED = "REJECTED"
+
+    # Gas caps for contract and bytecode execution, a transaction may ask for less with "gas_limit"
+    TX_GAS_LIMIT = 1_000_000
+    BLOCK_GAS_LIMIT = 10_000_000
+
+    GAS_USED_SIZE = 100_000  # Transactions whose gas is kept in memory
+
+    SYNC_RETRIES = 5
+    SYNC_BACKOFF = 0.5  # seconds before the first retry, doubled after every failed attempt
+
     def __init__(self):
         self.PEERS = []
 
+        # Long-lived connections to peers, shared by gossip, ping, broadcast and controller rounds
+        self.connections = ConnectionPool()
+
         self.incoming_node, self.outgoing_node = random.sample(self.PEERS, 2)
         self.controller_nodes = random.sample(self.PEERS, 10)
+        self.controller_latency = {}  # controller -> seconds of its last vote
+        self.last_quorum_latency = None
 
         self.check_dead_peers()
 
-        self.blockchain = Blockchain()
-
-        self.last_seen_block_timestamp = 0 # last seen block's timestamp
+        # Chain is kept on disk so a restart does not lose it
+        data_dir = os.getenv("SAN_DATA_DIR", "chain_data")
+        self.blockchain = Blockchain(data_dir)
 
         self.storage = Storage()
-
-        self.synchronize(self.last_seen_block_timestamp)
-
-        self.transaction_pool = []
+        self.transaction_pool = Mempool()
 
         self.vm = SANVirtualMachine(self.storage)
+        # SAN_PROFILE=1 profiles every contract call, last_block_profile holds the report of the last block
+        self.vm.contract_manager.profile = os.getenv("SAN_PROFILE") == "1"
+        self.last_block_profile = None
+        # transaction content hash -> gas its execution used, for recent blocks only.
+        # The gas of every block is stored with its state diff, older lookups read it from there.
+        self.gas_used = LRUDict(self.GAS_USED_SIZE)
+        # Compiled PENA sources, on disk too so replaying the chain does not parse known templates again
+        self.compile_cache = CompileCache(directory=os.path.join(data_dir, "compile_cache"))
+        self.block_executor = BlockExecutor(self.vm.contract_manager, self.TX_GAS_LIMIT, self.BLOCK_GAS_LIMIT,
+                                            compile_cache=self.compile_cache)
+
+        self.verifier = SignatureVerifier()
+        self.verified_cache = VerifiedTransactionCache()
+
+        # Balances and contract storage are not stored, they are rebuilt from the chain
+        self.replay_state()
+
+        # Height is the sync cursor, a restarted node only asks for what it does not have.
+        # Synced blocks are executed, so everything above is set up first.
+        self.synchronize(self.blockchain.height())
 
     async def check_dead_peers(self):
         """
@@ -54,6 +102,7 @@ class Node:
             if not is_alive:
                 dead_nodes.append(node)
                 self.PEERS.remove(node)  # remove from list
+                await self.connections.close_peer(f"ws://{node}")  # Stop reconnecting to it
 
         if dead_nodes:
             # choose new PEER
@@ -70,28 +119,30 @@ class Node:
         message = json.dumps({"type": "DEAD_PEER", "peer": dead_peer})
 
         try:
-            async with websockets.connect(f"ws://{self.outgoing_node}") as websocket:
-                await websocket.send(message)
+            await self.connections.send(f"ws://{self.outgoing_node}", message)
         except Exception as e:
-            raise f"[ERROR] Could not gossip dead peer {dead_peer} to {self.outgoing_node}: {e}"
+            print(f"[ERROR] Could not gossip dead peer {dead_peer} to {self.outgoing_node}: {e}")
 
     async def listen_for_dead_peers(self, host="0.0.0.0", port=8771):
         """
         It listens to incoming "dead peer" messages and deletes them if the incoming peer is in the self.PEERS list.
         """
 
-        async def handler(websocket, _):
-            try:
-                message = await websocket.recv()
-                data = json.loads(message)
+        async def handler(websocket, *_):
+            # Peers keep the connection open, so handle every message on it
+            async for message in websocket:
+                if await self.answer_ping(websocket, message):
+                    continue
+                try:
+                    data = json.loads(message)
 
-                if data.get("type") == "DEAD_PEER":
-                    dead_peer = data.get("peer")
-                    if dead_peer in self.PEERS:
-                        self.PEERS.remove(dead_peer)
+                    if data.get("type") == "DEAD_PEER":
+                        dead_peer = data.get("peer")
+                        if dead_peer in self.PEERS:
+                            self.PEERS.remove(dead_peer)
 
-            except Exception as e:
-                raise f"[ERROR] Failed to process dead peer update: {e}"
+                except Exception as e:
+                    print(f"[ERROR] Failed to process dead peer update: {e}")
 
         async with websockets.serve(handler, host, port):
             await asyncio.Future()
@@ -99,20 +150,33 @@ class Node:
     def start_dead_peer_listener(self):
         asyncio.run(self.listen_for_dead_peers())
 
-    @staticmethod
-    async def ping_node(node):
+    async def ping_node(self, node):
         """
         It pings a node, if the pong response comes it returns True, otherwise it returns False.
         """
         try:
-            async with websockets.connect(f"ws://{node}") as websocket:
-                await websocket.send(json.dumps({"type": "PING"}))
-                response = await asyncio.wait_for(websocket.recv(), timeout=3)  # 3 sec timeout
-                data = json.loads(response)
-                return data.get("type") == "PONG"
+            response = await self.connections.request(f"ws://{node}", json.dumps({"type": "PING"}), timeout=3)  # 3 sec timeout
+            data = json.loads(response)
+            return data.get("type") == "PONG"
         except Exception:
             return False
 
+    @staticmethod
+    async def answer_ping(websocket, message):
+        """
+        Replies PONG to a ping_node request, in a frame with the ping's request id.
+        Returns False for any other message, the listener handles it as before.
+        """
+        try:
+            request_id, payload = PeerConnection.unframe(message)
+            if json.loads(payload).get("type") != "PING":
+                return False
+        except (ValueError, AttributeError):
+            return False
+
+        await websocket.send(PeerConnection.frame(request_id, json.dumps({"type": "PONG"})))
+        return True
+
     @staticmethod
     def get_local_ip():
         """
@@ -148,9 +212,8 @@ class Node:
         message = json.dumps({"type": "PEER_UPDATE", "peer": self.get_local_ip})
 
         try:
-            async with websockets.connect(f"ws://{self.outgoing_node}") as websocket:
-                await websocket.send(message)
-                print(f"[GOSSIP] Sent self to outgoing node {self.outgoing_node}.")
+            await self.connections.send(f"ws://{self.outgoing_node}", message)
+            print(f"[GOSSIP] Sent self to outgoing node {self.outgoing_node}.")
         except Exception as e:
             print(f"[ERROR] Could not register to network via {self.outgoing_node}: {e}")
 
@@ -166,33 +229,35 @@ class Node:
         message = json.dumps({"type": "PEER_UPDATE", "peer": new_peer})
 
         try:
-            async with websockets.connect(f"ws://{self.outgoing_node}") as websocket:
-                await websocket.send(message)
-                print(f"[GOSSIP] Sent new peer info to {self.outgoing_node}.")
+            await self.connections.send(f"ws://{self.outgoing_node}", message)
+            print(f"[GOSSIP] Sent new peer info to {self.outgoing_node}.")
         except Exception as e:
-            raise f"[ERROR] Could not gossip new peer to {self.outgoing_node}: {e}"
+            print(f"[ERROR] Could not gossip new peer to {self.outgoing_node}: {e}")
 # TODO: Global çağrı ile çözüm? 10 dk geride kalan node global call açar ve veri ister. Ama kimden/nasıl
     async def listen_for_peers(self, host="0.0.0.0", port=8770):
         """
         Start a WebSocket server that listens for PEERS updates.
         """
 
-        async def handler(websocket, _):
-            try:
-                message = await websocket.recv()
-                data = json.loads(message)
+        async def handler(websocket, *_):
+            # Peers keep the connection open, so handle every message on it
+            async for message in websocket:
+                if await self.answer_ping(websocket, message):
+                    continue
+                try:
+                    data = json.loads(message)
 
-                if data.get("type") == "PEER_UPDATE":
-                    new_peer = data.get("peer")
-                    if new_peer not in self.PEERS:
-                        self.PEERS.append(new_peer)
-                        print(f"[PEER UPDATE] New peer added: {new_peer}")
+                    if data.get("type") == "PEER_UPDATE":
+                        new_peer = data.get("peer")
+                        if new_peer not in self.PEERS:
+                            self.PEERS.append(new_peer)
+                            print(f"[PEER UPDATE] New peer added: {new_peer}")
 
-                        # Gossip ile diğer node'lara yay
-                        await self.gossip_peers(new_peer)
+                            # Gossip ile diğer node'lara yay
+                            await self.gossip_peers(new_peer)
 
-            except Exception as e:
-                print(f"[ERROR] Peer update failed: {e}")
+                except Exception as e:
+                    print(f"[ERROR] Peer update failed: {e}")
 
         async with websockets.serve(handler, host, port):
             print(f"[PEER SERVER] Listening on ws://{host}:{port}")
@@ -201,78 +266,191 @@ class Node:
     def start_peer_listener(self):
         asyncio.run(self.listen_for_peers())
 
-    def synchronize(self, last_seen_block_timestamp):
-        response = requests.get(f"https://{self.incoming_node}/sync?last_seen_block_timestamp={last_seen_block_timestamp}")
-        nodes_block = response.json() if response.status_code == 200 else None
+    def synchronize(self, last_seen_height):
+        """
+        Catches up from the incoming node over the streaming sync endpoint.
+        Blocks are applied one by one as they arrive, so memory does not grow with the gap.
+        If the stream breaks, it resumes from the last applied height after an exponential backoff.
+        """
+        for attempt in range(self.SYNC_RETRIES):
+            if attempt:
+                time.sleep(self.SYNC_BACKOFF * 2 ** (attempt - 1))
+            try:
+                if self._consume_sync_stream(max(last_seen_height, self.blockchain.height())):
+                    return
+            except (requests.RequestException, ValueError) as e:
+                print(f"[SYNC] Stream interrupted at height {self.blockchain.height()}: {e}")
+
+        print(f"[ERROR] Could not finish sync from {self.incoming_node}")
+
+    def _consume_sync_stream(self, height):
+        """
+        Returns True when the peer sent its end marker, False if the stream ended early.
+        """
+        url = f"https://{self.incoming_node}/sync/stream?height={height}"
+        with requests.get(url, stream=True, timeout=30) as response:
+            if response.status_code != 200:
+                return False
+
+            for line in response.iter_lines():
+                if not line:
+                    continue
 
-        if nodes_block and "block" in nodes_block and "storage" in nodes_block:
-            new_blocks = [block for block in nodes_block["block"] if block.timestamp > last_seen_block_timestamp]
-            if new_blocks:
-                self.blockchain.chain.extend(new_blocks)
+                message = json.loads(line)
+                if message["type"] == "end":
+                    return True
 
-                self.storage = nodes_block["storage"]
+                block = Block.from_dict(message["block"])  # Raises ValueError on a hash mismatch
+                if block.index <= self.blockchain.height():
+                    continue  # Already have it, resumed stream overlaps
 
-        self.last_seen_block_timestamp = self.blockchain.chain[-1].timestamp
+                if block.previous_block_hash != self.blockchain[-1].current_block_hash:
+                    raise ValueError(f"Block {block.index} does not link to our chain")
+                if not self.verify_block(block):
+                    raise ValueError(f"Block {block.index} failed verification")
 
-    def ask_synchronize(self, last_seen_block_timestamp):
-        new_blocks = [block for block in self.blockchain.chain if block.timestamp > last_seen_block_timestamp]
+                # The block is executed, the peer's state diff is only compared with ours
+                state_diff = message.get("state_diff")
+                try:
+                    self.apply_block(block, StateDiff.from_dict(state_diff) if state_diff else None)
+                except ValueError:
+                    raise
+                except Exception as e:
+                    raise ValueError(f"Block {block.index} failed: {e}")
+
+        return False
+
+    def stream_blocks(self, height, limit=None):
+        """
+        NDJSON lines for the blocks after `height`, read one at a time from the chain.
+        Every block line carries its height so the receiver can resume from it, and the block's
+        sealed state diff when this node has one.
+        """
+        last_height = self.blockchain.height()
+        if limit is not None:
+            last_height = min(last_height, height + limit)
+
+        for block_height in range(max(height + 1, 0), last_height + 1):
+            block = self.blockchain[block_height]
+            yield json.dumps({"type": "block", "height": block_height, "block": block.to_dict(),
+                              "state_diff": self.blockchain.state_diffs.get_dict(block_height)}) + "\n"
 
-        return {"block": new_blocks if new_blocks else None,
-                "storage": self.storage if new_blocks else None}
+        yield json.dumps({"type": "end", "height": last_height}) + "\n"
+
+    def ask_synchronize(self, last_seen_block_timestamp=None, height=None, block_hash=None):
+        """
+        Blocks after the given cursor, in their JSON form (Block.to_dict), as the /sync route returns them.
+        Height and hash cursors are exact, O(k) for k new blocks.
+        The timestamp cursor is kept for old peers and is resolved with a bisect, O(log n + k).
+        """
+        if height is not None:
+            new_blocks = self.blockchain.blocks_after_height(height)
+        elif block_hash is not None:
+            new_blocks = self.blockchain.blocks_after_hash(block_hash)
+        else:
+            new_blocks = self.blockchain.blocks_after_timestamp(last_seen_block_timestamp or 0)
+
+        # State changes only, one sealed diff per block, instead of the whole storage
+        state_diffs = [self.blockchain.state_diffs.get_dict(self.blockchain.height_of(block.current_block_hash))
+                       for block in new_blocks]
+
+        return {"block": [block.to_dict() for block in new_blocks] if new_blocks else None,
+                "state_diffs": state_diffs if new_blocks else None,
+                "state_digest": self.blockchain.state_digest()}
 
     async def send_to_controllers(self, block):
         """
         Bloks send to controllers first
         If %66 of controllers approve it, gossip start
+
+        All controllers are asked at once, each with its own timeout.
+        The round ends as soon as the quorum is reached, or as soon as it can no longer be reached.
         """
-        approvals = 0
         total_controllers = len(self.controller_nodes)
 
         if total_controllers == 0:
-            raise "[WARNING] No controller nodes! Block cannot be verified."
+            raise Exception("[WARNING] No controller nodes! Block cannot be verified.")
 
-        # Block pickle
-        block_bytes = pickle.dumps(block)
+        block_bytes = BlockCodec.encode(block)
 
-        # Send to controller
-        for controller in self.controller_nodes:
-            try:
-                async with websockets.connect(controller) as websocket:
-                    await websocket.send(block_bytes)  # Pickle
-                    response = await websocket.recv()  # Get answer
+        round_start = time.perf_counter()
+        approvals = 0
+        answered = 0
 
-                    if response:
-                        approvals += 1
-            except Exception as e:
-                raise f"[ERROR] Could not send block to {controller}: {e}"
+        # Send to all controllers concurrently
+        tasks = [asyncio.create_task(self._ask_controller(controller, block_bytes))
+                 for controller in self.controller_nodes]
+        try:
+            for next_answer in asyncio.as_completed(tasks):
+                approved = await next_answer
+                answered += 1
+                if approved:
+                    approvals += 1
+
+                # %66 reached, or impossible even if every remaining controller approves
+                if approvals / total_controllers >= self.APPROVAL_RATIO:
+                    break
+                if (approvals + total_controllers - answered) / total_controllers < self.APPROVAL_RATIO:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        self.last_quorum_latency = time.perf_counter() - round_start
 
-        # %66
         approval_ratio = approvals / total_controllers
-        if approval_ratio >= 0.66:
+        if approval_ratio >= self.APPROVAL_RATIO:
             await self.broadcast_block(block)
         else:
-            raise f"[FAILED] Block rejected! Approval Ratio: {approval_ratio:.2f}"
+            raise Exception(f"[FAILED] Block rejected! Approval Ratio: {approval_ratio:.2f}")
 
-    async def control_block(self, websocket, _):
+        return approval_ratio
+
+    async def _ask_controller(self, controller, block_bytes):
         """
-        Controller Nodes
+        Sends the block to one controller and waits for its vote.
+        A timeout, connection error or rejection all count as "not approved".
+        Latency is recorded for a vote or a timeout only. A round cancelled after the quorum
+        was reached, or a connection that failed outright, says nothing about the controller.
         """
-        try:
-            # Get data
-            block_bytes = await websocket.recv()
-            block = pickle.loads(block_bytes)  # Pickle
+        start = time.perf_counter()
+        approved = False
 
-            # Check block
-            if self.verify_block(block):
-                await websocket.send(True)
-                return True
-            else:
-                await websocket.send(False)
-                return False
+        try:
+            response = await self.connections.request(controller, block_bytes, timeout=self.CONTROLLER_TIMEOUT)
+            approved = response == self.VOTE_APPROVED
+            self.controller_latency[controller] = time.perf_counter() - start
+        except asyncio.TimeoutError:
+            self.controller_latency[controller] = time.perf_counter() - start
+            print(f"[WARNING] Controller {controller} timed out")
         except Exception as e:
-            print(f"[ERROR] Failed to control block: {e}")
-            await websocket.send(False)
-            return False
+            print(f"[ERROR] Could not send block to {controller}: {e}")
+
+        return approved
+
+    async def control_block(self, websocket, *_):
+        """
+        Controller Nodes
+        Validators keep the connection open, every block on it gets exactly one vote,
+        sent back with the request id of the block's frame.
+        """
+        async for message in websocket:
+            try:
+                request_id, block_bytes = PeerConnection.unframe(message)
+            except ValueError:
+                print("[WARNING] Dropped a controller message that is not a request frame")
+                continue
+
+            try:
+                block = BlockCodec.decode(block_bytes, verify=False)  # verify_block checks the hash
+
+                # Check block
+                vote = self.VOTE_APPROVED if self.verify_block(block) else self.VOTE_REJECTED
+            except Exception as e:
+                print(f"[ERROR] Failed to control block: {e}")
+                vote = self.VOTE_REJECTED
+
+            await websocket.send(PeerConnection.frame(request_id, vote))
 
     def verify_block(self, block):
         """
@@ -281,28 +459,93 @@ class Node:
         2. Are the signatures of all transactions correct?
         3. Is the previous block hash correct?
         """
-        for tx in block.transactions:
-            if not Transaction.verify_transaction(tx):
-                return False
+        # Check hashes first, they are cheap compared to signatures
+        if not block.has_valid_hash():
+            return False
+        if not all(isinstance(tx, Transaction) for tx in block.transactions):
+            return False  # Plain text entries only belong in the genesis block
 
-        # Check hash
         last_block = self.blockchain.chain[-1]
         if block.previous_block_hash != last_block.current_block_hash:
             return False
 
+        # Only transactions this node has not verified before go to the process pool
+        tx_hashes = [tx.tx_hash for tx in block.transactions]
+        unverified = [tx for tx, tx_hash in zip(block.transactions, tx_hashes)
+                      if not self.verified_cache.contains(tx_hash)]
+
+        # Signatures are checked on the process pool, stops at the first bad one
+        if not self.verifier.verify_all(unverified):
+            return False
+
+        for tx_hash in tx_hashes:
+            self.verified_cache.add(tx_hash)
+
         return True
 
-    async def start_incoming_listener(self, host="0.0.0.0", port=8765):
-        async def handler(websocket, _):
-            async for message in websocket:
-                received_block = pickle.loads(message)  # Byte to block
-                self.blockchain.chain.append(received_block)
+    def verify_transaction(self, transaction: Transaction) -> bool:
+        """
+        Verifies a single incoming transaction, skipping Dilithium2 if this node already verified it.
+        Raises like Transaction.verify_transaction when the signature is bad.
+        """
+        tx_hash = transaction.tx_hash
+        if self.verified_cache.contains(tx_hash):
+            return True
 
-                self.update_SAN_balance_for_block(received_block)
+        transaction.verify()
+        self.verified_cache.add(tx_hash)
+        return True
 
-        async with websockets.serve(handler, host, port):
+    def find_transaction(self, tx_hash, with_proof=False):
+        """
+        Where a transaction is: confirmed (block height, position, confirmations), pending in the mempool,
+        or None if this node does not know it. Confirmed lookups are one index hit and one block read.
+        """
+        location = self.blockchain.find_transaction(tx_hash)
+        if location is None:
+            if tx_hash in self.transaction_pool:
+                return {"tx_hash": tx_hash, "status": "pending"}
+            return None
+
+        height, position = location
+        block = self.blockchain[height]
+        gas_used = self.gas_used.get(tx_hash)
+        if gas_used is None:
+            gas_used = self.blockchain.gas_used_at(height).get(tx_hash)
+        result = {
+            "tx_hash": tx_hash,
+            "status": "confirmed",
+            "height": height,
+            "position": position,
+            "block_hash": block.current_block_hash,
+            "confirmations": self.blockchain.height() - height + 1,
+            "transaction": block.transactions[position].to_dict(),
+            "gas_used": gas_used
+        }
+        if with_proof:
+            result["merkle_root"] = block.merkle_root
+            result["proof"] = block.transaction_proof(position)
+        return result
+
+    async def start_incoming_listener(self, host="0.0.0.0", port=8765):
+        async with websockets.serve(self.receive_blocks, host, port):
             await asyncio.Future()
 
+    async def receive_blocks(self, websocket, *_):
+        """
+        Incoming node
+        Every block on the connection is verified like a controller would, then applied.
+        A block that fails is logged and dropped, the connection stays open for the next one.
+        """
+        async for message in websocket:
+            try:
+                received_block = BlockCodec.decode(message, verify=False)  # verify_block checks the hash
+                if not self.verify_block(received_block):
+                    raise ValueError(f"Block {received_block.index} failed verification")
+                self.apply_block(received_block)
+            except Exception as e:
+                print(f"[ERROR] Dropped incoming block: {e}")
+
     def run_listener(self):
         asyncio.run(self.start_incoming_listener())
 
@@ -313,121 +556,229 @@ class Node:
         async with websockets.serve(self.control_block, host, port):
             await asyncio.Future()
 
-    def send_transaction(self, transaction: Transaction):
-        self.transaction_pool.append(transaction)
-
-        total_fee = sum(tx.fee for tx in self.transaction_pool)
+    async def send_transaction(self, transaction: Transaction) -> bool:
+        """
+        Adds the transaction to the mempool and builds a block once enough fee is collected.
+        The block is added only after the controllers approved it, a rejected block's
+        transactions go back to the mempool and the rejection is raised.
+        If the block fails to execute, only the transaction that made it fail is dropped, the others
+        go back to the mempool, and the failure is raised naming it.
+        Returns False if the mempool rejected it (duplicate, or pool full and fee too low).
+        """
+        if not self.transaction_pool.add(transaction):
+            return False
 
-        if total_fee >= self.BLOCK_THRESHOLD_FEE:
+        if self.transaction_pool.total_fee >= self.BLOCK_THRESHOLD_FEE:
+            transactions = self.transaction_pool.drain()  # Highest fee first
             last_block = self.blockchain.chain[-1]
+            loop = asyncio.get_running_loop()
 
-            index = last_block.index + 1
-            previous_block_hash = last_block.current_block_hash
-            validator = Node.get_public_key()
-            validator_signature = Node.sign_block(index, previous_block_hash, self.transaction_pool)
+            try:
+                index = last_block.index + 1
+                previous_block_hash = last_block.current_block_hash
+                validator = Node.get_public_key()
+                validator_signature = Node.sign_block(index, previous_block_hash, transactions)
 
-            new_block = Block(index, previous_block_hash, validator, validator_signature, self.transaction_pool)
-            self.blockchain.chain.append(new_block)
-            self.send_to_controllers(new_block)
+                new_block = Block(index, previous_block_hash, validator, validator_signature, transactions)
 
-            self.run_bytecodes_of_block(new_block)
-            self.update_SAN_balance_for_block(new_block)
-            self.transaction_pool = []
+                # Executed before the vote, a block that fails is never proposed. Nothing is committed yet.
+                # Execution is CPU bound, it runs off the event loop.
+                try:
+                    state_diff, gas_used = await loop.run_in_executor(None, self.execute_block, new_block)
+                except Exception as e:
+                    failed = await loop.run_in_executor(None, self._first_failing_transaction,
+                                                        last_block, validator, transactions)
+                    if failed is None:
+                        raise
+                    transactions = [pending for pending in transactions if pending is not failed]
+                    raise Exception(f"[FAILED] Transaction {failed.tx_hash} dropped, the block did not execute: {e}")
+
+                await self.send_to_controllers(new_block)
+                if self.blockchain.height() != last_block.index:
+                    raise Exception(f"[FAILED] Chain moved past block {last_block.index} during the vote")
+            except Exception:
+                for pending in transactions:
+                    self.transaction_pool.add(pending)
+                raise
+
+            self.commit_block(new_block, state_diff, gas_used)
+
+        return True
+
+    def _first_failing_transaction(self, last_block, validator, transactions):
+        """
+        The transaction at which executing `transactions` in order on top of last_block fails, or None.
+        Execution stops at the first failing transaction, so a failing prefix still fails when it grows:
+        the shortest failing prefix is found by binary search, its last transaction is the culprit.
+        """
+        def executes(count):
+            block = Block(last_block.index + 1, last_block.current_block_hash, validator, "", transactions[:count])
+            try:
+                self.execute_block(block)
+                return True
+            except Exception:
+                return False
+
+        if executes(len(transactions)):
+            return None
+
+        low, high = 1, len(transactions)
+        while low < high:
+            middle = (low + high) // 2
+            if executes(middle):
+                low = middle + 1
+            else:
+                high = middle
+        return transactions[low - 1]
 
     async def broadcast_block(self, block):
-        block_bytes = pickle.dumps(block)  # Block to the bytes
+        block_bytes = BlockCodec.encode(block)  # Block to the bytes
 
         try:
-            async with websockets.connect(self.outgoing_node) as websocket:
-                await websocket.send(block_bytes)
-                print(f"[NODE] Sent block to {self.outgoing_node}")
+            await self.connections.send(self.outgoing_node, block_bytes)
+            print(f"[NODE] Sent block to {self.outgoing_node}")
         except Exception as e:
             print(f"[ERROR] Could not send block to {self.outgoing_node}: {e}")
 
-    def run_contract_function_of_block(self, new_block):
+    def apply_block(self, block, state_diff=None):
+        """
+        Executes a block received from a peer, then appends it and commits its state changes.
+
+        The block is always executed: a peer's state_diff (sync) is not signed by anything, so it
+        is only compared. Our own diff, sealed onto our digest chain, must give the peer's digest.
+        Raises ValueError if the block's hash does not match its header, or the digests differ,
+        and raises like execute_block if the block fails. Nothing is changed in either case.
+        """
+        if not block.has_valid_hash():
+            raise ValueError(f"Hash mismatch at block {block.index}")
+
+        diff, gas_used = self.execute_block(block)
+
+        if state_diff is not None and diff.seal(self.blockchain.state_digest()) != state_diff.digest:
+            raise ValueError(f"State digest mismatch at block {block.index}")
+
+        self.commit_block(block, diff, gas_used)
+
+    def execute_block(self, block):
+        """
+        Runs a block's contract calls, bytecodes and transfers without changing any node state.
+        Contracts run on a PendingContracts over the committed ones, the ledger is only previewed.
+        Returns (StateDiff, {tx hash: gas used}), what commit_block needs. Raises if the block fails.
+        """
+        state_diff = StateDiff()
+        gas_used = {}
+
+        contracts = PendingContracts(self.vm.contract_manager.contracts)
+        for contract_id, effect in self.run_contract_function_of_block(block, contracts, gas_used):
+            state_diff.add_contract_effect(contract_id, effect)
+
+        self.run_bytecodes_of_block(block, gas_used)  # Fresh VMs, leaves no state behind
+        state_diff.balances = self.update_SAN_balance_for_block(block, commit=False)
+        return state_diff, gas_used
+
+    def commit_block(self, block, state_diff, gas_used):
+        """
+        Appends an executed block, applies its state diff and records it sealed onto the digest chain.
+        """
+        height = self.blockchain.append_block(block)
+        self._commit_state(height, state_diff, gas_used)
+
+    def _commit_state(self, height, state_diff, gas_used):
+        state_diff.apply(self.blockchain.SAN, self.vm.contract_manager.contracts)
+        self.blockchain.record_state_diff(height, state_diff, gas_used)
+        self.gas_used.update(gas_used)
+
+    def replay_state(self):
+        """
+        Rebuilds balances and contract storage after a restart. Recorded state diffs are applied,
+        blocks without one (appended right before a crash) are executed again and their diffs recorded.
+        Raises ValueError if the recorded diffs do not form one digest chain.
+        """
+        first_missing = self.blockchain.replay_state(self.vm.contract_manager.contracts)
+        for height in range(first_missing, len(self.blockchain)):
+            state_diff, gas_used = self.execute_block(self.blockchain[height])
+            self._commit_state(height, state_diff, gas_used)
+
+    def run_contract_function_of_block(self, new_block, contracts=None, gas_used=None):
         # contract_code = {"command": deploy, contract_id, bytecode}
         # contract_code = {"command": run, contract_id, function_name, params: []}
+        # Returns the contract state changes, [(contract_id, effect), ...] in block order
+        # contracts: what the calls run against (see BlockExecutor.execute), gas_used: where their gas goes
+
+        calls = []
+        decoding_error = None
 
         for transaction in new_block.transactions:
             try:
-                tx = json.loads(transaction.decode('utf-8'))
+                tx = transaction.fields  # Decoded once, shared with the other stages
             except Exception as e:
-                raise Exception("Transaction decoding error:", e)
+                # Calls before the bad transaction still run, like they did when calls ran one by one
+                decoding_error = e
+                break
 
             if "contract_code" in tx:
-                try:
-                    contract_code = tx["contract_code"]
-                    command = contract_code["command"]
-
-                    if command == "deploy":
-                        if "pena_code" in contract_code:
-                            parser = PenaParser()
-                            bytecode = parser.parse(contract_code["pena_code"])
-                            self.vm.deploy_contract(contract_code["contract_id"], bytecode)
-                        else:
-                            self.vm.deploy_contract(contract_code["contract_id"], contract_code["bytecode"])
-
-                    elif command == "run":
-                        self.vm.call_contract_function(
-                            contract_code["contract_id"],
-                            contract_code["function_name"],
-                            contract_code.get("params", [])
-                        )
+                calls.append((transaction.tx_hash, tx["contract_code"]))
 
-                except Exception as e:
-                    raise Exception(f"{e}")
+        # Calls to different contracts run in parallel, the result is the same as running them in block order
+        try:
+            effects = self.block_executor.execute(calls, self.gas_used if gas_used is None else gas_used, contracts)
+        finally:
+            if self.vm.contract_manager.profile:
+                self.last_block_profile = block_report(self.block_executor.last_profiles)
+                self.last_block_profile["block"] = new_block.index
 
-    def run_bytecodes_of_block(self, new_block):
+        if decoding_error is not None:
+            raise decoding_error
+
+        return effects
+
+    def _gas_limit_for(self, requested, block_gas):
+        return transaction_gas_limit(requested, block_gas, self.TX_GAS_LIMIT, self.BLOCK_GAS_LIMIT)
+
+    def run_bytecodes_of_block(self, new_block, gas_used=None):
         """
         bytecode format:
         bytecode: [[PUSH, 10], [PUSH, 20], [ADD], [HALT]]
         :param new_block:
-
+        :param gas_used: where the gas of each run is recorded, the node's gas_used by default
         """
+        gas_used = self.gas_used if gas_used is None else gas_used
+        block_gas = 0
+
         for transaction in new_block.transactions:
-            try:
-                tx = json.loads(transaction.decode('utf-8'))
-            except Exception as e:
-                raise Exception("Transaction decoding error:", e)
+            tx = transaction.fields  # Raises "Transaction decoding error" like before
 
             if "bytecode" in tx:
+                vm = SANVirtualMachine(gas_limit=self._gas_limit_for(tx.get("gas_limit"), block_gas))
                 try:
                     # parse bytecode
                     bytecode = Parser.parse_instruction_list(tx["bytecode"])
-                    SANVirtualMachine().run(bytecode)
+                    vm.run(bytecode)
 
                 except Exception as e:
                     raise Exception(f"{e}")
 
-    def update_SAN_balance_for_block(self, new_block):
-        collected_fee = 0
-        for transaction in new_block.transactions:
-            collected_fee += transaction.fee
+                finally:
+                    gas_used[transaction.tx_hash] = vm.gas_used
+                    block_gas += vm.gas_used
 
-            try:
-                tx = json.loads(transaction.decode('utf-8'))
-            except Exception as e:
-                raise Exception("Transaction decoding error:", e)
+    def update_SAN_balance_for_block(self, new_block, commit=True):
+        """
+        Collects the block's transfers and fees, then applies them to the ledger in one batch.
+        If any sender cannot pay, raises "Not enough SAN" and no balance changes.
+        Returns {address: new balance in ledger base units} for the addresses the block touched.
+        With commit=False the ledger is not changed, only the new balances are returned.
+        """
+        transfers = []  # (sender, receiver or None, value, fee), the validator collects the fees
+        for transaction in new_block.transactions:
+            tx = transaction.fields  # Raises "Transaction decoding error" like before
 
             if "value" in tx:
-                sender = tx["sender"]
-                receiver = tx["receiver"]
-                value = tx["value"]
-
-                if self.blockchain.SAN[sender] >= tx["value"] + transaction.fee:
-                    self.blockchain.SAN[sender] -= value
-                    self.blockchain.SAN[sender] -= transaction.fee
-                    self.blockchain.SAN[receiver] += value
-                else:
-                    raise Exception("Not enough SAN")
+                transfers.append((tx["sender"], tx["receiver"], tx["value"], transaction.fee))
             else:
-                sender = tx["sender"]
-                if self.blockchain.SAN[sender] >= transaction.fee:
-                    self.blockchain.SAN[sender] -= transaction.fee
-                else:
-                    raise Exception("Not enough SAN")
+                transfers.append((tx["sender"], None, 0, transaction.fee))
 
-        self.blockchain.SAN[new_block.validator] += collected_fee
+        return self.blockchain.SAN.apply_block(transfers, new_block.validator, commit)
 
     @staticmethod
     def sign_block(index, previous_block_hash, transactions):
@@ -0,0 +1,63 @@
+import os
+import sys
+
+# Tests import the packages the way run.py does, from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def make_node(tmp_path):
+    """
+    Node built like Node.__init__ builds it, minus peers and the network: chain, mempool, VM,
+    executor, verifier and caches. Needs what network.Node imports.
+    """
+    pytest.importorskip("pqcrypto.sign.dilithium2")
+    pytest.importorskip("requests")
+    pytest.importorskip("websockets")
+
+    from blockchain.Blockchain import Blockchain
+    from blockchain.Mempool import Mempool
+    from blockchain.SignatureVerifier import SignatureVerifier
+    from blockchain.VerifiedCache import VerifiedTransactionCache
+    from network.ConnectionPool import ConnectionPool
+    from network.Node import Node
+    from SANVM.BlockExecutor import BlockExecutor
+    from SANVM.CompileCache import CompileCache
+    from SANVM.Storage import Storage
+    from SANVM.VM import SANVirtualMachine
+    from utils.LRUDict import LRUDict
+
+    nodes = []
+
+    def make(name="node", balances=None):
+        node = Node.__new__(Node)
+        node.PEERS = []
+        node.connections = ConnectionPool()
+        node.controller_nodes = []
+        node.controller_latency = {}
+        node.last_quorum_latency = None
+
+        node.blockchain = Blockchain(str(tmp_path / name))
+        node.storage = Storage()
+        node.transaction_pool = Mempool()
+        node.vm = SANVirtualMachine(node.storage)
+        node.last_block_profile = None
+        node.gas_used = LRUDict(Node.GAS_USED_SIZE)
+        node.compile_cache = CompileCache()
+        node.block_executor = BlockExecutor(node.vm.contract_manager, Node.TX_GAS_LIMIT, Node.BLOCK_GAS_LIMIT,
+                                            max_workers=1, compile_cache=node.compile_cache)
+        node.verifier = SignatureVerifier(max_workers=1)
+        node.verified_cache = VerifiedTransactionCache()
+        node.replay_state()
+
+        for address, balance in (balances or {}).items():
+            node.blockchain.SAN[address] = balance
+        nodes.append(node)
+        return node
+
+    yield make
+    for node in nodes:
+        node.block_executor.close()
+        node.blockchain.close()
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+pytest.importorskip("pqcrypto.sign.dilithium2")
+
+from blockchain.Block import Block
+from blockchain.BlockCodec import BlockCodec
+from blockchain.Transaction import Transaction
+
+
+def make_block(count=3, validator="validator"):
+    transactions = [Transaction([], json.dumps({"sender": "aa", "n": i}).encode("utf-8")) for i in range(count)]
+    return Block(1, "ab" * 32, validator, "signature", ["genesis text"] + transactions)
+
+
+def encode_version_1(block):
+    # Header fields without a kind byte, as written by older nodes
+    encoded = BlockCodec.encode(block)
+    view = memoryview(encoded)
+    offset = BlockCodec.LENGTH.size + BlockCodec.HEADER.size
+    parts = [BlockCodec.HEADER.pack(BlockCodec.MAGIC, 1, block.index, block.timestamp, len(block.transactions))]
+    for _ in range(4):
+        _, length = BlockCodec.FIELD_HEADER.unpack_from(view, offset)
+        offset += BlockCodec.FIELD_HEADER.size
+        parts.append(BlockCodec.LENGTH.pack(length) + bytes(view[offset:offset + length]))
+        offset += length
+    body = b"".join(parts) + bytes(view[offset:])
+    return BlockCodec.LENGTH.pack(len(body)) + body
+
+
+@pytest.mark.parametrize("validator", ["validator", bytes(range(256)) * 5], ids=["text", "bytes"])
+def test_round_trip(validator):
+    block = make_block(validator=validator)
+    decoded = BlockCodec.decode(BlockCodec.encode(block))
+
+    for field in ("index", "timestamp", "previous_block_hash", "current_block_hash", "validator",
+                  "validator_signature"):
+        assert getattr(decoded, field) == getattr(block, field)
+    assert type(decoded.validator) is type(validator)
+    assert decoded.transactions[0] == "genesis text"
+    assert [(tx.data, tx.fee, tx.timestamp) for tx in decoded.transactions[1:]] == \
+           [(tx.data, tx.fee, tx.timestamp) for tx in block.transactions[1:]]
+
+
+def test_reads_version_1():
+    block = make_block()
+    decoded = BlockCodec.decode(encode_version_1(block))
+    assert decoded.current_block_hash == block.current_block_hash
+
+
+def test_rejects_trailing_bytes():
+    encoded = BlockCodec.encode(make_block())
+    with pytest.raises(ValueError):
+        BlockCodec.decode(encoded + b"\x00")
+
+    # Extra bytes inside the declared body, after the last transaction
+    body = encoded[BlockCodec.LENGTH.size:] + b"\x00"
+    with pytest.raises(ValueError):
+        BlockCodec.decode(BlockCodec.LENGTH.pack(len(body)) + body)
+
+
+def test_rejects_header_field_past_the_body():
+    encoded = bytearray(BlockCodec.encode(make_block(count=0)))
+    offset = BlockCodec.LENGTH.size + BlockCodec.HEADER.size
+    BlockCodec.FIELD_HEADER.pack_into(encoded, offset, BlockCodec.FIELD_KIND_TEXT, len(encoded))
+    with pytest.raises(ValueError):
+        BlockCodec.decode(bytes(encoded))
+
+
+def test_rejects_every_truncation():
+    encoded = BlockCodec.encode(make_block(count=1))
+    for length in range(len(encoded)):
+        with pytest.raises(ValueError):
+            BlockCodec.decode(encoded[:length])
+
+
+def test_decode_rejects_tampered_transaction():
+    encoded = bytearray(BlockCodec.encode(make_block()))
+    encoded[-2] ^= 1
+    with pytest.raises(ValueError):
+        BlockCodec.decode(bytes(encoded))
+
+    # Left to the caller, verify_block checks the hash first
+    assert not BlockCodec.decode(bytes(encoded), verify=False).has_valid_hash()
+
+
+def test_from_dict_rejects_tampered_transaction():
+    data = make_block().to_dict()
+    data["transactions"][1]["data"] = json.dumps({"sender": "aa", "n": 99}).encode("utf-8").hex()
+    with pytest.raises(ValueError):
+        Block.from_dict(data)
+
+
+def test_from_dict_rejects_wrong_merkle_root():
+    data = make_block().to_dict()
+    data["merkle_root"] = "00" * 32
+    with pytest.raises(ValueError):
+        Block.from_dict(data)
+
+
+def test_from_dict_rejects_wrong_hash():
+    data = make_block().to_dict()
+    data["timestamp"] += 1
+    with pytest.raises(ValueError):
+        Block.from_dict(data)
+
+
+def test_transaction_with_text_data_survives_to_dict():
+    tx = Transaction([], json.dumps({"sender": "aa", "note": "ü"}))
+    restored = Transaction.from_dict(json.loads(json.dumps(tx.to_dict())))
+    assert (restored.tx_hash, restored.fields, restored.fee) == (tx.tx_hash, tx.fields, tx.fee)
@@ -0,0 +1,157 @@
+import copy
+import random
+import threading
+
+import pytest
+
+from SANVM.Storage import Storage
+from SANVM.ContractManager import ContractManager
+from SANVM.BlockExecutor import BlockExecutor
+from SANVM.PendingContracts import PendingContracts
+from SANVM.OpCode import OpCode
+from SANVM.Profiler import block_report
+
+P = OpCode.PUSH.value
+SEED = 2014
+TX_GAS_LIMIT = 10 ** 6
+
+# f(): x = x + 1, l.append(7)
+FUNCTIONS = [P, "f", P, 0, OpCode.DEF_FUNC.value,
+             P, "x", P, "x", OpCode.GET.value, P, 1, OpCode.ADD.value, OpCode.SET.value,
+             P, "l", P, 7, OpCode.LIST_APPEND.value, OpCode.RET.value]
+CONSTRUCTOR = [P, "x", P, 0, OpCode.SET.value, P, "l", P, [], OpCode.SET.value]
+
+
+def deployed_manager():
+    manager = ContractManager(Storage())
+    for contract_id in "123456":
+        manager.deploy_contract(contract_id, FUNCTIONS + CONSTRUCTOR)
+    return manager
+
+
+def random_block(rng):
+    calls = []
+    for i in range(rng.randint(1, 40)):
+        contract_id = rng.choice("1112345678")
+        r = rng.random()
+        if r < 0.08:
+            contract_code = {"command": "deploy", "contract_id": contract_id,
+                             "bytecode": FUNCTIONS + [P, "x", P, rng.randint(0, 9), OpCode.SET.value]}
+        elif r < 0.1:
+            contract_code = {"command": "deploy", "contract_id": contract_id,
+                             "bytecode": [OpCode.JMP.value, 0], "gas_limit": 500}
+        elif r < 0.11:
+            contract_code = {"command": "run", "contract_id": contract_id, "function_name": "nope", "params": []}
+        else:
+            contract_code = {"command": "run", "contract_id": contract_id, "function_name": "f", "params": []}
+            if rng.random() < 0.2:
+                contract_code["gas_limit"] = rng.randint(20, 200)
+        calls.append((f"tx{i}", contract_code))
+    return calls
+
+
+def execute(executor, calls, contracts=None):
+    gas_used = {}
+    try:
+        effects = executor.execute(calls, gas_used, contracts)
+        error = None
+    except Exception as e:
+        effects = None
+        error = f"{e}"
+    contracts = executor.contract_manager.contracts if contracts is None else contracts
+    state = {contract_id: dict(info["storage"]) for contract_id, info in contracts.items()}
+    return error, gas_used, effects, state
+
+
+@pytest.fixture
+def parallel_executor_factory():
+    executors = []
+
+    def make(manager, block_gas_limit):
+        executor = BlockExecutor(manager, TX_GAS_LIMIT, block_gas_limit, max_workers=2, parallel_threshold=1)
+        executors.append(executor)
+        return executor
+
+    yield make
+    for executor in executors:
+        executor.close()
+
+
+def test_parallel_matches_serial(parallel_executor_factory):
+    rng = random.Random(SEED)
+    gas_errors = 0
+
+    for _ in range(60):
+        calls = random_block(rng)
+        block_gas_limit = rng.choice([300, 1500, TX_GAS_LIMIT])
+
+        serial = BlockExecutor(deployed_manager(), TX_GAS_LIMIT, block_gas_limit, max_workers=1)
+        parallel = parallel_executor_factory(deployed_manager(), block_gas_limit)
+
+        expected = execute(serial, calls)
+        assert execute(parallel, calls) == expected
+        if expected[0] is not None and "gas" in expected[0].lower():
+            gas_errors += 1
+
+    assert gas_errors > 0  # The block gas limit did bind
+
+
+def test_only_read_keys_are_shipped(parallel_executor_factory):
+    manager = deployed_manager()
+    for contract_id in "12":
+        manager.contracts[contract_id]["storage"]["unused"] = list(range(1000))
+
+    executor = parallel_executor_factory(manager, TX_GAS_LIMIT)
+    calls = [(f"tx{i}", {"command": "run", "contract_id": contract_id, "function_name": "f", "params": []})
+             for i, contract_id in enumerate("1212")]
+
+    executor.execute(calls, {})  # Nothing learned yet, the groups run again here
+    shipped = executor._shipped("1", manager.contracts["1"])["storage"]
+    assert set(shipped) == {"x", "l"}
+
+    executor.execute(calls, {})
+    assert manager.contracts["1"]["storage"]["x"] == 4
+    assert manager.contracts["2"]["storage"]["l"] == [7, 7, 7, 7]
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_pending_contracts_leave_committed_state_alone(max_workers):
+    rng = random.Random(SEED + max_workers)
+    for _ in range(20):
+        calls = random_block(rng)
+        committed = deployed_manager()
+        before = copy.deepcopy({contract_id: info["storage"] for contract_id, info in committed.contracts.items()})
+
+        executor = BlockExecutor(committed, TX_GAS_LIMIT, TX_GAS_LIMIT, max_workers=max_workers, parallel_threshold=1)
+        try:
+            result = execute(executor, calls, PendingContracts(committed.contracts))
+        finally:
+            executor.close()
+
+        assert {contract_id: info["storage"] for contract_id, info in committed.contracts.items()} == before
+
+        # The pending view holds what running on the contracts themselves leaves
+        direct = BlockExecutor(deployed_manager(), TX_GAS_LIMIT, TX_GAS_LIMIT, max_workers=1)
+        expected = execute(direct, calls)
+        if expected[0] is None:
+            assert result == expected
+        else:
+            assert result[:3] == expected[:3]
+
+
+def test_profiles_are_not_left_over_from_the_last_block(parallel_executor_factory):
+    manager = deployed_manager()
+    manager.profile = True
+    executor = parallel_executor_factory(manager, TX_GAS_LIMIT)
+
+    calls = [(f"tx{i}", {"command": "run", "contract_id": contract_id, "function_name": "f", "params": []})
+             for i, contract_id in enumerate("12")]
+    executor.execute(calls, {})
+    assert len(executor.last_profiles) == 2
+    assert block_report(executor.last_profiles)["mode"] == "interpreted"
+
+    # Fails while the calls are sent to the workers, before any of them runs
+    calls.append(("bad", {"command": "run", "contract_id": "3", "function_name": "f", "params": [threading.Lock()]}))
+    with pytest.raises(Exception):
+        executor.execute(calls, {})
+    assert executor.last_profiles == []
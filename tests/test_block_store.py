@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("pqcrypto.sign.dilithium2")
+
+from blockchain.Block import Block
+from blockchain.BlockStore import BlockStore
+
+
+def make_chain(count):
+    blocks = [Block(0, "0", "validator", "signature", ["genesis"])]
+    for index in range(1, count):
+        blocks.append(Block(index, blocks[-1].current_block_hash, "validator", "signature", [f"block {index}"]))
+    return blocks
+
+
+def test_rejects_hash_that_is_not_a_digest(tmp_path):
+    store = BlockStore(str(tmp_path))
+    genesis, block = make_chain(2)
+    store.append(genesis)
+
+    block.current_block_hash = "not a digest"
+    with pytest.raises(ValueError):
+        store.append(block)
+    assert len(store) == 1
+    store.close()
+
+    # Nothing of the rejected block was written
+    store = BlockStore(str(tmp_path))
+    assert store.write_offset == store.RECORD_LENGTH.size + len(store.encode_block(genesis))
+    store.close()
+
+
+def test_old_index_version_is_a_clear_error(tmp_path):
+    BlockStore(str(tmp_path)).close()
+    with open(tmp_path / "index.dat", "r+b") as f:
+        f.write(b"SANIDX02")
+
+    with pytest.raises(ValueError, match="SANIDX02"):
+        BlockStore(str(tmp_path))
+
+
+def test_orphan_segment_is_removed(tmp_path):
+    blocks = make_chain(4)
+    store = BlockStore(str(tmp_path), segment_size=1)  # One block per segment
+    store.extend(blocks[:3])
+    store.close()
+
+    # A crash after the next segment was written, before the index was updated
+    with open(tmp_path / "blocks_00003.dat", "wb") as f:
+        f.write(b"orphan bytes")
+
+    store = BlockStore(str(tmp_path), segment_size=1)
+    assert not (tmp_path / "blocks_00003.dat").exists()
+    store.append(blocks[3])
+    store.close()
+
+    store = BlockStore(str(tmp_path), segment_size=1)
+    assert [block.current_block_hash for block in store] == [block.current_block_hash for block in blocks]
+    store.close()
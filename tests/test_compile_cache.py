@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from SANVM.CompileCache import CompileCache
+from SANVM.pena_parser import PenaParser
+
+SOURCE = "x = 1\ny = x + 2\n"
+
+
+def test_memory_hits_and_lru_eviction():
+    cache = CompileCache(size=2, version="test")
+
+    packed = cache.compile(SOURCE)
+    assert packed.unpack() == PenaParser().parse(SOURCE)
+    assert cache.compile(SOURCE) is packed
+    assert cache.compile(SOURCE, optimize=True) is not packed  # The flag is part of the key
+
+    cache.compile("z = 3\n")  # SOURCE is the least recently used, it goes
+    assert cache.compile(SOURCE, optimize=True) is not None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["entries"]) == (2, 3, 1, 2)
+
+
+def test_entries_are_read_back_from_disk(tmp_path):
+    CompileCache(directory=str(tmp_path), version="test").compile(SOURCE)
+    files = os.listdir(tmp_path)
+    assert files == [CompileCache(version="test").key(SOURCE) + CompileCache.SUFFIX]
+
+    restarted = CompileCache(directory=str(tmp_path), version="test")
+    assert restarted.compile(SOURCE).unpack() == PenaParser().parse(SOURCE)
+    assert (restarted.disk_hits, restarted.misses) == (1, 0)
+
+    # A new compiler version does not read the old entries
+    upgraded = CompileCache(directory=str(tmp_path), version="other")
+    upgraded.compile(SOURCE)
+    assert (upgraded.disk_hits, upgraded.misses) == (0, 1)
+
+
+def test_unreadable_entry_is_compiled_again(tmp_path, capsys):
+    cache = CompileCache(directory=str(tmp_path), version="test")
+    path = os.path.join(tmp_path, cache.key(SOURCE) + CompileCache.SUFFIX)
+    with open(path, "wb") as f:
+        f.write(b"garbage")
+
+    assert cache.compile(SOURCE).unpack() == PenaParser().parse(SOURCE)
+    assert (cache.disk_hits, cache.misses) == (0, 1)
+    assert "[WARNING] Compile cache entry" in capsys.readouterr().out
+
+    # The broken file was replaced with a good one
+    assert CompileCache(directory=str(tmp_path), version="test").compile(SOURCE) is not None
+    with open(path, "rb") as f:
+        assert f.read() != b"garbage"
+
+
+def test_parse_errors_are_not_cached(tmp_path):
+    cache = CompileCache(directory=str(tmp_path), version="test")
+    for _ in range(2):
+        with pytest.raises(Exception):
+            cache.compile("if (x\n{\n")
+    assert (cache.misses, len(cache.entries), os.listdir(tmp_path)) == (2, 0, [])
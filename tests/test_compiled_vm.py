@@ -0,0 +1,106 @@
+import copy
+import random
+
+from SANVM.ContractManager import ContractManager
+from SANVM.Gas import OutOfGasError
+from SANVM.OpCode import OpCode
+from SANVM.Storage import Storage
+from SANVM.VM import SANVirtualMachine
+
+SEED = 2010
+PROGRAMS = 3000
+GAS_LIMIT = 2_000  # Bounds the loops random jumps make
+
+OPERAND_OPCODES = {OpCode.PUSH.value, OpCode.JMP.value, OpCode.IF.value}
+OPCODES = [op.value for op in OpCode if op not in (OpCode.PRINT, OpCode.DROP)]
+
+
+def random_program(rng):
+    length = rng.randint(1, 24)
+    program = []
+    while len(program) < length:
+        opcode = rng.choice(OPCODES + [OpCode.PUSH.value] * 8 + [OpCode.JMP.value] * 2)
+        program.append(opcode)
+        if opcode == OpCode.JMP.value:
+            # Negative, in range and past the end
+            program.append(rng.randint(-length - 2, length + 2))
+        elif opcode in OPERAND_OPCODES:
+            program.append(rng.choice([0, 1, 2, 3, -1, "a", "b", [1, 2], {"k": 1}]))
+    return program
+
+
+def observe(program, compiled):
+    vm = SANVirtualMachine(Storage(), compiled=compiled, gas_limit=GAS_LIMIT)
+    try:
+        vm.run(program)
+        error = None
+    except Exception as e:
+        error = e
+    return error, vm.stack, vm.storage.data, vm.gas_used
+
+
+def test_compiled_matches_interpreter():
+    rng = random.Random(SEED)
+    for _ in range(PROGRAMS):
+        program = random_program(rng)
+        original = copy.deepcopy(program)
+
+        error, stack, storage, gas = observe(program, compiled=False)
+        compiled_error, compiled_stack, compiled_storage, compiled_gas = observe(program, compiled=True)
+
+        assert (error is None) == (compiled_error is None), program
+        if error is None:
+            assert (stack, storage, gas) == (compiled_stack, compiled_storage, compiled_gas), program
+        elif not isinstance(error, OutOfGasError) and not isinstance(compiled_error, OutOfGasError):
+            # A compiled block charges its gas on entry, it may run out before reaching the failing op
+            assert type(error) is type(compiled_error), program
+        assert program == original, program
+
+
+def deploy(manager, program):
+    try:
+        manager.deploy_contract("1", program, gas_limit=GAS_LIMIT)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return error, manager.last_gas_used, manager.contracts.get("1", {}).get("storage")
+
+
+def test_compiled_contract_charges_interpreter_gas_on_failure():
+    rng = random.Random(SEED + 1)
+    failures = 0
+    for _ in range(PROGRAMS // 3):
+        program = random_program(rng)
+        expected = deploy(ContractManager(Storage()), program)
+        assert deploy(ContractManager(Storage(), compiled=True), program) == expected, program
+        failures += expected[0] is not None
+
+    assert failures > 0
+
+
+def test_negative_jump_target():
+    # JMP -2 lands on the PUSH 7 at the end, which runs and falls into slot 0 again
+    program = [OpCode.PUSH.value, 1, OpCode.HALT.value, OpCode.JMP.value, -2, OpCode.PUSH.value, 7]
+    for compiled in (False, True):
+        vm = SANVirtualMachine(Storage(), compiled=compiled)
+        vm.run(program, start_pc=3)
+        assert vm.stack == [7, 1]
+        assert vm.running is False
+
+
+def test_jump_past_the_end_stops():
+    program = [OpCode.JMP.value, 100, OpCode.PUSH.value, 1]
+    for compiled in (False, True):
+        vm = SANVirtualMachine(Storage(), compiled=compiled)
+        vm.run(program)
+        assert vm.stack == []
+        assert vm.pc == 100
+
+
+def test_list_constant_pushed_as_copy():
+    program = [OpCode.PUSH.value, "x", OpCode.PUSH.value, [1], OpCode.SET.value,
+               OpCode.PUSH.value, "x", OpCode.PUSH.value, 2, OpCode.LIST_APPEND.value]
+    for _ in range(3):
+        vm = SANVirtualMachine(Storage(), compiled=True)
+        vm.run(program)
+        assert vm.storage.data == {"x": [1, 2]}
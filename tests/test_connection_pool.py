@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+websockets = pytest.importorskip("websockets")
+
+from network.ConnectionPool import ConnectionPool, PeerConnection
+
+
+def test_frame_round_trip():
+    for message in ["text reply", b"\x00block bytes"]:
+        assert PeerConnection.unframe(PeerConnection.frame(7, message)) == (7, message)
+
+    with pytest.raises(ValueError):
+        PeerConnection.unframe(b"not a frame")
+    with pytest.raises(ValueError):
+        PeerConnection.unframe("text")
+
+
+def test_replies_are_matched_by_request_id():
+    async def handler(websocket, *_):
+        # Holds the first request back, so its reply comes after the second one
+        held = None
+        async for message in websocket:
+            request_id, payload = PeerConnection.unframe(message)
+            if held is None:
+                held = (request_id, payload)
+                continue
+            await websocket.send(b"unsolicited")
+            await websocket.send(PeerConnection.frame(request_id, f"reply to {payload}"))
+            await websocket.send(PeerConnection.frame(held[0], f"reply to {held[1]}"))
+
+    async def run():
+        async with websockets.serve(handler, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            pool = ConnectionPool()
+            url = f"ws://127.0.0.1:{port}"
+            try:
+                first = asyncio.create_task(pool.request(url, "first", timeout=5))
+                await asyncio.sleep(0.05)
+                second = await pool.request(url, "second", timeout=5)
+                return await first, second
+            finally:
+                await pool.close_all()
+
+    assert asyncio.run(run()) == ("reply to first", "reply to second")
@@ -0,0 +1,52 @@
+import pytest
+
+from SANVM.Bytecode import function_table
+from SANVM.ContractManager import ContractManager
+from SANVM.OpCode import OpCode
+from SANVM.pena_parser import PenaParser
+from SANVM.Storage import Storage
+from SANVM.VM import SANVirtualMachine
+
+P = OpCode.PUSH.value
+
+# add(n): total = total + 2, returns total. fail(): total = 99, then an unknown opcode.
+# Constructor: total = 0
+CONTRACT = [P, "add", P, 1, OpCode.DEF_FUNC.value,
+            P, "total", P, "total", OpCode.GET.value, P, 2, OpCode.ADD.value, OpCode.SET.value,
+            P, "total", OpCode.GET.value, OpCode.RET.value,
+            P, "fail", P, 0, OpCode.DEF_FUNC.value, P, "total", P, 99, OpCode.SET.value, 999, OpCode.RET.value,
+            P, "total", P, 0, OpCode.SET.value]
+
+
+def test_function_table_matches_what_def_func_records():
+    source = "function f(a, b)\n{\nx = a\n}\nfunction g()\n{\ny = 1\n}\nz = 2\n"
+    bytecode = PenaParser().parse(source)
+
+    vm = SANVirtualMachine()
+    vm.run(bytecode)
+    assert function_table(bytecode) == vm.storage.functions
+    assert set(function_table(bytecode)) == {"f", "g"}
+
+
+def test_calls_jump_to_the_function_entry():
+    manager = ContractManager(Storage())
+    manager.deploy_contract("1", CONTRACT)
+    assert manager.contracts["1"]["functions"] == {"add": {"pc": 5, "param_count": 1},
+                                                   "fail": {"pc": 23, "param_count": 0}}
+
+    assert manager.call_contract_function("1", "add", [5]) == 2
+    assert manager.call_contract_function("1", "add", [5]) == 4  # The constructor did not run again
+    assert manager.contracts["1"]["storage"]["total"] == 4
+
+
+def test_bad_calls_change_nothing():
+    manager = ContractManager(Storage())
+    manager.deploy_contract("1", CONTRACT)
+
+    with pytest.raises(KeyError, match="Unkown function"):
+        manager.call_contract_function("1", "sub", [1])
+    with pytest.raises(ValueError, match="need 1 param"):
+        manager.call_contract_function("1", "add", [])
+    with pytest.raises(ValueError, match="Unknown opcode"):
+        manager.call_contract_function("1", "fail", [])
+    assert manager.contracts["1"]["storage"]["total"] == 0
@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+import pytest
+
+
+class FakeConnections:
+    """
+    Controller votes: name -> (delay in seconds, vote or exception to raise).
+    """
+
+    def __init__(self, votes):
+        self.votes = votes
+
+    async def request(self, controller, message, timeout=None):
+        delay, vote = self.votes[controller]
+        await asyncio.sleep(delay)
+        if isinstance(vote, Exception):
+            raise vote
+        return vote
+
+
+@pytest.fixture
+def controller_node(make_node):
+    from blockchain.Block import Block
+
+    node = make_node()
+    broadcast = []
+
+    async def record(block):
+        broadcast.append(block)
+    node.broadcast_block = record
+
+    def ask(votes):
+        node.controller_nodes = list(votes)
+        node.connections = FakeConnections(votes)
+        block = Block(1, node.blockchain[-1].current_block_hash, "validator", "signature", [])
+        start = time.perf_counter()
+        try:
+            return asyncio.run(node.send_to_controllers(block))
+        finally:
+            node.elapsed = time.perf_counter() - start
+
+    node.ask = ask
+    node.broadcast = broadcast
+    return node
+
+
+def test_round_ends_when_the_quorum_is_reached(controller_node):
+    node = controller_node
+    ratio = node.ask({"c1": (0, "APPROVED"), "c2": (0.01, "APPROVED"), "c3": (10, "APPROVED")})
+
+    assert ratio == pytest.approx(2 / 3)
+    assert node.elapsed < 5  # c3 is not waited for
+    assert len(node.broadcast) == 1
+    assert set(node.controller_latency) == {"c1", "c2"}  # A cancelled request says nothing about c3
+
+
+def test_round_ends_when_the_quorum_is_out_of_reach(controller_node):
+    node = controller_node
+    with pytest.raises(Exception, match="Block rejected"):
+        node.ask({"c1": (0, "REJECTED"), "c2": (0.01, ConnectionError("refused")), "c3": (10, "APPROVED")})
+
+    assert node.elapsed < 5
+    assert node.broadcast == []
+    assert set(node.controller_latency) == {"c1"}  # A failed connection is not a latency
+
+
+def test_timeout_counts_as_not_approved(controller_node):
+    node = controller_node
+    with pytest.raises(Exception, match="Approval Ratio: 0.50"):
+        node.ask({"c1": (0, "APPROVED"), "c2": (0, asyncio.TimeoutError())})
+    assert set(node.controller_latency) == {"c1", "c2"}
+
+
+def test_no_controllers(controller_node):
+    with pytest.raises(Exception, match="No controller nodes"):
+        controller_node.ask({})
+
+
+def test_controller_votes_on_each_frame(make_node):
+    from blockchain.Block import Block
+    from blockchain.BlockCodec import BlockCodec
+    from network.ConnectionPool import PeerConnection
+
+    node = make_node()
+    good = Block(1, node.blockchain[-1].current_block_hash, "validator", "signature", [])
+    off_chain = Block(1, "0" * 64, "validator", "signature", [])
+
+    sent = []
+
+    class Socket:
+        def __init__(self, messages):
+            self.messages = iter(messages)
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            try:
+                return next(self.messages)
+            except StopIteration:
+                raise StopAsyncIteration
+
+        async def send(self, message):
+            sent.append(PeerConnection.unframe(message))
+
+    messages = [PeerConnection.frame(1, BlockCodec.encode(good)), b"not a frame",
+                PeerConnection.frame(2, BlockCodec.encode(off_chain)), PeerConnection.frame(3, b"garbage")]
+    asyncio.run(node.control_block(Socket(messages), None))
+
+    assert sent == [(1, "APPROVED"), (2, "REJECTED"), (3, "REJECTED")]
@@ -0,0 +1,115 @@
+import random
+
+import pytest
+
+import blockchain.Ledger as ledger_module
+from blockchain.Ledger import Ledger
+
+SEED = 2016
+ACCOUNTS = [f"{i:064x}" for i in range(20)]
+
+
+def random_blocks(rng, count=50):
+    blocks = []
+    for _ in range(count):
+        transfers = []
+        for _ in range(rng.randint(0, 40)):
+            sender, receiver = rng.sample(ACCOUNTS, 2)
+            value = rng.choice([0, 1, rng.randint(1, 50), rng.random() * 10, 0.1, 0.2, 1e-9])
+            fee = rng.choice([0.01, 0.1, 0.2, rng.random(), rng.randint(1, 200) * 0.01])
+            transfers.append((sender, rng.choice([receiver, None]), value, fee))
+        blocks.append(transfers)
+    return blocks
+
+
+def replay(blocks):
+    # Every block's result, or the error it raised, and the balances at the end
+    ledger = Ledger({address: 100 for address in ACCOUNTS})
+    results = []
+    for transfers in blocks:
+        try:
+            results.append(ledger.apply_block(transfers, "VALIDATOR"))
+        except Exception as e:
+            results.append(str(e))
+    return results, {address: ledger.units(address) for address in ledger}
+
+
+def path_modes():
+    modes = ["in_order", "batched"]
+    if ledger_module.np is not None:
+        modes.append("vectorized")
+    return modes
+
+
+def force(monkeypatch, mode):
+    if mode == "in_order":
+        monkeypatch.setattr(Ledger, "_vectorized_changes", lambda *args: None)
+        monkeypatch.setattr(Ledger, "_batched_changes", lambda *args: None)
+    elif mode == "batched":
+        monkeypatch.setattr(ledger_module, "np", None)
+
+
+@pytest.mark.parametrize("mode", path_modes())
+def test_paths_agree(monkeypatch, mode):
+    blocks = random_blocks(random.Random(SEED))
+    expected = replay(blocks)  # Whatever path this host takes by default
+
+    with monkeypatch.context() as patch:
+        force(patch, mode)
+        assert replay(blocks) == expected
+
+
+def test_array_fallback_matches_numpy():
+    np = pytest.importorskip("numpy")
+    assert ledger_module.np is np
+    blocks = random_blocks(random.Random(SEED + 1))
+
+    with_numpy = replay(blocks)
+    ledger_module.np = None
+    try:
+        without_numpy = replay(blocks)
+    finally:
+        ledger_module.np = np
+    assert with_numpy == without_numpy
+
+
+def test_fees_are_exact():
+    ledger = Ledger({"a": 1})
+    ledger.apply_block([("a", None, 0, 0.1), ("a", None, 0, 0.2)], "VALIDATOR")
+    assert ledger.units("VALIDATOR") == 30_000_000
+    assert ledger.units("a") == 70_000_000
+    assert ledger["VALIDATOR"] == 0.3
+
+
+def test_overdraft_changes_nothing():
+    ledger = Ledger({"a": 1})
+    with pytest.raises(Exception, match="Not enough SAN"):
+        ledger.apply_block([("a", "new", 1, 0.01)], "VALIDATOR")
+    assert ledger.units("a") == 100_000_000
+    assert "new" not in ledger and "VALIDATOR" not in ledger
+
+
+def test_spending_what_was_received_in_the_same_block():
+    ledger = Ledger({"a": 1})
+    result = ledger.apply_block([("a", "b", 1, 0), ("b", "c", 1, 0)], "VALIDATOR")
+    assert result == {"a": 0, "b": 0, "c": 100_000_000, "VALIDATOR": 0}
+
+
+def test_preview_does_not_commit():
+    ledger = Ledger({"a": 1})
+    result = ledger.apply_block([("a", "b", 0.5, 0.1)], "VALIDATOR", commit=False)
+    assert result == {"a": 40_000_000, "b": 50_000_000, "VALIDATOR": 10_000_000}
+    assert ledger.units("a") == 100_000_000
+    assert "b" not in ledger and len(ledger) == 1
+
+
+@pytest.mark.parametrize("amount", ["5", [0], True, None, b"1"])
+def test_amounts_that_are_not_numbers_are_rejected(amount):
+    with pytest.raises(TypeError):
+        Ledger.to_units(amount)
+
+    ledger = Ledger({"a": 10})
+    for transfer in [("a", "b", amount, 0.1), ("a", "b", 1, amount)]:
+        with pytest.raises(TypeError):
+            ledger.apply_block([transfer], "VALIDATOR")
+    assert ledger.to_dict() == {"a": 10}
@@ -0,0 +1,53 @@
+import pytest
+
+from SANVM.Bytecode import VALID_OPCODES, iter_instructions
+from SANVM.Linker import Linker
+from SANVM.OpCode import OpCode
+from SANVM.pena_parser import PenaParser
+from SANVM.VM import SANVirtualMachine
+
+P, JMP, IF, NOP, HALT = OpCode.PUSH.value, OpCode.JMP.value, OpCode.IF.value, OpCode.NOP.value, OpCode.HALT.value
+
+
+def test_labels_are_dropped_and_jumps_patched():
+    bytecode = [JMP, "LABEL_1", P, "LABEL_2", "LABEL_1", P, 7, "LABEL_2", HALT]
+    linked, symbols = Linker().link(bytecode)
+
+    assert linked == [JMP, 4, P, "LABEL_2", P, 7, HALT]  # A PUSHed label name stays a string
+    assert symbols["labels"] == {"LABEL_1": 4, "LABEL_2": 6}
+
+    vm = SANVirtualMachine()
+    vm.run(linked)
+    assert vm.stack == [7]
+
+
+def test_undefined_and_duplicate_labels_are_rejected():
+    with pytest.raises(ValueError, match="Undefined label"):
+        Linker().link([JMP, "LABEL_9"])
+    with pytest.raises(ValueError, match="defined twice"):
+        Linker().link(["LABEL_1", "LABEL_1"])
+
+
+def test_jump_after_if_never_lands_on_an_opcode():
+    # A false IF skips one slot and runs the JMP operand, it must raise like the label name did
+    for padding in range(60):
+        body = "\n".join(["y = 1"] * padding)
+        source = f"x = 0\n{body}\nif (x)\n{{\nz = 2\n}}\nwhile (x)\n{{\nz = 3\n}}\n"
+        bytecode = PenaParser().parse(source)
+
+        skipped = [bytecode[pc + 3] for pc, opcode, _ in iter_instructions(bytecode)
+                   if opcode == IF and bytecode[pc + 2] == JMP]
+        assert len(skipped) == 2
+        assert not any(pc in VALID_OPCODES for pc in skipped), (padding, bytecode)
+
+        with pytest.raises(ValueError, match="Unknown opcode"):
+            SANVirtualMachine().run(bytecode)
+
+
+def test_matching_if_takes_the_jump():
+    linked, _ = Linker().link([P, 1, IF, 1, JMP, "LABEL_1", P, 5, "LABEL_1", P, 6])
+    assert linked[-2:] == [P, 6]
+
+    vm = SANVirtualMachine()
+    vm.run(linked)
+    assert vm.stack == [6]
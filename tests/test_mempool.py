@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+pytest.importorskip("pqcrypto.sign.dilithium2")
+
+from blockchain.Mempool import Mempool
+from blockchain.Transaction import Transaction
+
+
+def transaction(nonce, fee, size=0):
+    data = json.dumps({"sender": "a", "receiver": "b", "value": 1, "nonce": nonce, "memo": "x" * size})
+    return Transaction.from_dict({"timestamp": float(nonce), "data": data.encode("utf-8").hex(), "fee": fee})
+
+
+@pytest.mark.parametrize("fee", ["5", [0], True, None])
+def test_fee_that_is_not_a_number_is_rejected(fee):
+    pool = Mempool()
+    assert not pool.add(transaction(1, fee))
+    assert len(pool) == 0 and pool.total_fee == 0
+
+
+def test_duplicates_are_rejected_and_fees_add_up():
+    pool = Mempool()
+    first, second = transaction(1, 0.1), transaction(2, 0.2)
+    assert pool.add(first) and pool.add(second)
+    assert not pool.add(transaction(1, 0.1))
+
+    assert len(pool) == 2 and first.tx_hash in pool
+    assert pool.total_fee == 0.3  # Base units, no float drift
+
+    assert pool.remove(first.tx_hash) is first
+    assert pool.remove(first.tx_hash) is None
+    assert pool.total_fee == 0.2
+
+
+def test_priority_is_by_fee_then_arrival():
+    pool = Mempool()
+    low, tie_old, high, tie_new = transaction(1, 1), transaction(2, 5), transaction(3, 9), transaction(4, 5)
+    for tx in (low, tie_old, high, tie_new):
+        pool.add(tx)
+
+    assert pool.by_priority() == [high, tie_old, tie_new, low]
+    assert pool.by_priority(limit=2) == [high, tie_old]
+    assert pool.drain() == [high, tie_old, tie_new, low]
+    assert len(pool) == 0 and pool.total_fee == 0 and pool.total_bytes == 0
+
+
+def test_full_pool_evicts_the_lowest_fee():
+    pool = Mempool(max_count=3)
+    txs = [transaction(nonce, fee) for nonce, fee in enumerate([3, 1, 2])]
+    for tx in txs:
+        assert pool.add(tx)
+
+    assert not pool.add(transaction(10, 1))  # Does not pay more than the lowest
+    assert pool.add(transaction(11, 4))
+    assert txs[1].tx_hash not in pool
+    assert len(pool) == 3 and pool.evicted_count == 1
+    assert pool.total_fee == 9
+
+
+def test_byte_cap_evicts_the_lowest_fee():
+    small = [transaction(nonce, 1, size=100) for nonce in range(3)]
+    pool = Mempool(max_bytes=3 * len(small[0].data) + 10)
+    for tx in small:
+        assert pool.add(tx)
+
+    better = transaction(10, 5, size=100)
+    assert pool.add(better)
+    assert pool.total_bytes <= pool.max_bytes
+    # Ties on fee: the newest goes first
+    assert [tx.tx_hash in pool for tx in small] == [True, True, False]
+    assert better.tx_hash in pool and pool.evicted_count == 1
+
+    assert not pool.add(transaction(20, 9, size=pool.max_bytes))  # Larger than the whole pool
+
+
+def test_removed_entries_do_not_come_back_through_the_heap():
+    pool = Mempool(max_count=2)
+    keep, removed = transaction(1, 5), transaction(2, 1)
+    pool.add(keep)
+    pool.add(removed)
+    pool.remove(removed.tx_hash)
+
+    for nonce in range(200):  # Enough churn to rebuild the heap
+        tx = transaction(100 + nonce, 2)
+        pool.add(tx)
+        pool.remove(tx.tx_hash)
+
+    newest = transaction(999, 3)
+    assert pool.add(newest)
+    assert pool.by_priority() == [keep, newest]
+    assert removed.tx_hash not in pool and pool.total_fee == 8
+    assert len(pool.fee_heap) <= 2 * len(pool) + 64
@@ -0,0 +1,65 @@
+import hashlib
+import json
+
+import pytest
+
+from blockchain.Merkle import MerkleTree
+
+
+def leaves(count):
+    return [hashlib.sha3_256(str(i).encode("ascii")).digest() for i in range(count)]
+
+
+def test_every_leaf_proves_against_the_root():
+    for count in range(1, 18):
+        tree = MerkleTree(leaves(count))
+        for index, leaf in enumerate(leaves(count)):
+            proof = tree.proof(index)
+            assert len(proof) <= (count - 1).bit_length()
+            assert MerkleTree.verify(leaf, proof, tree.root)
+
+            other = leaves(count + 1)[(index + 1) % (count + 1)]
+            assert not MerkleTree.verify(other, proof, tree.root)
+
+
+def test_proof_does_not_carry_over_to_another_tree():
+    tree, other = MerkleTree(leaves(5)), MerkleTree(leaves(6))
+    assert not MerkleTree.verify(leaves(5)[4], tree.proof(4), other.root)
+    with pytest.raises(IndexError):
+        tree.proof(5)
+
+
+def test_different_leaf_lists_give_different_roots():
+    a, b, c = leaves(3)
+    assert MerkleTree([a, b, c]).root != MerkleTree([a, b, c, c]).root
+    assert MerkleTree([a, b]).root != MerkleTree([b, a]).root
+
+    # An inner node is not a leaf
+    tree = MerkleTree([a, b, c, c])
+    inner = tree.levels[1][0]
+    assert not MerkleTree.verify(inner, [(tree.levels[1][1], True)], tree.root)
+
+    assert MerkleTree([]).root == hashlib.sha3_256(b"").digest()
+
+
+def test_block_transaction_proofs():
+    pytest.importorskip("pqcrypto.sign.dilithium2")
+    from blockchain.Block import Block
+    from blockchain.Transaction import Transaction
+
+    transactions = [Transaction.from_dict({"timestamp": 1.0, "fee": 0.1,
+                                           "data": json.dumps({"sender": "a", "n": i}).encode("utf-8").hex()})
+                    for i in range(7)]
+    block = Block(1, "ab" * 32, "validator", "signature", ["text entry"] + transactions)
+
+    for position, tx in enumerate(transactions, start=1):
+        proof = json.loads(json.dumps(block.transaction_proof(position)))  # As sent to a peer
+        assert Block.verify_transaction_proof(tx.tx_hash, proof, block.merkle_root)
+        other = transactions[position % len(transactions)]  # Any other transaction of the block
+        assert not Block.verify_transaction_proof(other.tx_hash, proof, block.merkle_root)
+
+    # The root is in the block hash, a changed transaction changes both
+    tampered = Block(1, "ab" * 32, "validator", "signature", ["text entry"] + transactions[:-1] + [transactions[0]])
+    tampered.timestamp = block.timestamp
+    assert tampered.merkle_root != block.merkle_root
+    assert tampered.calculate_hash() != block.calculate_hash()
@@ -0,0 +1,128 @@
+import asyncio
+import json
+
+import pytest
+
+
+def transaction(fields, fee=0.5, timestamp=1.0):
+    from blockchain.Transaction import Transaction
+    return Transaction.from_dict({"timestamp": timestamp, "data": json.dumps(fields).encode("utf-8").hex(), "fee": fee})
+
+
+@pytest.fixture
+def validator_node(make_node, monkeypatch):
+    """
+    Node that builds a block once 1 SAN of fees is pooled, signs with a fixed key and whose
+    controllers always approve.
+    """
+    from network.Node import Node
+
+    monkeypatch.setattr(Node, "get_public_key", staticmethod(lambda: "validator"))
+    monkeypatch.setattr(Node, "sign_block", staticmethod(lambda index, previous_hash, transactions: "signature"))
+
+    node = make_node(balances={"a": 100, "b": 1})
+    node.BLOCK_THRESHOLD_FEE = 1.0
+
+    async def approve(block):
+        return 1.0
+    node.send_to_controllers = approve
+    return node
+
+
+def test_failing_transaction_is_dropped_and_the_rest_go_back(validator_node):
+    node = validator_node
+    paying = transaction({"sender": "a", "receiver": "c", "value": 10})
+    overdrawn = transaction({"sender": "b", "receiver": "c", "value": 50})
+
+    assert asyncio.run(node.send_transaction(paying))
+    with pytest.raises(Exception, match=overdrawn.tx_hash):
+        asyncio.run(node.send_transaction(overdrawn))
+
+    assert node.blockchain.height() == 0
+    assert paying.tx_hash in node.transaction_pool
+    assert overdrawn.tx_hash not in node.transaction_pool
+
+    # The next block carries the transaction that went back
+    assert asyncio.run(node.send_transaction(transaction({"sender": "a", "receiver": "c", "value": 1})))
+    assert node.blockchain.height() == 1
+    assert node.blockchain.SAN["c"] == 11
+    assert len(node.transaction_pool) == 0
+
+
+class FakeSocket:
+    """
+    Server side of a websocket connection that delivers the given messages and collects replies.
+    """
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.sent = []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.messages:
+            raise StopAsyncIteration
+        return self.messages.pop(0)
+
+    async def send(self, message):
+        self.sent.append(message)
+
+
+def test_bad_incoming_blocks_are_dropped_and_the_connection_goes_on(make_node, capsys):
+    from blockchain.Block import Block
+    from blockchain.BlockCodec import BlockCodec
+
+    node = make_node(balances={"a": 100})
+    tx = transaction({"sender": "a", "receiver": "b", "value": 1})
+    node.verified_cache.add(tx.tx_hash)  # The signature is not what this test is about
+    genesis_hash = node.blockchain[-1].current_block_hash
+
+    off_chain = Block(1, "0" * 64, "validator", "signature", [tx])
+    overdrawn = Block(1, genesis_hash, "validator", "signature",
+                      [transaction({"sender": "a", "receiver": "b", "value": 500})])
+    good = Block(1, genesis_hash, "validator", "signature", [tx])
+
+    messages = [b"not a block", BlockCodec.encode(off_chain), BlockCodec.encode(overdrawn), BlockCodec.encode(good)]
+    asyncio.run(node.receive_blocks(FakeSocket(messages), None))
+
+    assert node.blockchain.height() == 1
+    assert node.blockchain[-1].current_block_hash == good.current_block_hash
+    assert node.blockchain.SAN["b"] == 1
+    assert capsys.readouterr().out.count("[ERROR] Dropped incoming block") == 3
+
+
+def test_ping_gets_a_pong_from_the_peer_listeners(make_node):
+    import socket
+
+    def free_port():
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            return s.getsockname()[1]
+
+    node, peer = make_node("node"), make_node("peer")
+
+    async def run():
+        results = []
+        for listen in (peer.listen_for_peers, peer.listen_for_dead_peers):
+            port = free_port()
+            server = asyncio.create_task(listen(host="127.0.0.1", port=port))
+            await asyncio.sleep(0.2)
+            try:
+                results.append(await node.ping_node(f"127.0.0.1:{port}"))
+
+                # Other messages on the same connection are still handled
+                await node.connections.send(f"ws://127.0.0.1:{port}", json.dumps({"type": "PEER_UPDATE",
+                                                                                   "peer": "10.0.0.1:8770"}))
+                await asyncio.sleep(0.1)
+            finally:
+                server.cancel()
+                await node.connections.close_all()
+
+        results.append(await node.ping_node(f"127.0.0.1:{free_port()}"))  # Nobody listens
+        await node.connections.close_all()
+        return results
+
+    assert asyncio.run(run()) == [True, True, False]
+    assert peer.PEERS == ["10.0.0.1:8770"]
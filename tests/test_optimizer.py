@@ -0,0 +1,136 @@
+import random
+
+from SANVM.Bytecode import function_table, iter_instructions
+from SANVM.OpCode import OpCode
+from SANVM.Optimizer import PeepholeOptimizer, differential_check
+
+SEED = 2023
+PROGRAMS = 400
+GAS_LIMIT = 5_000  # Bounds the loops backward jumps make, runs over it are not compared
+
+P = OpCode.PUSH.value
+JMP = OpCode.JMP.value
+BINARY = [OpCode.ADD.value, OpCode.SUB.value, OpCode.MUL.value, OpCode.DIV.value, OpCode.MOD.value,
+          OpCode.EQ.value, OpCode.LT.value, OpCode.GTE.value, OpCode.AND.value, OpCode.XOR.value]
+
+
+def snippet(rng, labels):
+    """
+    A few instructions as [opcode] or [opcode, operand]. Jumps hold ("label", n) until linking.
+    """
+    r = rng.random()
+    if r < 0.3:  # Foldable, sometimes a division by zero that must still raise
+        return [[P, rng.randint(-3, 40)], [P, rng.randint(0, 5)], [rng.choice(BINARY)]]
+    if r < 0.45:
+        return [[P, rng.choice("xy")], [P, rng.randint(0, 9)], [OpCode.SET.value]]
+    if r < 0.55:
+        return [[P, rng.choice("xy")], [OpCode.GET.value]]
+    if r < 0.65:
+        return rng.choice([[[OpCode.NOP.value]], [[P, 1], [OpCode.POP.value]], [[OpCode.DUP.value], [OpCode.POP.value]]])
+    if r < 0.75:  # IF skips the next slot unless the condition matches, so a one slot op follows
+        return [[P, rng.randint(0, 1)], [OpCode.IF.value, rng.randint(0, 1)],
+                [rng.choice([OpCode.NOP.value, OpCode.DUP.value, OpCode.POP.value])]]
+    if r < 0.9:
+        return [[JMP, ("label", rng.randrange(labels))]]
+    if r < 0.95:
+        return [[OpCode.HALT.value]]
+    return [[P, rng.choice("fg")], [P, 0], [OpCode.CALL_FUNC.value]]
+
+
+def random_program(rng):
+    main = []
+    labels = rng.randint(4, 20)
+    for _ in range(labels):
+        main.extend(snippet(rng, labels))
+
+    functions = []
+    for name in rng.sample("fg", rng.randint(0, 2)):
+        body = []
+        for _ in range(rng.randint(1, 4)):
+            body.extend(item for item in snippet(rng, labels) if item[0] != OpCode.CALL_FUNC.value)
+        functions.append([[P, name], [P, 0], [OpCode.DEF_FUNC.value]] + body + [[OpCode.RET.value]])
+
+    # Functions go before, between or after the top level code, jumps may land in their bodies
+    position = rng.randint(0, len(main))
+    instructions = main[:position] + [item for function in functions for item in function] + main[position:]
+
+    starts = []
+    pc = 0
+    for item in instructions:
+        starts.append(pc)
+        pc += len(item)
+    starts.append(pc)
+
+    program = []
+    for item in instructions:
+        if item[0] == JMP:
+            program.extend([JMP, starts[item[1][1] * len(instructions) // labels]])
+        else:
+            program.extend(item)
+    return program
+
+
+def test_optimized_programs_behave_like_the_original():
+    rng = random.Random(SEED)
+    folded = remapped = functions_moved = 0
+
+    for _ in range(PROGRAMS):
+        program = random_program(rng)
+        optimizer = PeepholeOptimizer()
+        optimized = optimizer.optimize(program)
+
+        assert differential_check(program, optimized, GAS_LIMIT) == [], (program, optimized)
+        if optimized == program:
+            continue
+
+        # DEF_FUNC bodies land where the pc map says, the scan for RET still stops at the same place
+        before, after = function_table(program), function_table(optimized)
+        assert list(after) == list(before)
+        for name, info in before.items():
+            assert after[name]["pc"] == optimizer.pc_map[info["pc"]]
+            functions_moved += after[name]["pc"] != info["pc"]
+
+        original_ops = [opcode for _, opcode, _ in iter_instructions(program)]
+        optimized_ops = [opcode for _, opcode, _ in iter_instructions(optimized)]
+        folded += sum(original_ops.count(op) for op in BINARY) > sum(optimized_ops.count(op) for op in BINARY)
+
+        jumps = [(pc, operand) for pc, opcode, operand in iter_instructions(program) if opcode == JMP]
+        remapped += any(operand in optimizer.pc_map and optimizer.pc_map[operand] != operand
+                        for _, operand in jumps)
+
+    # The seed exercises every rewrite the test is about
+    assert folded > 0
+    assert remapped > 0
+    assert functions_moved > 0
+
+
+def test_new_ret_value_is_not_folded_into_a_function_body():
+    # 10 + RET would push the RET value, and DEF_FUNC's scan for the body's end would stop on it
+    ret = OpCode.RET.value
+    program = [P, "f", P, 0, OpCode.DEF_FUNC.value,
+               P, ret - 10, P, 10, OpCode.ADD.value, OpCode.RET.value,
+               P, "f", P, 0, OpCode.CALL_FUNC.value]
+
+    optimized = PeepholeOptimizer().optimize(program)
+    assert optimized[5:10] == program[5:10]
+    assert differential_check(program, optimized, GAS_LIMIT) == []
+
+
+def test_parser_output_with_branches_is_optimized():
+    from SANVM.Bytecode import VALID_OPCODES
+    from SANVM.pena_parser import PenaParser
+
+    for x in (0, 1, 6):
+        source = f"x = {x} * 1\nz = 2 * 3\nwhile (x)\n{{\nx = x - 1\n}}\nif (x)\n{{\ny = 4 + 5\n}}\n"
+        program = PenaParser().parse(source)
+        optimizer = PeepholeOptimizer()
+        optimized = optimizer.optimize(program)
+
+        assert optimizer.skipped is None
+        assert differential_check(program, optimized, GAS_LIMIT) == [], (program, optimized)
+        assert [P, 6] == optimized[5:7]  # 2 * 3 is folded
+
+        # An IF that does not match still runs a JMP operand the VM has no handler for
+        skipped = [optimized[pc + 3] for pc, opcode, _ in iter_instructions(optimized)
+                   if opcode == OpCode.IF.value and optimized[pc + 2] == JMP]
+        assert skipped and not any(pc in VALID_OPCODES for pc in skipped)
@@ -0,0 +1,80 @@
+import pytest
+
+from SANVM.Gas import OutOfGasError
+from SANVM.OpCode import OpCode
+from SANVM.Profiler import Profile, block_report
+from SANVM.Storage import Storage
+from SANVM.VM import SANVirtualMachine
+
+P = OpCode.PUSH.value
+ADD, SET, GET = OpCode.ADD.value, OpCode.SET.value, OpCode.GET.value
+
+# inc(): x = x + 1, then inc is called twice
+PROGRAM = [P, "inc", P, 0, OpCode.DEF_FUNC.value,
+           P, "x", P, "x", GET, P, 1, ADD, SET, OpCode.RET.value,
+           P, "x", P, 0, SET,
+           P, "inc", P, 0, OpCode.CALL_FUNC.value,
+           P, "inc", P, 0, OpCode.CALL_FUNC.value]
+
+
+def test_profiled_run_counts_every_op():
+    plain = SANVirtualMachine()
+    plain.run(PROGRAM)
+
+    profile = Profile()
+    vm = SANVirtualMachine(profile=profile)
+    vm.run(PROGRAM)
+
+    assert vm.storage.data == plain.storage.data
+    assert profile.runs == 1
+    assert profile.calls == {"inc": 2}
+    assert profile.counts[OpCode.CALL_FUNC.value] == 2
+    assert profile.counts[ADD] == 2  # The body runs once per call, DEF_FUNC skips over it
+    assert sum(profile.pcs.values()) == sum(profile.counts.values())
+    assert set(profile.times) == set(profile.counts)
+
+    report = profile.report(top=3)
+    assert report["instructions"] == sum(profile.counts.values())
+    assert len(report["hot_pcs"]) == 3
+    assert {entry["opcode"] for entry in report["opcodes"]} >= {"ADD", "CALL_FUNC", "DEF_FUNC"}
+
+
+def test_profiled_run_charges_gas_like_metered():
+    metered = SANVirtualMachine(gas_limit=10 ** 6)
+    metered.run(PROGRAM)
+    profiled = SANVirtualMachine(gas_limit=10 ** 6, profile=Profile())
+    profiled.run(PROGRAM)
+    assert profiled.gas_used == metered.gas_used
+
+    vm = SANVirtualMachine(gas_limit=metered.gas_used - 1, profile=Profile())
+    with pytest.raises(OutOfGasError):
+        vm.run(PROGRAM)
+    assert vm.gas_used == metered.gas_used
+
+
+def test_run_from_a_function_entry_counts_as_a_call():
+    storage = Storage()
+    SANVirtualMachine(storage).run(PROGRAM)
+
+    # The frame ContractManager pushes for a call, RET then ends the run
+    profile = Profile()
+    vm = SANVirtualMachine(storage, profile=profile)
+    vm.call_stack.append({"pc": len(PROGRAM), "params": []})
+    vm.run(PROGRAM, storage.functions["inc"]["pc"])
+    assert profile.calls == {"inc": 1}
+    assert storage.data["x"] == 3
+
+
+def test_block_report_merges_per_contract():
+    profiles = []
+    for tx_hash, contract_id in (("tx1", "a"), ("tx2", "a"), ("tx3", "b")):
+        profile = Profile()
+        SANVirtualMachine(profile=profile).run(PROGRAM)
+        profiles.append((tx_hash, contract_id, profile))
+
+    report = block_report(profiles)
+    assert (report["calls"], report["runs"], report["mode"]) == (3, 3, "interpreted")
+    assert "hot_pcs" not in report
+    assert report["functions"] == {"inc": 6}
+    assert report["contracts"]["a"]["functions"] == {"inc": 4}
+    assert report["contracts"]["b"]["instructions"] * 3 == report["instructions"]
@@ -0,0 +1,62 @@
+import pytest
+
+
+@pytest.fixture
+def client(make_node, monkeypatch):
+    """
+    TestClient on the API router, served by a node built with make_node.
+    """
+    pytest.importorskip("fastapi")
+    pytest.importorskip("httpx")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from network.Node import Node
+
+    # app.routes builds its node at import, that one would need peers
+    monkeypatch.setattr(Node, "__init__", lambda self: None)
+    import app.routes as routes
+
+    node = make_node(balances={"a": 100})
+    monkeypatch.setattr(routes, "node", node)
+
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app), node
+
+
+def test_sync_returns_blocks_as_json(client):
+    from blockchain.Block import Block
+    from blockchain.Transaction import Transaction
+
+    client, node = client
+    tx = Transaction.from_dict({"timestamp": 1.0, "data": b'{"sender": "a", "receiver": "b", "value": 1}'.hex(),
+                                "fee": 0.5})
+    last = node.blockchain[-1]
+    block = Block(1, last.current_block_hash, "validator", "signature", [tx])
+    block.merkle_tree  # Cached on the block, holds bytes that are not JSON
+    node.apply_block(block)
+
+    response = client.get("/sync", params={"height": 0})
+    assert response.status_code == 200
+    body = response.json()["blockchain"]
+    assert [Block.from_dict(data).current_block_hash for data in body["block"]] == [block.current_block_hash]
+    assert body["state_digest"] == node.blockchain.state_digest()
+
+    assert client.get("/sync", params={"height": 1}).json()["blockchain"]["block"] is None
+    assert client.get("/sync").status_code == 400
+
+
+def test_transaction_lookup(client):
+    from blockchain.Block import Block
+    from blockchain.Transaction import Transaction
+
+    client, node = client
+    tx = Transaction.from_dict({"timestamp": 1.0, "data": b'{"sender": "a", "receiver": "b", "value": 1}'.hex(),
+                                "fee": 0.5})
+    node.apply_block(Block(1, node.blockchain[-1].current_block_hash, "validator", "signature", [tx]))
+
+    body = client.get(f"/transaction/{tx.tx_hash}", params={"proof": "true"}).json()
+    assert (body["status"], body["height"], body["position"]) == ("confirmed", 1, 0)
+    assert Block.verify_transaction_proof(tx.tx_hash, body["proof"], body["merkle_root"])
+
+    assert client.get(f"/transaction/{'00' * 32}").status_code == 404
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+dilithium2 = pytest.importorskip("pqcrypto.sign.dilithium2")
+
+from blockchain.SignatureVerifier import SignatureVerifier
+from blockchain.Transaction import Transaction
+
+
+def signed_transactions(count):
+    public_key, secret_key = dilithium2.generate_keypair()
+    transactions = []
+    for i in range(count):
+        fields = {"sender": public_key.hex(), "receiver": f"{i:064x}", "value": i}
+        message = Transaction.serialize_message(fields, exclude_signature=False)
+        fields["signature"] = dilithium2.sign(message, secret_key).hex()
+        transactions.append(Transaction.from_dict({"timestamp": 1.0, "fee": 0.1,
+                                                   "data": json.dumps(fields).encode("utf-8").hex()}))
+    return transactions
+
+
+def unsigned_transaction():
+    data = json.dumps({"sender": "ab", "receiver": "cd", "value": 1}).encode("utf-8")
+    return Transaction.from_dict({"timestamp": 1.0, "fee": 0.1, "data": data.hex()})
+
+
+@pytest.mark.parametrize("max_workers", [1, 2], ids=["serial", "parallel"])
+def test_verify_all(max_workers):
+    verifier = SignatureVerifier(max_workers=max_workers, parallel_threshold=4)
+    try:
+        transactions = signed_transactions(12)
+        assert verifier.verify_all(transactions)
+        assert (verifier.pool.executor is not None) == (max_workers > 1)
+        assert verifier.verify_all([tx.data for tx in transactions])  # Raw bytes work the same
+
+        # One bad transaction anywhere fails the batch, and verification does not raise
+        for position in (0, 6, 12):
+            batch = list(transactions)
+            batch.insert(position, unsigned_transaction())
+            assert not verifier.verify_all(batch)
+
+        assert verifier.verify_all([])
+        assert verifier.stats()["verified"] == 12 + 12 + 3 * 13
+    finally:
+        verifier.close()
+
+
+def test_small_batches_stay_serial():
+    verifier = SignatureVerifier(max_workers=2, parallel_threshold=32)
+    try:
+        assert verifier.verify_all(signed_transactions(3))
+        assert verifier.pool.executor is None
+    finally:
+        verifier.close()
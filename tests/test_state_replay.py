@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+pytest.importorskip("pqcrypto.sign.dilithium2")
+
+from blockchain.Block import Block
+from blockchain.Blockchain import Blockchain
+from blockchain.Ledger import Ledger
+from blockchain.StateDiff import StateDiff
+
+
+def build_chain(data_dir):
+    chain = Blockchain(data_dir)
+    contracts = {"1": {"bytecode": None, "functions": {}, "storage": {"x": 0}}}
+
+    for index in range(1, 4):
+        last = chain[-1]
+        height = chain.append_block(Block(index, last.current_block_hash, "validator", "signature", [f"block {index}"]))
+        diff = StateDiff({"a": Ledger.to_units(100 - index), "validator": Ledger.to_units(index)})
+        diff.add_contract_effect("1", ("run", {"x": index, f"k{index}": [index]}, ["k1"] if index == 3 else []))
+        diff.apply(chain.SAN, contracts)
+        chain.record_state_diff(height, diff, {f"tx{index}": 10 * index})
+    return chain, contracts
+
+
+def replayed(data_dir):
+    chain = Blockchain(data_dir)
+    contracts = {"1": {"bytecode": None, "functions": {}, "storage": {"x": 0}}}
+    first_missing = chain.replay_state(contracts)
+    return chain, contracts, first_missing
+
+
+def test_restart_rebuilds_state(tmp_path):
+    chain, contracts = build_chain(str(tmp_path))
+    balances, digest = chain.SAN.to_dict(), chain.state_digest()
+    chain.close()
+
+    chain, replayed_contracts, first_missing = replayed(str(tmp_path))
+    assert first_missing == len(chain) == 4
+    assert chain.SAN.to_dict() == balances
+    assert replayed_contracts == contracts
+    assert chain.state_digest() == digest
+    chain.close()
+
+
+def test_gas_used_survives_restart(tmp_path):
+    build_chain(str(tmp_path))[0].close()
+
+    chain, _, _ = replayed(str(tmp_path))
+    assert chain.gas_used_at(2) == {"tx2": 20}
+    assert chain.gas_used_at(0) == {}
+    assert chain.state_diffs.get_dict(2)["digest"] == chain.state_diffs.get(2).digest  # Gas is not in the diff
+    chain.close()
+
+
+def test_block_without_diff_is_left_to_execute(tmp_path):
+    chain, _ = build_chain(str(tmp_path))
+    last = chain[-1]
+    chain.append_block(Block(4, last.current_block_hash, "validator", "signature", ["appended before a crash"]))
+    chain.close()
+
+    chain, _, first_missing = replayed(str(tmp_path))
+    assert first_missing == 4
+    chain.close()
+
+
+def test_tampered_diff_is_rejected(tmp_path):
+    build_chain(str(tmp_path))[0].close()
+
+    path = tmp_path / "state_diffs.ndjson"
+    lines = path.read_text().splitlines()
+    record = json.loads(lines[2])
+    record["diff"]["balances"][0][1] += 1
+    lines[2] = json.dumps(record, separators=(",", ":"))
+    path.write_text("\n".join(lines) + "\n")
+
+    with pytest.raises(ValueError):
+        replayed(str(tmp_path))
@@ -0,0 +1,119 @@
+import json
+import time
+
+import pytest
+
+
+def transfer(value, timestamp):
+    from blockchain.Transaction import Transaction
+    data = json.dumps({"sender": "a", "receiver": "b", "value": value}).encode("utf-8")
+    return Transaction.from_dict({"timestamp": timestamp, "data": data.hex(), "fee": 0.5})
+
+
+def grow(node, count):
+    from blockchain.Block import Block
+    for i in range(count):
+        block = Block(node.blockchain.height() + 1, node.blockchain[-1].current_block_hash, "validator",
+                      "signature", [transfer(i + 1, float(i))])
+        node.apply_block(block)
+
+
+class FakeResponse:
+    """
+    requests.get(stream=True) on a node's stream_blocks, that can break after some lines.
+    """
+
+    def __init__(self, lines, break_after=None):
+        self.status_code = 200
+        self.lines = lines
+        self.break_after = break_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+    def iter_lines(self):
+        import requests
+        for count, line in enumerate(self.lines):
+            if count == self.break_after:
+                raise requests.ConnectionError("Connection reset")
+            yield line.encode("utf-8")
+
+
+@pytest.fixture
+def nodes(make_node, monkeypatch):
+    import network.Node as node_module
+
+    with monkeypatch.context() as patch:
+        patch.setattr(time, "time", lambda: 1_700_000_000.0)  # Both chains start from the same genesis block
+        source = make_node("source", balances={"a": 100})
+        target = make_node("target", balances={"a": 100})
+    grow(source, 5)
+    for block in source.blockchain.blocks_after_height(0):
+        for tx in block.transactions:
+            target.verified_cache.add(tx.tx_hash)  # The signatures are not what these tests are about
+
+    target.incoming_node = "source"
+    target.SYNC_BACKOFF = 0
+    requests_made = []
+    breaks = []  # Line to break the next stream at, one entry per request
+
+    def get(url, stream, timeout):
+        height = int(url.rsplit("height=", 1)[1])
+        requests_made.append(height)
+        return FakeResponse(list(source.stream_blocks(height)), breaks.pop(0) if breaks else None)
+
+    monkeypatch.setattr(node_module.requests, "get", get)
+    return source, target, requests_made, breaks
+
+
+def test_stream_lines(nodes):
+    source, _, _, _ = nodes
+    lines = [json.loads(line) for line in source.stream_blocks(1, limit=2)]
+
+    assert [line["type"] for line in lines] == ["block", "block", "end"]
+    assert [line["height"] for line in lines] == [2, 3, 3]
+    assert lines[0]["block"]["index"] == 2
+    assert lines[0]["state_diff"]["digest"] == source.blockchain.state_diffs.get_dict(2)["digest"]
+    assert [json.loads(line) for line in source.stream_blocks(5)] == [{"type": "end", "height": 5}]
+
+
+def test_sync_catches_up(nodes):
+    source, target, requests_made, _ = nodes
+    target.synchronize(0)
+
+    assert requests_made == [0]
+    assert target.blockchain.height() == 5
+    assert target.blockchain.state_digest() == source.blockchain.state_digest()
+    assert target.blockchain.SAN["b"] == source.blockchain.SAN["b"] == 15
+
+
+def test_broken_stream_resumes_from_the_last_applied_height(nodes):
+    source, target, requests_made, breaks = nodes
+    breaks.extend([2, 1])
+    target.synchronize(0)
+
+    assert requests_made == [0, 2, 3]
+    assert target.blockchain.height() == 5
+    assert target.blockchain.state_digest() == source.blockchain.state_digest()
+
+
+def test_state_diff_that_does_not_match_stops_the_sync(nodes, monkeypatch, capsys):
+    source, target, requests_made, _ = nodes
+    stream_blocks = source.stream_blocks
+
+    def tampered(height, limit=None):
+        for line in stream_blocks(height, limit):
+            message = json.loads(line)
+            if message.get("height") == 3:
+                message["state_diff"]["digest"] = "0" * 64
+            yield json.dumps(message) + "\n"
+    monkeypatch.setattr(source, "stream_blocks", tampered)
+
+    target.SYNC_RETRIES = 2
+    target.synchronize(0)
+    assert target.blockchain.height() == 2
+    assert requests_made == [0, 2]
+    assert "[ERROR] Could not finish sync" in capsys.readouterr().out
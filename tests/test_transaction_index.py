@@ -0,0 +1,99 @@
+import json
+import os
+
+import pytest
+
+from blockchain.TransactionIndex import TransactionIndex
+
+A, B, C = "aa" * 32, "bb" * 32, "cc" * 32
+
+
+def test_lookup_by_hash():
+    index = TransactionIndex()
+    index.add_block(0, [None])
+    index.add_block(1, [A, None, B])
+
+    assert index.get(A) == (1, 0)
+    assert index.get(bytes.fromhex(B)) == (1, 2)
+    assert index.get(C) is None
+    assert index.get("not hex") is None
+    assert A in index and C not in index
+    assert len(index) == 2 and index.last_height == 1
+
+
+def test_reopened_index_has_the_same_entries(tmp_path):
+    index = TransactionIndex(str(tmp_path))
+    index.add_block(1, [A, B])
+    index.add_block(2, [C])
+    index.add_block(2, [C])  # Indexed again after a crash, not written twice
+    index.close()
+    assert os.path.getsize(tmp_path / TransactionIndex.FILE_NAME) == 3 * TransactionIndex.RECORD.size
+
+    reopened = TransactionIndex(str(tmp_path))
+    assert [reopened.get(tx_hash) for tx_hash in (A, B, C)] == [(1, 0), (1, 1), (2, 0)]
+    assert reopened.last_height == 2
+    reopened.close()
+
+
+def test_partly_written_record_is_cut_off(tmp_path):
+    index = TransactionIndex(str(tmp_path))
+    index.add_block(1, [A])
+    index.close()
+    with open(tmp_path / TransactionIndex.FILE_NAME, "ab") as f:
+        f.write(TransactionIndex.RECORD.pack(bytes.fromhex(B), 2, 0)[:20])
+
+    reopened = TransactionIndex(str(tmp_path))
+    assert reopened.get(A) == (1, 0) and reopened.get(B) is None
+    reopened.add_block(2, [B])
+    reopened.close()
+
+    again = TransactionIndex(str(tmp_path))
+    assert again.get(B) == (2, 0)
+    again.close()
+
+
+def test_node_finds_confirmed_and_pending_transactions(make_node):
+    from blockchain.Block import Block
+    from blockchain.Transaction import Transaction
+
+    def transfer(value):
+        data = json.dumps({"sender": "a", "receiver": "b", "value": value}).encode("utf-8")
+        return Transaction.from_dict({"timestamp": 1.0, "fee": 0.5, "data": data.hex()})
+
+    node = make_node(balances={"a": 100})
+    confirmed, pending = transfer(1), transfer(2)
+    node.apply_block(Block(1, node.blockchain[-1].current_block_hash, "validator", "signature", [confirmed]))
+    node.transaction_pool.add(pending)
+
+    found = node.find_transaction(confirmed.tx_hash, with_proof=True)
+    assert (found["status"], found["height"], found["position"], found["confirmations"]) == ("confirmed", 1, 0, 1)
+    assert Block.verify_transaction_proof(confirmed.tx_hash, found["proof"], found["merkle_root"])
+
+    assert node.find_transaction(pending.tx_hash) == {"tx_hash": pending.tx_hash, "status": "pending"}
+    assert node.find_transaction("00" * 32) is None
+
+
+
+@pytest.mark.parametrize("lose_index", [False, True], ids=["kept", "lost"])
+def test_blockchain_index_survives_a_restart(tmp_path, lose_index):
+    pytest.importorskip("pqcrypto.sign.dilithium2")
+    from blockchain.Block import Block
+    from blockchain.Blockchain import Blockchain
+    from blockchain.Transaction import Transaction
+
+    transactions = [Transaction.from_dict({"timestamp": 1.0, "fee": 0.5,
+                                           "data": json.dumps({"sender": "a", "n": i}).encode("utf-8").hex()})
+                    for i in range(3)]
+    blockchain = Blockchain(str(tmp_path))
+    blockchain.append_block(Block(1, blockchain[-1].current_block_hash, "validator", "signature", transactions[:2]))
+    blockchain.append_block(Block(2, blockchain[-1].current_block_hash, "validator", "signature", transactions[2:]))
+    blockchain.close()
+
+    if lose_index:  # Every block is indexed again from the block store
+        os.remove(tmp_path / TransactionIndex.FILE_NAME)
+
+    reopened = Blockchain(str(tmp_path))
+    try:
+        assert [reopened.find_transaction(tx.tx_hash) for tx in transactions] == [(1, 0), (1, 1), (2, 0)]
+    finally:
+        reopened.close()
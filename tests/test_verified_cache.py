@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from blockchain.VerifiedCache import VerifiedTransactionCache
+
+
+def test_lru_keeps_recently_used_hashes():
+    cache = VerifiedTransactionCache(max_size=2)
+    cache.add("a")
+    cache.add("b")
+    assert cache.contains("a")  # "a" is now the most recently used
+    cache.add("c")
+
+    assert cache.contains("a") and cache.contains("c")
+    assert not cache.contains("b")
+    assert len(cache) == 2
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (3, 1, 1)
+    assert stats["hit_rate"] == 0.75
+
+
+def test_node_verifies_a_signature_once(make_node, monkeypatch):
+    from blockchain.Block import Block
+    from blockchain.Transaction import Transaction
+
+    node = make_node()
+    calls = []  # Hashes of the transactions that went to Dilithium2
+
+    def verify_all(transactions):
+        calls.extend(tx.tx_hash for tx in transactions)
+        return True
+    monkeypatch.setattr(Transaction, "verify", lambda tx: calls.append(tx.tx_hash) or True)
+    monkeypatch.setattr(node.verifier, "verify_all", verify_all)
+
+    data = json.dumps({"sender": "ab", "receiver": "cd", "value": 1}).encode("utf-8")
+    tx = Transaction.from_dict({"timestamp": 1.0, "fee": 0.1, "data": data.hex()})
+
+    assert node.verify_transaction(tx)
+    assert node.verify_transaction(tx)
+    block = Block(1, node.blockchain[-1].current_block_hash, "validator", "signature", [tx])
+    assert node.verify_block(block)
+    assert calls == [tx.tx_hash]
+
+
+def test_bad_signature_is_not_cached(make_node, monkeypatch):
+    from blockchain.Transaction import Transaction
+
+    node = make_node()
+
+    def bad(tx):
+        raise Exception("Signature verify error:")
+    monkeypatch.setattr(Transaction, "verify", bad)
+
+    data = json.dumps({"sender": "ab", "receiver": "cd", "value": 1}).encode("utf-8")
+    tx = Transaction.from_dict({"timestamp": 1.0, "fee": 0.1, "data": data.hex()})
+    for _ in range(2):
+        with pytest.raises(Exception, match="Signature"):
+            node.verify_transaction(tx)
+    assert len(node.verified_cache) == 0
@@ -0,0 +1,78 @@
+import copy
+
+from SANVM.ContractManager import ContractManager
+from SANVM.OpCode import OpCode
+from SANVM.PackedBytecode import PackedBytecode
+from SANVM.Storage import Storage
+from SANVM.VM import SANVirtualMachine
+
+PUSH, SET, LIST_APPEND, DICT_SET = (OpCode.PUSH.value, OpCode.SET.value, OpCode.LIST_APPEND.value,
+                                    OpCode.DICT_SET.value)
+DEF_FUNC, RET = OpCode.DEF_FUNC.value, OpCode.RET.value
+
+# x := [1, 2, 3], x.append(4), d := {"a": 1}, d["b"] = 2
+CONSTRUCTOR = [PUSH, "x", PUSH, [1, 2, 3], SET, PUSH, "x", PUSH, 4, LIST_APPEND,
+               PUSH, "d", PUSH, {"a": 1}, SET, PUSH, "d", PUSH, "b", PUSH, 2, DICT_SET]
+
+# Function "reset" runs the constructor again on the contract's storage
+WITH_FUNCTION = [PUSH, "reset", PUSH, 0, DEF_FUNC] + CONSTRUCTOR + [RET]
+
+
+def deploy(bytecode, **kwargs):
+    manager = ContractManager(Storage(), **kwargs)
+    manager.deploy_contract("1", bytecode)
+    return manager.contracts["1"]["storage"]
+
+
+def test_constants_survive_repeated_deploys():
+    # Every deploy of the same program decodes to the same shared list, its constants must not drift
+    for _ in range(3):
+        assert deploy(CONSTRUCTOR) == {"x": [1, 2, 3, 4], "d": {"a": 1, "b": 2}}
+
+
+def test_packed_constants_survive_repeated_deploys():
+    packed = PackedBytecode.pack(CONSTRUCTOR)
+    for _ in range(3):
+        assert deploy(packed) == {"x": [1, 2, 3, 4], "d": {"a": 1, "b": 2}}
+    assert packed.instructions() == CONSTRUCTOR
+
+
+def test_constants_survive_repeated_calls():
+    manager = ContractManager(Storage())
+    manager.deploy_contract("1", WITH_FUNCTION)
+    for _ in range(3):
+        manager.call_contract_function("1", "reset", [])
+        assert manager.contracts["1"]["storage"] == {"x": [1, 2, 3, 4], "d": {"a": 1, "b": 2}}
+
+
+def test_plain_vm_leaves_bytecode_unchanged():
+    bytecode = copy.deepcopy(CONSTRUCTOR)
+    vm = SANVirtualMachine()
+    vm.run(bytecode)
+    assert bytecode == CONSTRUCTOR
+
+
+def test_packed_constants_keep_their_types():
+    # {1: 2} and {"1": 2} are different constants, int keys, tuples and key order survive to_bytes
+    constants = [{1: "a"}, {"1": "a"}, {True: "a"}, {"b": 1, "a": [1, (2, 3)]}, 2.5, -7, 10 ** 30]
+    bytecode = [op for value in constants for op in (PUSH, value)]
+
+    packed = PackedBytecode.pack(bytecode)
+    assert len(packed.constants) == len(constants)
+
+    restored = PackedBytecode.from_bytes(packed.to_bytes())
+    assert restored == packed
+    unpacked = restored.unpack()
+    assert [repr(value) for value in unpacked] == [repr(value) for value in bytecode]
+
+    storage = deploy(PackedBytecode.pack([PUSH, "d", PUSH, {1: 2}, SET]))
+    assert storage == {"d": {1: 2}}
+    assert list(storage["d"]) == [1]
+
+
+def test_reads_version_1_packed_bytecode():
+    # Version 1 wrote containers as JSON (tag 2)
+    payload = b'{"a":1}'
+    data = (PackedBytecode.HEADER.pack(PackedBytecode.MAGIC, 1) + bytes([2, 1, PackedBytecode.TAG_JSON, len(payload)])
+            + payload + bytes([3, PUSH, PackedBytecode.CONSTANT, 0]))
+    assert PackedBytecode.from_bytes(data).unpack() == [PUSH, {"a": 1}]
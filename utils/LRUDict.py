@@ -0,0 +1,23 @@
+from collections import OrderedDict
+
+
+class LRUDict(OrderedDict):
+    """
+    Dict that keeps at most max_size entries, dropping the least recently set or read one.
+    """
+
+    def __init__(self, max_size):
+        super().__init__()
+        self.max_size = max_size
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.max_size:
+            self.popitem(last=False)
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
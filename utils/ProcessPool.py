@@ -0,0 +1,51 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class ProcessPool:
+    """
+    Process pool for the batch jobs of a block (signature checks, contract calls), started on first use.
+
+    run() picks the serial or the parallel path of a job: small batches run serially because pool
+    overhead costs more than it saves, and so does everything on hosts without a working process pool.
+    If the pool breaks during a job, it is closed, the job runs serially and later jobs stay serial.
+    """
+
+    def __init__(self, max_workers=None, parallel_threshold=16, task="running"):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.parallel_threshold = parallel_threshold
+        self.task = task  # For the warnings, "<task> serially"
+        self.executor = None
+
+    def get(self):
+        """
+        The running ProcessPoolExecutor, None if this host cannot run one.
+        """
+        if self.executor is None and self.max_workers > 1:
+            try:
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            except (OSError, NotImplementedError) as e:
+                print(f"[WARNING] Process pool unavailable, {self.task} serially: {e}")
+                self.max_workers = 1
+        return self.executor
+
+    def run(self, count, parallel, serial):
+        """
+        parallel(executor) for a batch of count items, serial() if the batch is small or there is no pool.
+        """
+        if count < self.parallel_threshold or self.get() is None:
+            return serial()
+
+        try:
+            return parallel(self.executor)
+        except BrokenProcessPool as e:
+            print(f"[WARNING] Process pool broken, {self.task} serially: {e}")
+            self.close()
+            self.max_workers = 1
+            return serial()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None